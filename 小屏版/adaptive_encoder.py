@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+import cv2
+
+
+class EncodingLevel:
+    def __init__(self, codec, scale, quality=None):
+        self.codec = codec
+        self.scale = scale
+        self.quality = quality
+
+    def encode(self, frame):
+        if self.scale != 1.0:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        if self.codec == "jpg":
+            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        else:
+            _, buffer = cv2.imencode('.png', frame)
+        return buffer.tobytes(), self.codec
+
+    def __str__(self):
+        quality = f" q{self.quality}" if self.quality else ""
+        return f"{self.codec} x{self.scale}{quality}"
+
+
+# Highest fidelity first
+ENCODING_LADDER = [
+    EncodingLevel("png", 1.0),
+    EncodingLevel("jpg", 1.0, 95),
+    EncodingLevel("jpg", 1.0, 85),
+    EncodingLevel("jpg", 0.75, 85),
+    EncodingLevel("jpg", 0.75, 70),
+    EncodingLevel("jpg", 0.5, 70),
+    EncodingLevel("jpg", 0.5, 50),
+]
+
+LOSSLESS_LADDER = [
+    EncodingLevel("png", 1.0),
+    EncodingLevel("png", 0.75),
+    EncodingLevel("png", 0.5),
+]
+
+# Starting guess of bytes per level relative to full PNG, replaced by measurements
+SIZE_RATIO_GUESS = {"png": 1.0, "jpg": 0.12}
+
+
+class PngEncoder:
+    """The fixed per-frame PNG encoding"""
+
+    def encode(self, frame, backlog=0):
+        _, buffer = cv2.imencode('.png', frame)
+        return buffer.tobytes(), "png"
+
+    def set_effort(self, effort):
+        # OpenCV's default PNG settings are already its fastest that do not grow the file
+        pass
+
+    def on_upload(self, nbytes, duration, rtt, ok):
+        pass
+
+    def on_ack(self, seq, ok):
+        pass
+
+    def key_frame(self, seq):
+        # Every frame already is one
+        return None
+
+
+class AdaptiveEncoder:
+    """Picks the highest-fidelity encoding the link can sustain at the capture cadence.
+
+    Upload throughput and RTT are tracked as moving averages. A level is
+    affordable when rtt + expected_bytes / throughput fits in `utilization`
+    of the capture interval. A growing backlog forces a step down. Stepping
+    back up needs `upgrade_after` affordable frames in a row.
+
+    set_effort(1) keeps it off full-size PNG, the costliest level to encode,
+    while the board is short of CPU.
+    """
+
+    def __init__(self, interval, min_scale=0.5, min_quality=50, allow_jpeg=True,
+                 utilization=0.8, max_backlog=2, upgrade_after=5, alpha=0.3, log=print):
+        self.interval = interval
+        self.utilization = utilization
+        self.max_backlog = max_backlog
+        self.upgrade_after = upgrade_after
+        self.alpha = alpha
+        self.log = log
+        ladder = ENCODING_LADDER if allow_jpeg else LOSSLESS_LADDER
+        self.levels = [level for level in ladder
+                       if level.scale >= min_scale and (level.quality or 100) >= min_quality]
+        self.index = 0
+        self.floor = 0
+        self.lock = threading.Lock()
+        self.throughput = None
+        self.rtt = None
+        self.sizes = {}
+        self.affordable_streak = 0
+        self.decisions = []
+        self.started_at = time.monotonic()
+
+    def average(self, current, sample):
+        return sample if current is None else (1 - self.alpha) * current + self.alpha * sample
+
+    def expected_bytes(self, index):
+        level = self.levels[index]
+        if str(level) in self.sizes:
+            return self.sizes[str(level)]
+        base = self.sizes.get(str(self.levels[0]))
+        if base is None:
+            return None
+        return base * SIZE_RATIO_GUESS[level.codec] * level.scale ** 2
+
+    def send_time(self, index):
+        nbytes = self.expected_bytes(index)
+        if nbytes is None or self.throughput is None:
+            return None
+        return (self.rtt or 0) + nbytes / self.throughput
+
+    def set_effort(self, effort):
+        with self.lock:
+            self.floor = 0
+            if effort > 0:
+                cheap = [i for i, level in enumerate(self.levels)
+                         if not (level.codec == "png" and level.scale == 1.0)]
+                if cheap:
+                    self.floor = cheap[0]
+
+    def choose(self, backlog):
+        budget = self.interval * self.utilization
+        current = self.index
+        target = current
+        reason = None
+
+        if current < self.floor:
+            target = self.floor
+            reason = "reduced encode effort"
+        elif backlog > self.max_backlog and current < len(self.levels) - 1:
+            target = current + 1
+            reason = f"backlog {backlog} > {self.max_backlog}"
+        else:
+            send_time = self.send_time(current)
+            if send_time is not None and send_time > budget:
+                target = current
+                while target < len(self.levels) - 1 and (self.send_time(target) or 0) > budget:
+                    target += 1
+                reason = f"send {send_time:.2f}s > budget {budget:.2f}s"
+                self.affordable_streak = 0
+            elif current > self.floor:
+                up = self.send_time(current - 1)
+                if up is not None and up <= budget and backlog == 0:
+                    self.affordable_streak += 1
+                    if self.affordable_streak >= self.upgrade_after:
+                        target = current - 1
+                        reason = f"send {up:.2f}s fits budget {budget:.2f}s"
+                else:
+                    self.affordable_streak = 0
+
+        if target != current:
+            self.affordable_streak = 0
+            self.index = target
+            decision = {
+                "t": round(time.monotonic() - self.started_at, 2),
+                "from": str(self.levels[current]),
+                "to": str(self.levels[target]),
+                "reason": reason,
+                "throughput": None if self.throughput is None else round(self.throughput),
+                "rtt": None if self.rtt is None else round(self.rtt, 3),
+                "backlog": backlog
+            }
+            self.decisions.append(decision)
+            if self.log:
+                self.log(f"Encoding {decision['from']} -> {decision['to']}: {reason}")
+        return self.levels[self.index]
+
+    def encode(self, frame, backlog=0):
+        with self.lock:
+            level = self.choose(backlog)
+        data, extension = level.encode(frame)
+        with self.lock:
+            self.sizes[str(level)] = self.average(self.sizes.get(str(level)), len(data))
+        return data, extension
+
+    def on_upload(self, nbytes, duration, rtt, ok):
+        if not ok or duration <= 0:
+            return
+        with self.lock:
+            if rtt is not None:
+                self.rtt = self.average(self.rtt, rtt)
+            transfer = max(duration - (self.rtt or 0), 0.001)
+            self.throughput = self.average(self.throughput, nbytes / transfer)
+
+    def on_ack(self, seq, ok):
+        pass
+
+    def key_frame(self, seq):
+        # Every frame already is one
+        return None
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Replay sessions through ConvergenceDetector: when would they have stopped?
+
+Sessions come from a tree of recorded PNGs or stored uploads (grouped as
+reanalyse.py does), or are synthesised as a strip whose pads change for
+the first `--react` seconds and then hold, with sensor noise. Frames are
+taken to be --interval seconds apart.
+"""
+import argparse
+import sys
+
+import cv2
+import numpy as np
+
+from bench_video import synthetic_frames
+from convergence import ConvergenceDetector
+from reanalyse import find_sessions
+
+
+def replay(frames, interval, detector):
+    """(images taken, seconds) had the session stopped on convergence"""
+    count = 0
+    for count, frame in enumerate(frames, 1):
+        t = (count - 1) * interval
+        if detector.update(t, frame):
+            return count, t
+    return count, (count - 1) * interval
+
+def synthetic_sessions(count, frames, react, interval, seed=0):
+    rng = np.random.default_rng(seed)
+    for n in range(count):
+        # synthetic_frames plateaus at 40% of its length
+        reacting = int(react / interval / 0.4)
+        session = list(synthetic_frames(reacting, seed=seed + n))
+        held = (session[min(i, len(session) - 1)] for i in range(frames))
+        # Frames past the end are repeats, they still need their own sensor noise
+        yield f"synthetic-{n}", (cv2.add(frame, rng.integers(0, 3, frame.shape, dtype=np.uint8))
+                                 for frame in held)
+
+def recorded_sessions(root, frames):
+    for session, paths in sorted(find_sessions(root).items()):
+        frames_read = (cv2.imread(path) for _, path in paths[:frames])
+        yield session, (frame for frame in frames_read if frame is not None)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Session length with and without early convergence stop")
+    parser.add_argument("--recorded", help="tree of recorded sessions, synthetic if not given")
+    parser.add_argument("--sessions", type=int, default=5, help="synthetic sessions")
+    parser.add_argument("--frames", type=int, default=60, help="images in a full session")
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--react", type=float, default=25.0, help="seconds the synthetic pads change for")
+    parser.add_argument("--threshold", type=float, default=1.0)
+    parser.add_argument("--window", type=float, default=10.0)
+    parser.add_argument("--hold", type=float, default=5.0)
+    parser.add_argument("--min-time", type=float, default=20.0)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.recorded:
+        sessions = recorded_sessions(args.recorded, args.frames)
+    else:
+        sessions = synthetic_sessions(args.sessions, args.frames, args.react, args.interval)
+
+    full_images = early_images = 0
+    full_time = early_time = 0.0
+    count = 0
+    for name, frames in sessions:
+        frames = list(frames)
+        if not frames:
+            continue
+        detector = ConvergenceDetector(args.threshold, args.window, args.hold, args.min_time)
+        images, seconds = replay(frames, args.interval, detector)
+        print(f"{name}: {images}/{len(frames)} images, {seconds:.0f}s"
+              f"{'' if detector.reason is None else ', ' + detector.reason}")
+        count += 1
+        full_images += len(frames)
+        full_time += (len(frames) - 1) * args.interval
+        early_images += images
+        early_time += seconds
+    if not count:
+        print("no sessions")
+        return 1
+    print(f"mean per session: {early_images / count:.1f} images in {early_time / count:.1f}s "
+          f"against {full_images / count:.1f} in {full_time / count:.1f}s "
+          f"({100 * early_images / full_images:.0f}% of the images)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
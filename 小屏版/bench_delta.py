@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Bytes per session: a full PNG per frame against tile deltas.
+
+Each frame is acknowledged before the next one is encoded, as on a link
+that keeps up, and the server side is replayed with apply_delta to report
+how far rebuilt frames stray from the captured ones.
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from bench_video import synthetic_frames, recorded_frames, bench_png
+from tile_delta import DeltaEncoder, apply_delta, delta_base_seq, DELTA_EXTENSION
+
+
+def bench_delta(frames, tile, threshold, key_interval):
+    encoder = DeltaEncoder(tile, threshold, key_interval=key_interval)
+    rebuilt = {}
+    worst = 0
+    cpu = 0.0
+    for seq, frame in enumerate(frames, 1):
+        started = time.process_time()
+        data, extension = encoder.encode(frame)
+        cpu += time.process_time() - started
+        encoder.on_ack(seq, True)
+        if extension == DELTA_EXTENSION:
+            rebuilt[seq] = apply_delta(data, rebuilt[delta_base_seq(data)])
+        else:
+            rebuilt[seq] = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_UNCHANGED)
+        worst = max(worst, int(cv2.absdiff(rebuilt[seq], frame).max()))
+    return encoder.stats(), worst, cpu
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Full PNG vs tile delta bytes per session")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--recorded", help="directory of recorded PNG frames")
+    parser.add_argument("--tile-size", type=int, default=32)
+    parser.add_argument("--thresholds", default="0,2,4,8", help="comma separated mean thresholds")
+    parser.add_argument("--key-interval", type=int, default=10)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.recorded:
+        frames = list(recorded_frames(args.recorded, args.frames))
+    else:
+        frames = list(synthetic_frames(args.frames))
+    if not frames:
+        print("no frames")
+        return 1
+
+    png_bytes, png_cpu = bench_png(frames)
+    print(f"{len(frames)} frames {frames[0].shape[1]}x{frames[0].shape[0]}, "
+          f"{args.tile_size}px tiles, a key frame every {args.key_interval}")
+    print(f"{'png':>10}: {png_bytes / 1024:9.1f} KiB  {png_cpu:6.2f}s CPU")
+    for threshold in (float(t) for t in args.thresholds.split(",")):
+        stats, worst, cpu = bench_delta(frames, args.tile_size, threshold, args.key_interval)
+        tiles = stats["tiles_sent"] / max(stats["tiles"], 1)
+        print(f"{f'delta t={threshold:g}':>10}: {stats['bytes'] / 1024:9.1f} KiB  {cpu:6.2f}s CPU  "
+              f"({100 * stats['bytes'] / png_bytes:.1f}% of png bytes, {100 * tiles:.0f}% of tiles sent, "
+              f"max error {worst})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
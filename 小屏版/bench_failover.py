@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""Upload routing against local stub servers.
+
+Starts one stub ingest server per --servers entry: a latency in ms, "dead"
+(nothing listening), "hang" (accepts, never answers) or "refuse" (answers
+every upload with a 400, which must not fail over or mark it down). The
+fastest one is shut down after --kill-after uploads. One session's
+captures then go through an Uploader with an EndpointRouter, and the
+manifests are checked on every server that took part, as CaptureSession
+does. --upload-mode chunked sends them with the resumable protocol;
+ChunkedUpload then retries an unreachable server itself, to ride out a
+restart, before the router gets to fail over, so dead, hang and killed
+servers cost tens of seconds there.
+
+    python3 bench_failover.py --servers 5,40,dead,hang --kill-after 20
+    python3 bench_failover.py --servers refuse,40 --upload-mode chunked --kill-after 0
+"""
+import argparse
+import itertools
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from capture_engine import Capture, Uploader, UPLOAD_MODES, post_manifest, fetch_session_status, \
+    merge_session_status
+from endpoints import EndpointRouter
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def answer_later(self):
+        if self.server.hang:
+            self.server.released.wait()
+            return False
+        time.sleep(self.server.latency)
+        return True
+
+    def read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_GET(self):
+        if not self.answer_later():
+            return
+        path = self.path.split("?")[0]
+        if path == "/health":
+            self.reply(200, {"status": "ok"})
+        elif path.startswith("/uploads/") and path[9:] in self.server.chunked:
+            upload = self.server.chunked[path[9:]]
+            self.reply(200, {"offset": upload["offset"], "size": upload["size"],
+                             "complete": upload["offset"] == upload["size"]})
+        elif path.startswith("/sessions/"):
+            self.reply(200, self.server.session_status(path.rsplit("/", 1)[1]))
+        else:
+            # Pre-checks: nothing is stored yet
+            self.reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self.read_body()
+        if not self.answer_later():
+            return
+        if self.path == "/uploads":
+            # Chunked uploads are created even by a refusing server, it refuses the bytes
+            info = json.loads(body)
+            upload_id = self.server.new_upload(info)
+            self.reply(201, {"upload_id": upload_id, "offset": 0, "chunk_size": None})
+        elif self.server.refuse:
+            self.reply(400, {"error": "refused"})
+        else:
+            self.server.received(self.headers.get("X-Session-Id"), int(self.headers.get("X-Sequence", 0)))
+            self.reply(200, {"status": "success", "files": []})
+
+    def do_PUT(self):
+        body = self.read_body()
+        if not self.answer_later():
+            return
+        if self.path.startswith("/uploads/"):
+            self.append_upload(self.path[9:], body)
+        else:
+            self.server.manifests[self.path.split("/")[2]] = json.loads(body)
+            self.reply(200, {"status": "ok"})
+
+    def append_upload(self, upload_id, body):
+        upload = self.server.chunked.get(upload_id)
+        if upload is None:
+            self.reply(404, {"error": "unknown upload"})
+        elif self.server.refuse:
+            self.reply(400, {"error": "refused"})
+        elif int(self.headers.get("Upload-Offset", -1)) != upload["offset"]:
+            self.reply(409, {"offset": upload["offset"], "complete": False})
+        else:
+            upload["offset"] += len(body)
+            complete = upload["offset"] == upload["size"]
+            if complete:
+                self.server.received(upload["session"], int(upload["seq"]))
+            self.reply(200, {"offset": upload["offset"], "complete": complete,
+                             "filename": upload["filename"]})
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency=0.0, hang=False, kill_after=None, refuse=False):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.hang = hang
+        self.refuse = refuse
+        # Chunked uploads by id
+        self.chunked = {}
+        self.upload_ids = itertools.count(1)
+        self.kill_after = kill_after
+        self.released = threading.Event()
+        self.lock = threading.Lock()
+        self.uploads = 0
+        self.seqs = {}
+        self.manifests = {}
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/upload"
+
+    def received(self, session, seq):
+        with self.lock:
+            self.uploads += 1
+            self.seqs.setdefault(session, set()).add(seq)
+            if self.kill_after is not None and self.uploads == self.kill_after:
+                threading.Thread(target=self.kill, daemon=True).start()
+
+    def new_upload(self, info):
+        with self.lock:
+            upload_id = f"{next(self.upload_ids):032x}"
+            self.chunked[upload_id] = {"size": info["size"], "offset": 0, "filename": info["filename"],
+                                       "session": info.get("session"), "seq": info.get("seq", 0)}
+        return upload_id
+
+    def kill(self):
+        """Stop listening, later connections are refused"""
+        self.shutdown()
+        self.server_close()
+
+    def session_status(self, session):
+        expected = self.manifests.get(session, {}).get("expected", 0)
+        have = self.seqs.get(session, set())
+        received = [seq for seq in range(1, expected + 1) if seq in have]
+        missing = [seq for seq in range(1, expected + 1) if seq not in have]
+        return {"expected": expected, "received": received, "missing": missing, "complete": not missing}
+
+    def close(self):
+        self.released.set()
+        if self.kill_after is None or self.uploads < self.kill_after:
+            self.kill()
+
+
+def dead_url():
+    """An address nothing listens on"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/upload"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Endpoint routing and failover against stub servers")
+    parser.add_argument("--servers", default="5,40,dead,hang",
+                        help="comma separated: latency in ms, dead, hang or refuse, in configured order")
+    parser.add_argument("--kill-after", type=int, default=20,
+                        help="uploads after which the fastest server goes away, 0 keeps it")
+    parser.add_argument("--captures", type=int, default=60)
+    parser.add_argument("--rate", type=float, default=20.0, help="captures per second")
+    parser.add_argument("--size", type=int, default=32 * 1024, help="bytes per capture")
+    parser.add_argument("--probe-interval", type=float, default=0.5)
+    parser.add_argument("--upload-mode", choices=sorted(UPLOAD_MODES), default="single")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    specs = args.servers.split(",")
+    latencies = [float(spec) for spec in specs if spec not in ("dead", "hang", "refuse")]
+    fastest = min(latencies) if latencies else None
+    servers = []
+    urls = []
+    for spec in specs:
+        if spec == "dead":
+            urls.append(dead_url())
+            continue
+        if spec in ("hang", "refuse"):
+            server = StubServer(hang=spec == "hang", refuse=spec == "refuse")
+        else:
+            kill = float(spec) == fastest and args.kill_after > 0
+            server = StubServer(float(spec) / 1000, kill_after=args.kill_after if kill else None)
+            fastest = None if kill else fastest
+        servers.append(server)
+        urls.append(server.url)
+
+    router = EndpointRouter(urls, probe_interval=args.probe_interval)
+    router.start()
+    durations = []
+    uploader = Uploader(urls[0], send_func=UPLOAD_MODES[args.upload_mode], router=router,
+                        on_result=lambda capture, duration, ok: durations.append((duration, ok)))
+    session_id = uuid.uuid4().hex
+    captures = []
+    started = time.monotonic()
+    for seq in range(1, args.captures + 1):
+        time.sleep(max(0, started + (seq - 1) / args.rate - time.monotonic()))
+        capture = Capture(os.urandom(args.size), session_id, seq)
+        captures.append(capture)
+        uploader.submit(capture)
+    uploader.wait()
+    elapsed = time.monotonic() - started
+
+    statuses = {}
+    for url in sorted({c.endpoint for c in captures if c.endpoint}):
+        if post_manifest(url, session_id, captures, len(captures)):
+            statuses[url] = fetch_session_status(url, session_id)
+    status = merge_session_status(statuses, captures)
+    router.stop()
+    uploader.close()
+    for server in servers:
+        server.close()
+
+    for spec, endpoint in zip(specs, router.stats()):
+        print(f"{spec:>6} {endpoint['url']}: {endpoint['uploads']} uploads, {endpoint['failures']} failed, "
+              f"{endpoint['refused']} refused, {endpoint['failovers']} failed over to it, latency {endpoint['latency_ms']} ms, "
+              f"{'healthy' if endpoint['healthy'] else 'down'}")
+    slowest = max(duration for duration, _ in durations)
+    failed = sum(1 for _, ok in durations if not ok)
+    print(f"{len(captures)} captures in {elapsed:.1f}s, {failed} not delivered, slowest upload {slowest:.2f}s")
+    if status is None:
+        print("no server accepted the manifest")
+        return 1
+    print(f"servers hold {len(status['received'])}/{status['expected']}, missing {status['missing']}, "
+          f"{len(status['unverified'])} acknowledged by servers that are gone")
+    return 1 if status["missing"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Local load run against ingest_server.py using the devices' multipart format.
+
+Each simulated device opens a fresh connection per image, like send_image.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from urllib.parse import urlsplit
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def multipart_body(filename, payload):
+    boundary = uuid.uuid4().hex
+    head = (f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="images"; filename="{filename}"\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n").encode("utf-8")
+    return boundary, head + payload + f"\r\n--{boundary}--\r\n".encode("utf-8")
+
+async def post_image(host, port, path, payload, index):
+    boundary, body = multipart_body(f"bench_{index}.png", payload)
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((f"POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                      f"Content-Type: multipart/form-data; boundary={boundary}\r\n"
+                      f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode("latin-1"))
+        writer.write(body)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+async def device(host, port, path, payload, images, latencies, errors):
+    for index in range(images):
+        start = time.monotonic()
+        try:
+            status = await post_image(host, port, path, payload, index)
+            if status != 200:
+                errors.append(status)
+        except OSError as e:
+            errors.append(str(e))
+        latencies.append(time.monotonic() - start)
+
+async def run(url, devices, images, size):
+    parts = urlsplit(url)
+    payload = os.urandom(size)
+    latencies = []
+    errors = []
+    start = time.monotonic()
+    await asyncio.gather(*(device(parts.hostname, parts.port or 80, parts.path, payload,
+                                  images, latencies, errors) for _ in range(devices)))
+    return time.monotonic() - start, latencies, errors
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load run against an /upload endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/upload")
+    parser.add_argument("--devices", type=int, default=32, help="concurrent uploaders")
+    parser.add_argument("--images", type=int, default=60, help="images per device")
+    parser.add_argument("--size", type=int, default=400 * 1024, help="bytes per image")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    elapsed, latencies, errors = asyncio.run(run(args.url, args.devices, args.images, args.size))
+    total = args.devices * args.images
+    print(f"{total} uploads of {args.size // 1024} KiB from {args.devices} devices in {elapsed:.2f}s")
+    print(f"throughput: {total / elapsed:.1f} req/s, {total * args.size / elapsed / 1e6:.1f} MB/s")
+    print(f"latency p50 {percentile(latencies, 0.5) * 1000:.1f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print(f"errors: {len(errors)}")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Compare preview CPU cost: framebuffer sink against QPixmap/QLabel painting.
+
+Both paths get the same downscaled RGB frames CameraThread produces. The
+framebuffer path writes into a plain file unless --fb names a device. The
+Qt path runs on the offscreen platform when there is no display, so it
+does not include the X server's own CPU time and understates the real
+cost on the device.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from fb_preview import Framebuffer, FramebufferPreview, open_preview
+
+WARMUP_FRAMES = 30
+
+
+def preview_frames(count, width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8) for _ in range(count)]
+
+def bench_framebuffer(frames, preview):
+    for frame in frames[:WARMUP_FRAMES]:
+        preview.show_frame(frame)
+    cpu = time.process_time()
+    for n, frame in enumerate(frames):
+        if n % 30 == 0:
+            preview.show_status(f"发送图片 {n // 30 + 1}/60...")
+        preview.show_frame(frame)
+    return time.process_time() - cpu
+
+def bench_qt(frames):
+    if not os.environ.get("DISPLAY"):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5 import QtGui, QtWidgets
+
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    label = QtWidgets.QLabel()
+    label.setFixedSize(frames[0].shape[1], frames[0].shape[0])
+    label.show()
+
+    def show(frame):
+        h, w, ch = frame.shape
+        qimage = QtGui.QImage(frame.data, w, h, ch * w, QtGui.QImage.Format_RGB888)
+        label.setPixmap(QtGui.QPixmap.fromImage(qimage))
+        app.processEvents()
+
+    for frame in frames[:WARMUP_FRAMES]:
+        show(frame)
+    cpu = time.process_time()
+    for frame in frames:
+        show(frame)
+    return time.process_time() - cpu
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Preview CPU per frame, framebuffer vs Qt")
+    parser.add_argument("--frames", type=int, default=900, help="30 s of preview at 30 fps")
+    parser.add_argument("--size", default="160x160", help="preview WIDTHxHEIGHT")
+    parser.add_argument("--fb", default=None, help="framebuffer device, default a temp file")
+    parser.add_argument("--bpp", type=int, choices=[16, 32], default=16,
+                        help="depth of the temp file framebuffer")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    width, height = (int(v) for v in args.size.split("x"))
+    frames = preview_frames(args.frames, width, height)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.fb:
+            preview = open_preview(args.fb)
+        else:
+            preview = FramebufferPreview(Framebuffer(os.path.join(tmp, "fb"), 240, 200, args.bpp))
+        fb_cpu = bench_framebuffer(frames, preview)
+        preview.close()
+
+    print(f"{len(frames)} frames {width}x{height}")
+    print(f"framebuffer: {1e3 * fb_cpu / len(frames):6.3f} ms CPU/frame")
+    try:
+        qt_cpu = bench_qt(frames)
+    except ImportError:
+        print("         qt: PyQt5 not available")
+        return 0
+    print(f"         qt: {1e3 * qt_cpu / len(frames):6.3f} ms CPU/frame  "
+          f"({qt_cpu / fb_cpu:.1f}x framebuffer)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
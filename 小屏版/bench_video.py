@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Compare per-frame PNG uploads against one compressed video per session.
+
+Frames are either loaded from a directory of recorded PNGs or synthesised
+as a strip whose pads slowly change colour, like a real reaction.
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from session_video import VIDEO_CODECS, open_video_writer
+
+
+def synthetic_frames(count, width=640, height=480, seed=0):
+    rng = np.random.default_rng(seed)
+    background = rng.integers(90, 110, size=(height, width, 3), dtype=np.uint8)
+    pads = [(60 + i * 60, 200, 40, 80) for i in range(8)]
+    for index in range(count):
+        frame = background.copy()
+        cv2.rectangle(frame, (40, 180), (600, 300), (235, 235, 235), -1)
+        progress = min(1.0, index / max(count * 0.4, 1))
+        for n, (x, y, w, h) in enumerate(pads):
+            colour = (int(200 - 120 * progress * (n % 3 + 1) / 3), 200, int(120 + 80 * progress))
+            cv2.rectangle(frame, (x, y), (x + w, y + h), colour, -1)
+        noise = rng.integers(-2, 3, size=frame.shape, dtype=np.int16)
+        yield np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+def recorded_frames(directory, count):
+    paths = sorted(glob.glob(os.path.join(directory, "*.png")))[:count]
+    for path in paths:
+        yield cv2.imread(path)
+
+def bench_png(frames):
+    total = 0
+    cpu = time.process_time()
+    for frame in frames:
+        _, buffer = cv2.imencode('.png', frame)
+        total += len(buffer)
+    return total, time.process_time() - cpu
+
+def bench_video(frames, codec, fps):
+    with tempfile.TemporaryDirectory() as tmp:
+        writer = None
+        cpu = time.process_time()
+        for frame in frames:
+            if writer is None:
+                h, w = frame.shape[:2]
+                writer, path, _ = open_video_writer(os.path.join(tmp, "bench"), (w, h), fps, [codec])
+            writer.write(frame)
+        writer.release()
+        return os.path.getsize(path), time.process_time() - cpu
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PNG vs video bytes and CPU per session")
+    parser.add_argument("--frames", type=int, default=60)
+    parser.add_argument("--recorded", help="directory of recorded PNG frames")
+    parser.add_argument("--fps", type=float, default=1.0)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.recorded:
+        frames = list(recorded_frames(args.recorded, args.frames))
+    else:
+        frames = list(synthetic_frames(args.frames))
+    if not frames:
+        print("no frames")
+        return 1
+
+    png_bytes, png_cpu = bench_png(frames)
+    print(f"{len(frames)} frames {frames[0].shape[1]}x{frames[0].shape[0]}")
+    print(f"{'png':>6}: {png_bytes / 1024:9.1f} KiB  {png_cpu:6.2f}s CPU")
+    for codec in VIDEO_CODECS:
+        try:
+            size, cpu = bench_video(frames, codec, args.fps)
+        except RuntimeError:
+            print(f"{codec[0]:>6}: not available")
+            continue
+        print(f"{codec[0]:>6}: {size / 1024:9.1f} KiB  {cpu:6.2f}s CPU  "
+              f"({100 * size / png_bytes:.1f}% of png bytes)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
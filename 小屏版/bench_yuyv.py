@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Per-frame CPU of the camera loop: converted BGR frames against raw YUYV.
+
+The converted path pays YUYV->BGR for every frame (what cap.read() does
+with CAP_PROP_CONVERT_RGB on), then BGR->RGB and a resize for the
+preview. The raw path copies the YUYV buffer, previews the luma plane
+and converts only the frames that are captured. Both PNG-encode the
+captured frames. --device also times cap.read() on a real camera in
+both modes.
+"""
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from bench_video import synthetic_frames
+from yuyv import enable_raw_yuyv, disable_raw_yuyv, as_yuyv, yuyv_preview_rgb, yuyv_to_bgr
+
+
+def bgr_to_yuyv(frame):
+    yuv = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV)
+    raw = np.empty(frame.shape[:2] + (2,), dtype=np.uint8)
+    raw[..., 0] = yuv[..., 0]
+    raw[:, 0::2, 1] = yuv[:, 0::2, 1]
+    raw[:, 1::2, 1] = yuv[:, 0::2, 2]
+    return raw
+
+def converted_loop(raws, preview_size, capture_every):
+    cpu = time.process_time()
+    for n, raw in enumerate(raws):
+        frame = yuyv_to_bgr(raw)
+        current = frame.copy()
+        rgb = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), preview_size)
+        if n % capture_every == 0:
+            cv2.imencode('.png', current)
+    return time.process_time() - cpu
+
+def raw_loop(raws, preview_size, capture_every):
+    cpu = time.process_time()
+    for n, raw in enumerate(raws):
+        current = raw.copy()
+        rgb = yuyv_preview_rgb(raw, preview_size)
+        if n % capture_every == 0:
+            cv2.imencode('.png', yuyv_to_bgr(current))
+    return time.process_time() - cpu
+
+def device_reads(device, frames):
+    """CPU per cap.read() with and without driver-side conversion"""
+    cap = cv2.VideoCapture(device, cv2.CAP_V4L2)
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    results = {}
+    try:
+        for mode in ("converted", "raw"):
+            if mode == "raw" and not enable_raw_yuyv(cap):
+                results[mode] = None
+                break
+            for _ in range(5):
+                cap.read()
+            cpu = time.process_time()
+            for _ in range(frames):
+                ret, frame = cap.read()
+                if ret and mode == "raw":
+                    as_yuyv(frame, cap)
+            results[mode] = (time.process_time() - cpu) / frames
+        disable_raw_yuyv(cap)
+    finally:
+        cap.release()
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Converted BGR vs raw YUYV camera loop CPU")
+    parser.add_argument("--frames", type=int, default=300, help="10 s of frames at 30 fps")
+    parser.add_argument("--capture-every", type=int, default=30, help="frames per captured still")
+    parser.add_argument("--preview-size", default="160x160")
+    parser.add_argument("--device", help="also time cap.read() on this V4L2 device")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    preview_size = tuple(int(v) for v in args.preview_size.split("x"))
+    # A handful of distinct frames is enough, the work does not depend on content
+    raws = [bgr_to_yuyv(frame) for frame in synthetic_frames(10)]
+    raws = [raws[n % len(raws)] for n in range(args.frames)]
+
+    print(f"{args.frames} frames 640x480, a still every {args.capture_every}")
+    # The PNG encode of the stills is the same in both, the second pass leaves it out
+    for label, capture_every in (("with stills", args.capture_every), ("loop only", args.frames + 1)):
+        converted = converted_loop(raws, preview_size, capture_every)
+        raw = raw_loop(raws, preview_size, capture_every)
+        print(f"{label:>11}: converted {1e3 * converted / args.frames:6.3f} ms CPU/frame, "
+              f"raw {1e3 * raw / args.frames:6.3f} ms ({100 * raw / converted:.0f}%)")
+
+    if args.device:
+        reads = device_reads(args.device, args.frames)
+        for mode, cost in reads.items():
+            if cost is None:
+                print(f"{mode:>9} read: not supported by this camera")
+            else:
+                print(f"{mode:>9} read: {1e3 * cost:6.3f} ms CPU/frame")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import cv2
+
+CALIBRATION_FILE = os.environ.get("HETAOPI_CALIBRATION", "/home/pi/.hetaopi/calibration.json")
+DEFAULT_EXPOSURE = 400
+
+# Mean luma range a frame must fall in to count as usable
+GOOD_LUMA_RANGE = (40, 220)
+
+
+def get_camera_serial(device_path):
+    """Serial of the USB camera behind a /dev/videoN node, or None"""
+    dev_name = Path(device_path).name
+    # sysfs is much cheaper than spawning udevadm on every open
+    serial_file = Path(f"/sys/class/video4linux/{dev_name}/device/../serial")
+    try:
+        return serial_file.read_text().strip() or None
+    except OSError:
+        pass
+    try:
+        udev_info = subprocess.run(["udevadm", "info", "-q", "property", "-n", device_path],
+                                   capture_output=True, text=True, timeout=2).stdout
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    serial_match = re.search(r'ID_SERIAL_SHORT=([\w]+)', udev_info)
+    return serial_match.group(1) if serial_match else None
+
+def frame_luma(frame):
+    """Mean luma of a BGR or raw YUYV frame, sampled on a sparse grid"""
+    if frame.ndim == 3 and frame.shape[2] == 2:
+        return float(frame[::8, ::8, 0].mean())
+    sample = frame[::8, ::8].astype("float32")
+    return float((0.114 * sample[..., 0] + 0.587 * sample[..., 1] + 0.299 * sample[..., 2]).mean())
+
+def is_good_frame(frame):
+    low, high = GOOD_LUMA_RANGE
+    return low <= frame_luma(frame) <= high
+
+
+class CalibrationCache:
+    """Per-camera settings keyed by UUID, invalidated when the serial changes"""
+
+    def __init__(self, path=CALIBRATION_FILE):
+        self.path = Path(path)
+        self.entries = None
+        self.mtime = None
+
+    def load(self):
+        # Re-read only when the file changed, long-lived processes pick up new calibrations
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if self.entries is None or mtime != self.mtime:
+            try:
+                self.entries = json.loads(self.path.read_text())
+            except (OSError, ValueError):
+                self.entries = {}
+            self.mtime = mtime
+        return self.entries
+
+    def get(self, uuid, serial):
+        entry = self.load().get(uuid)
+        if entry is None or entry.get("serial") != serial:
+            return None
+        return entry
+
+    def put(self, uuid, serial, settings):
+        entries = self.load()
+        entries[uuid] = dict(settings, serial=serial,
+                             calibrated_at=datetime.now().isoformat(timespec="seconds"))
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(entries, indent=2, sort_keys=True))
+        os.replace(tmp_path, self.path)
+
+
+def apply_calibration(cap, settings):
+    cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1)
+    cap.set(cv2.CAP_PROP_EXPOSURE, settings.get("exposure", DEFAULT_EXPOSURE))
+    if settings.get("gain") is not None:
+        cap.set(cv2.CAP_PROP_GAIN, settings["gain"])
+    if settings.get("wb_temperature") is not None:
+        cap.set(cv2.CAP_PROP_AUTO_WB, 0)
+        cap.set(cv2.CAP_PROP_WB_TEMPERATURE, settings["wb_temperature"])
+
+def read_settled(cap, settle_frames=3):
+    """Read a frame after letting a settings change reach the sensor"""
+    frame = None
+    for _ in range(settle_frames + 1):
+        ret, frame = cap.read()
+        if not ret:
+            raise RuntimeError("Camera read failed during calibration")
+    return frame
+
+def calibrate(cap, target_luma=128, tolerance=6, max_iterations=12,
+              exposure_range=(3, 2047), gain_range=(0, 100), wb_range=(2800, 6500)):
+    """Converge exposure, then gain, then white balance on a grey reference target"""
+    exposure = DEFAULT_EXPOSURE
+    gain = gain_range[0]
+    cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1)
+    cap.set(cv2.CAP_PROP_GAIN, gain)
+
+    luma = None
+    for _ in range(max_iterations):
+        cap.set(cv2.CAP_PROP_EXPOSURE, exposure)
+        cap.set(cv2.CAP_PROP_GAIN, gain)
+        luma = frame_luma(read_settled(cap))
+        if abs(luma - target_luma) <= tolerance:
+            break
+        # Luma is roughly linear in exposure, step by the ratio
+        ratio = target_luma / max(luma, 1.0)
+        new_exposure = int(min(max(exposure * ratio, exposure_range[0]), exposure_range[1]))
+        if new_exposure == exposure and ratio > 1:
+            # Exposure is maxed out, make up the rest with gain
+            gain = int(min(gain + max(1, (gain_range[1] - gain_range[0]) // 8), gain_range[1]))
+        exposure = new_exposure
+
+    # Grey target: warmer temperature setting adds red, so bisect on blue minus red
+    cap.set(cv2.CAP_PROP_AUTO_WB, 0)
+    low, high = wb_range
+    wb_temperature = (low + high) // 2
+    for _ in range(8):
+        cap.set(cv2.CAP_PROP_WB_TEMPERATURE, wb_temperature)
+        frame = read_settled(cap)
+        blue = float(frame[::8, ::8, 0].mean())
+        red = float(frame[::8, ::8, 2].mean())
+        if abs(blue - red) <= 2:
+            break
+        if blue > red:
+            low = wb_temperature
+        else:
+            high = wb_temperature
+        wb_temperature = (low + high) // 2
+
+    return {"exposure": exposure, "gain": gain, "wb_temperature": wb_temperature,
+            "luma": round(luma, 1)}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate a camera against a grey reference target")
+    parser.add_argument("--uuid", required=True, help="camera UUID")
+    parser.add_argument("--target-luma", type=int, default=128)
+    parser.add_argument("--cache", default=CALIBRATION_FILE)
+    parser.add_argument("--show", action="store_true", help="print the cached entry and exit")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    from capture_engine import get_camera_uuid_map, open_camera_by_uuid
+
+    args = parse_args(argv)
+    cache = CalibrationCache(args.cache)
+    device_path = get_camera_uuid_map().get(args.uuid)
+    serial = get_camera_serial(device_path) if device_path else None
+
+    if args.show:
+        print(json.dumps(cache.get(args.uuid, serial), indent=2))
+        return 0
+
+    cap = open_camera_by_uuid(args.uuid, use_calibration=False)
+    try:
+        start = time.monotonic()
+        settings = calibrate(cap, target_luma=args.target_luma)
+        print(f"Calibrated in {time.monotonic() - start:.1f}s: {settings}")
+    finally:
+        cap.release()
+    cache.put(args.uuid, serial, settings)
+    print(f"Saved to {cache.path}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
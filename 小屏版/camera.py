@@ -1,21 +1,21 @@
 #!/usr/bin/env python3
-import requests
 import time
-from datetime import datetime
-import cv2
-import itertools
-import uuid
-from pathlib import Path
 import sys
 import os
-import subprocess
-import threading
-import numpy as np
-from PyQt5.QtCore import QThread, pyqtSignal, QObject, Qt, QTimer, QSize
+from PyQt5.QtCore import QObject, Qt, QTimer, QSize
 from PyQt5 import QtGui, QtWidgets, QtCore
 import fcntl
 
-counter = itertools.count(1)
+# Nothing here may import cv2, numpy or requests: the capture engine is
+# loaded by CameraWarmup while the window comes up, see startup.py
+from qt_bridge import SessionBridge
+import tracing
+from sampling_profiler import install_signal_trigger
+from governor import Governor
+from capture_plan import CapturePlan
+from endpoints import EndpointRouter
+from startup import StartupTimeline, CameraWarmup
+
 class SingleInstance:
    
     def __init__(self, lock_file="/tmp/camera_app.lock"):
@@ -47,143 +47,45 @@ class SingleInstance:
                     os.unlink(self.lock_file)
             except:
                 pass
-            
-def get_camera_uuid_map():
-    return {
-        '25a955ae-5302-542f-a6c7-7198b08636d1': '/dev/video1',
-        '559361ab-dd00-5df7-8c13-1c7bdda1492b': '/dev/video2'
-    }
-
-def open_camera_by_uuid(target_uuid, api_preference=cv2.CAP_V4L2):
-    uuid_map = get_camera_uuid_map()
-    
-    if target_uuid not in uuid_map:
-        available_uuids = "\n".join(uuid_map.keys())
-        raise ValueError(f"Invalid UUID provided. Available UUIDs:\n{available_uuids}")
-    
-    device_path = uuid_map[target_uuid]
-    
-    if not Path(device_path).exists():
-        raise FileNotFoundError(f"Camera device not found: {device_path}")
-    
-    cap = cv2.VideoCapture(device_path, api_preference)
-    cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1)
-    cap.set(cv2.CAP_PROP_EXPOSURE, 400)
-
-    if not cap.isOpened():
-        raise RuntimeError(f"Failed to open camera at {device_path}")
-    
-    return cap
 
-def generate_filename(prefix="image"):
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f")[:-3]  
-    return f"{prefix}_{timestamp}.png"
-
-def send_image(png_binary, server_url):
-    try:
-        filename = generate_filename()  
-        files = {'images': (filename, png_binary)}
-        response = requests.post(server_url, files=files, timeout=5)
-        return filename, response.json()
-    except Exception as e:
-        print(f"Error sending image: {str(e)}")
-        return None, str(e)
-
-class CameraThread(QThread):
-    image_updated = pyqtSignal(QtGui.QImage)
-    capture_image_ready = pyqtSignal(bytes) 
-    initial_size_determined = pyqtSignal(QSize) # Signal for initial image size
-    
-    def __init__(self, uuid, parent=None):
-        super().__init__(parent)
-        self.target_uuid = uuid
-        self.running = True
-        self.capture_enabled = False
-        self.current_frame = None
-        self.lock = threading.Lock()
-        self.initial_size_set = False
-        self.PREVIEW_WIDTH = 160
-        self.PREVIEW_HEIGHT = 160
-    
-    def run(self):
-        try:
-            self.cap = open_camera_by_uuid(self.target_uuid)
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-            
-            while self.running:
-                ret, frame = self.cap.read()
-                if ret:
-                    with self.lock:
-                        self.current_frame = frame.copy()
-                    
-                    # Convert to RGB for display
-                    rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    h, w, ch = rgb_image.shape
-                    
-                    # Resize for small screen preview ()
-                    resized = cv2.resize(rgb_image, (int(self.PREVIEW_WIDTH), int(self.PREVIEW_HEIGHT)))
-                    resized_h, resized_w, _ = resized.shape
-                    
-                    bytes_per_line = 3 * resized_w
-                    qimage = QtGui.QImage(resized.data, resized_w, resized_h, bytes_per_line, QtGui.QImage.Format_RGB888)
-                    
-                    # Emit initial size once
-                    if not self.initial_size_set:
-                        self.initial_size_determined.emit(QSize(w, h))
-                        self.initial_size_set = True
-                    
-                    # Send preview image
-                    self.image_updated.emit(qimage)
-                
-                if self.capture_enabled:
-                    self.process_capture_request()
-                    self.capture_enabled = False
-                
-                self.msleep(30)
-                
-        except Exception as e:
-            print(f"Camera error: {str(e)}")
-        finally:
-            if hasattr(self, 'cap') and self.cap.isOpened():
-                self.cap.release()
-    
-    def process_capture_request(self):
-        with self.lock:
-            if self.current_frame is not None:
-                _, buffer = cv2.imencode('.png', self.current_frame)
-                png_binary = buffer.tobytes()
-                self.capture_image_ready.emit(png_binary)
-    
-    def stop(self):
-        self.running = False
-        self.wait()
-    
-    def request_capture(self):
-        self.capture_enabled = True
 
 class Ui_MainWindow(QObject):
-    update_send_status = pyqtSignal(str, str)
-    script_completed = pyqtSignal()
-    
-    def __init__(self):
+    def __init__(self, warmup=None):
         super().__init__()
-        self.camera_thread = None  # 
-        self.SERVER_IP = '192.168.91.135'
+        self.session = None
+        # Loads the engine and keeps the camera open for the sessions
+        self.warmup = warmup
+        # HETAOPI_SERVERS=host[:port],... spreads uploads over several servers
+        self.SERVER_IPS = os.environ.get("HETAOPI_SERVERS", '192.168.91.135')
         self.PORT = 5000
-        self.server_url = f'http://{self.SERVER_IP}:{self.PORT}/upload'
+        self.router = EndpointRouter.from_servers(self.SERVER_IPS, self.PORT)
+        self.router.start()
         
         self.external_script = "/home/pi/test/app_io.py"
+        # None is capture_engine.DEFAULT_CAMERA_UUID
+        self.camera_uuid = None
         
         # Capture settings
         self.MAX_IMAGES = 60
+        # HETAOPI_PLAN picks a capture plan per assay, e.g. protein; MAX_IMAGES stays the budget
+        plan = os.environ.get("HETAOPI_PLAN")
+        self.capture_plan = CapturePlan.parse(plan) if plan else None
+        # HETAOPI_CONVERGE=1 ends a session once the strip stops changing
+        self.converge = os.environ.get("HETAOPI_CONVERGE") == "1"
         self.captured_count = 0
+        self.PREVIEW_WIDTH = 160
+        self.PREVIEW_HEIGHT = 160
+        # Set HETAOPI_TRACE to a directory to write a Perfetto trace per session
+        self.trace_dir = os.environ.get("HETAOPI_TRACE")
+        # HETAOPI_GOVERNOR=0 keeps the full preview rate even when the board is hot
+        self.governor = None
+        if os.environ.get("HETAOPI_GOVERNOR", "1") != "0":
+            self.governor = Governor()
+            self.governor.start()
         
         # Timers
         self.statusbar_timer = QTimer()
         self.statusbar_timer.timeout.connect(self.update_status_time)
-        self.capture_timer = QTimer()
-        self.capture_timer.timeout.connect(self.capture_image)
         
         self.operation_time = 0
         self.operation_start_time = time.time()
@@ -314,150 +216,88 @@ class Ui_MainWindow(QObject):
         self.close_button.clicked.connect(MainWindow.close)
         
         # Connect custom signals
-        self.update_send_status.connect(self.handle_update_send_status)
-        self.script_completed.connect(self.on_script_completed)
-        
-        # Program state
-        self.external_script_running = False
-        self.external_script_completed = False
+        # Engine callbacks arrive on worker threads, route them through the bridge
+        self.bridge = SessionBridge()
+        self.bridge.status_changed.connect(self.handle_status)
+        self.bridge.progress_changed.connect(self.handle_progress)
+        self.bridge.image_updated.connect(self.update_image)
+        self.bridge.send_status.connect(self.handle_update_send_status)
+        self.bridge.capture_done.connect(self.on_capture_done)
+        if self.warmup:
+            # The first frame is shown as soon as the camera is open, before 启动
+            self.warmup.attach(self.bridge.on_preview, (self.PREVIEW_WIDTH, self.PREVIEW_HEIGHT))
+            # 启动 waits for the engine here, never on the GUI thread
+            self.start_button.setEnabled(False)
+            self.bridge.engine_ready.connect(self.on_engine_ready)
+            self.warmup.when_ready(self.bridge.engine_ready.emit)
+
+    def on_engine_ready(self):
+        self.start_button.setEnabled(True)
     
     def start_capture(self):
         """Start the capture process"""
         try:
-            if self.camera_thread and self.camera_thread.isRunning():
+            if self.session and not self.session.capture_done.is_set():
                 return
             
             # Update UI state
             self.start_button.setEnabled(False)
-            # self.stop_button.setEnabled(True)
             if self.close_button:
                 self.close_button.setEnabled(False)
-            
-            # Start camera preview
-            if self.status_label:
-                self.status_label.setText("开始启动相机...")
-            
-            self.camera_thread = CameraThread('25a955ae-5302-542f-a6c7-7198b08636d1')
-            
-            # Connect signals
-            if self.image_label:
-                self.camera_thread.image_updated.connect(self.update_image)
-            self.camera_thread.capture_image_ready.connect(self.handle_capture_complete)
-            self.camera_thread.start()
+            if self.progress_label:
+                self.progress_label.setText("正在运行气泵")
             
             # Reset counters and timers
             self.captured_count = 0
-            self.external_script_completed = False
             self.operation_start_time = time.time()
             self.operation_time = 0
             self.statusbar_timer.start(1000)
             self.update_status_time()
             
-            # Start external script
-            self.run_external_script()
+            # Already imported by the warm-up thread, 启动 is enabled once it is
+            from capture_engine import CaptureSession, DEFAULT_CAMERA_UUID
+            camera_pool = self.warmup.pool if self.warmup else None
+            convergence = None
+            if self.converge:
+                from convergence import ConvergenceDetector
+                convergence = ConvergenceDetector()
+            
+            trace_path = None
+            if self.trace_dir:
+                trace_path = os.path.join(self.trace_dir, time.strftime("session_%Y-%m-%d_%H-%M-%S.json"))
+            self.session = CaptureSession(
+                self.router.urls[0],
+                camera_uuid=self.camera_uuid or DEFAULT_CAMERA_UUID,
+                camera_pool=camera_pool,
+                max_images=self.MAX_IMAGES,
+                pump_script=self.external_script,
+                preview_size=(self.PREVIEW_WIDTH, self.PREVIEW_HEIGHT),
+                listener=self.bridge,
+                trace_path=trace_path,
+                governor=self.governor,
+                router=self.router,
+                plan=self.capture_plan,
+                convergence=convergence
+            )
+            self.session.start()
             
         except Exception as e:
             print(f"Error starting capture: {str(e)}")
             if self.status_label:
                 self.status_label.setText(f"Start failed: {str(e)}")
             self.start_button.setEnabled(True)
-            # self.stop_button.setEnabled(False)
             if self.close_button:
                 self.close_button.setEnabled(True)
     
-    def run_external_script(self):
-        """Execute the external Python script"""
-        try:
-            if self.status_label:
-                self.status_label.setText("气泵运行中...")
-            if self.progress_label:
-                self.progress_label.setText("正在运行气泵")
-            
-            if not os.path.exists(self.external_script):
-                if self.status_label:
-                    self.status_label.setText(f"Script not found: {self.external_script}")
-                self.script_completed.emit()
-                return
-                
-            # Mark script as running
-            self.external_script_running = True
-            
-            # Start script execution in separate thread
-            threading.Thread(
-                target=self.run_script_thread,
-                daemon=True
-            ).start()
-            
-        except Exception as e:
-            if self.status_label:
-                self.status_label.setText(f"Script error: {str(e)}")
-            self.script_completed.emit()
-    
-    def run_script_thread(self):
-        """Thread for running external script"""
-        try:
-            command = f"sudo python3 {self.external_script}"
-            result = subprocess.run(command, shell=True, capture_output=True, text=True)
-            
-            # Emit completion signal regardless of success
-            self.script_completed.emit()
-        except Exception as e:
-            print(f"Error running script: {str(e)}")
-            self.script_completed.emit()
-    
-    def on_script_completed(self):
-        """Handle completion of external script"""
-        self.external_script_running = False
-        self.external_script_completed = True
-        
-        # Start capturing images
+    def handle_status(self, text):
         if self.status_label:
-            self.status_label.setText("开始捕获图像")
-        self.capture_timer.start(1000)
+            self.status_label.setText(text)
     
-    def capture_image(self):
-        """Capture and send an image"""
-        if (not self.camera_thread or 
-            not self.camera_thread.isRunning() or 
-            not self.external_script_completed):
-            return
-            
-        if self.captured_count >= self.MAX_IMAGES:
-            self.stop_capture()
-            return
-            
-        # Request image capture
-        self.camera_thread.request_capture()
-        if self.status_label:
-            self.status_label.setText("捕获图像...")
-    
-    def handle_capture_complete(self, image_data):
-        """Process captured image"""
-        if self.external_script_completed and self.captured_count < self.MAX_IMAGES:
-            if self.status_label:
-                self.status_label.setText(f"发送图片 {self.captured_count+1}/{self.MAX_IMAGES}...")
-            threading.Thread(
-                target=self.send_image_thread,
-                args=(image_data,),
-                daemon=True
-            ).start()
-            
-            # Update image counter
-            self.captured_count += 1
-            if self.progress_label:
-                self.progress_label.setText(f"图片: {self.captured_count}/{self.MAX_IMAGES}")
-            
-            # Stop after reaching max images
-            if self.captured_count >= self.MAX_IMAGES:
-                self.stop_capture()
-    
-    def send_image_thread(self, image_data):
-        """Thread for sending images to server"""
-        try:
-            filename, response = send_image(image_data, self.server_url)
-            self.update_send_status.emit(filename, str(response))
-        except Exception as e:
-            self.update_send_status.emit("", f"Send error: {str(e)}")
+    def handle_progress(self, count, total):
+        """Update image counter"""
+        self.captured_count = count
+        if self.progress_label:
+            self.progress_label.setText(f"图片: {count}/{total}")
     
     def handle_update_send_status(self, filename, response):
         """Update UI with send status"""
@@ -474,50 +314,61 @@ class Ui_MainWindow(QObject):
         if self.timer_label:
             self.timer_label.setText(f"Time: {minutes:02d}:{seconds:02d}")
     
-    def stop_capture(self):
-        """Stop all capture processes"""
-        if self.camera_thread:
-            self.camera_thread.stop()
-            self.camera_thread = None
-        
-        if self.capture_timer.isActive():
-            self.capture_timer.stop()
+    def on_capture_done(self, count):
+        """Camera is released, uploads may still be draining"""
+        preview_stats = self.bridge.stats()["preview"]
+        print(f"Preview frames shown: {preview_stats['delivered']}, "
+              f"coalesced: {preview_stats['coalesced']}")
+        self.stop_capture(self.session.stop_reason if self.session else None)
+    
+    def stop_capture(self, reason=None):
+        """Stop all capture processes, reason is shown when capture ended on its own"""
+        if self.session:
+            self.session.stop()
             
         if self.statusbar_timer.isActive():
             self.statusbar_timer.stop()
         
-        self.external_script_running = False
-        self.external_script_completed = False
-        
         # Update UI state
         if self.start_button:
             self.start_button.setEnabled(True)
-        # if self.stop_button:
-        #     self.stop_button.setEnabled(False)
         if self.close_button:
             self.close_button.setEnabled(True)
         
-        if self.captured_count >= self.MAX_IMAGES and self.status_label:
-            self.status_label.setText(f"完成! 捕获 {self.MAX_IMAGES} 图片")
+        # A capture plan may take fewer than MAX_IMAGES
+        total = self.session.max_images if self.session else self.MAX_IMAGES
+        if self.captured_count >= total and self.status_label:
+            self.status_label.setText(f"完成! 捕获 {total} 图片")
+        elif reason and reason != "stopped" and self.status_label:
+            self.status_label.setText(f"完成! 捕获 {self.captured_count} 图片, {reason}")
     
     def update_image(self, qimage):
         """Display the image using fixed size (without scaling)"""
         if self.image_label:
-            # Create pixmap directly from QImage
-            pixmap = QtGui.QPixmap.fromImage(qimage)
-            
-            # Set pixmap without scaling
-            self.image_label.setPixmap(pixmap)
+            with tracing.span("ui.update_image", "ui"):
+                # Create pixmap directly from QImage
+                pixmap = QtGui.QPixmap.fromImage(qimage)
+                
+                # Set pixmap without scaling
+                self.image_label.setPixmap(pixmap)
+            if self.warmup:
+                self.warmup.frame_shown()
 
     def closeEvent(self, event):
         """Clean up on application close"""
         self.stop_capture()
+        if self.session:
+            from capture_engine import STOP_TIMEOUT
+            # Bounded, a camera stuck in the driver is abandoned after STOP_TIMEOUT
+            self.session.capture_done.wait(STOP_TIMEOUT + 1)
+        if self.warmup:
+            self.warmup.close()
         event.accept()
 
 class CameraApp(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, warmup=None):
         super().__init__()
-        self.ui = Ui_MainWindow()
+        self.ui = Ui_MainWindow(warmup)
         self.ui.setupUi(self)
         
         self.setWindowTitle("尿蛋白云存储")
@@ -544,6 +395,11 @@ class CameraApp(QtWidgets.QMainWindow):
 
 if __name__ == "__main__":
     with SingleInstance():
+        timeline = StartupTimeline("camera")
+        timeline.mark("imports")
+        # The camera opens while Qt starts and the window is built
+        warmup = CameraWarmup(timeline=timeline)
+        warmup.start()
         os.environ["DISPLAY"] = ":0.0"
         
         app = QtWidgets.QApplication(sys.argv)
@@ -554,9 +410,13 @@ if __name__ == "__main__":
         font.setPointSize(10)
         app.setFont(font)
         
-        main_window = CameraApp()
+        main_window = CameraApp(warmup)
         main_window.show()
+        # Runs once the event loop has started and the window is mapped
+        QTimer.singleShot(0, lambda: timeline.mark("ui_ready"))
         import signal
         signal.signal(signal.SIGINT, signal.SIG_DFL)
+        # kill -USR1 <pid> profiles the running app, see sampling_profiler.py
+        install_signal_trigger(output_dir=os.environ.get("HETAOPI_PROFILE_DIR", "/tmp"))
         
         sys.exit(app.exec_())
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+import threading
+import time
+from contextlib import contextmanager
+
+import cv2
+
+from capture_engine import open_camera_by_uuid
+
+
+class CameraHandle:
+    """An opened and configured camera kept between sessions"""
+
+    def __init__(self, uuid, cap, open_latency, frame_interval):
+        self.uuid = uuid
+        self.cap = cap
+        self.open_latency = open_latency
+        self.frame_interval = frame_interval
+        self.resume_latency = None
+        self.leased = False
+        self.paused_at = None
+        self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            "uuid": self.uuid,
+            "leased": self.leased,
+            "open_latency": round(self.open_latency, 3),
+            "resume_latency": None if self.resume_latency is None else round(self.resume_latency, 3),
+            "frame_interval": round(self.frame_interval, 4)
+        }
+
+
+class CameraPool:
+    """Keeps V4L2 devices open and hands out one lease per camera at a time.
+
+    OpenCV has no STREAMOFF, so an idle handle is paused by no longer
+    dequeuing frames. The driver buffer is kept at one frame, and resume
+    drops whatever was queued while idle so the first read is current.
+    """
+
+    def __init__(self, width=640, height=480):
+        self.width = width
+        self.height = height
+        self.handles = {}
+        # Cameras being opened outside the lock, nobody else may lease them yet
+        self.opening = set()
+        self.condition = threading.Condition()
+
+    def open_handle(self, uuid):
+        start = time.monotonic()
+        cap = open_camera_by_uuid(uuid)
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        # First grab completes format negotiation and starts streaming
+        cap.grab()
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_interval = 1.0 / fps if fps and fps > 0 else 1.0 / 30
+        handle = CameraHandle(uuid, cap, time.monotonic() - start, frame_interval)
+        print(f"Camera {uuid} opened in {handle.open_latency:.3f}s")
+        return handle
+
+    def warm(self, uuid):
+        """Open a camera ahead of its first session"""
+        with self.condition:
+            if uuid in self.handles or uuid in self.opening:
+                return
+            self.opening.add(uuid)
+        self.open_slot(uuid, leased=False)
+
+    def available(self, uuid):
+        handle = self.handles.get(uuid)
+        return uuid not in self.opening and (handle is None or not handle.leased)
+
+    def acquire(self, uuid, timeout=None):
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.available(uuid), timeout):
+                raise TimeoutError(f"Camera {uuid} is leased by another session")
+
+            handle = self.handles.get(uuid)
+            if handle is not None and not handle.cap.isOpened():
+                del self.handles[uuid]
+                handle = None
+            if handle is None:
+                self.opening.add(uuid)
+            else:
+                handle.leased = True
+
+        # Device I/O runs outside the lock, a slow or hung camera only holds up its own lease
+        if handle is None:
+            return self.open_slot(uuid, leased=True)
+        if handle.paused_at is not None and not self.resume(handle):
+            handle.cap.release()
+            with self.condition:
+                if self.handles.get(uuid) is handle:
+                    del self.handles[uuid]
+                self.opening.add(uuid)
+            return self.open_slot(uuid, leased=True)
+        handle.paused_at = None
+        return handle
+
+    def open_slot(self, uuid, leased):
+        """Open a camera marked as opening, then publish its handle"""
+        handle = None
+        try:
+            handle = self.open_handle(uuid)
+        finally:
+            with self.condition:
+                self.opening.discard(uuid)
+                if handle is not None:
+                    handle.leased = leased
+                    handle.paused_at = None if leased else time.monotonic()
+                    self.handles[uuid] = handle
+                self.condition.notify_all()
+        return handle
+
+    def resume(self, handle):
+        """Discard frames queued while paused, returns False if the device stopped responding"""
+        start = time.monotonic()
+        # A stale buffered frame returns almost immediately, a live one takes about a frame interval
+        for _ in range(4):
+            grab_start = time.monotonic()
+            if not handle.cap.grab():
+                return False
+            if time.monotonic() - grab_start >= handle.frame_interval / 2:
+                break
+        handle.resume_latency = time.monotonic() - start
+        return True
+
+    def release(self, handle):
+        with self.condition:
+            handle.leased = False
+            handle.paused_at = time.monotonic()
+            self.condition.notify_all()
+
+    @contextmanager
+    def lease(self, uuid, timeout=None):
+        handle = self.acquire(uuid, timeout)
+        try:
+            yield handle
+        finally:
+            self.release(handle)
+
+    def discard(self, handle):
+        """Drop a handle whose device failed so the next acquire reopens it"""
+        with self.condition:
+            if self.handles.get(handle.uuid) is handle:
+                del self.handles[handle.uuid]
+            handle.leased = False
+            if handle.cap.isOpened():
+                handle.cap.release()
+            self.condition.notify_all()
+
+    def abandon(self, handle):
+        """Forget a handle whose reader is stuck, without touching the device"""
+        with self.condition:
+            if self.handles.get(handle.uuid) is handle:
+                del self.handles[handle.uuid]
+            handle.leased = False
+            self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            return [handle.stats() for handle in self.handles.values()]
+
+    def close(self):
+        with self.condition:
+            for handle in self.handles.values():
+                if handle.cap.isOpened():
+                    handle.cap.release()
+            self.handles.clear()
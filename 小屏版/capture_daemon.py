@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import os
+import queue
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+# Loaded once for the life of the daemon instead of once per sample
+from capture_engine import (CaptureSession, SessionListener, DEFAULT_CAMERA_UUID,
+                            PUMP_SCRIPT, get_camera_uuid_map)
+from camera_pool import CameraPool
+from adaptive_encoder import AdaptiveEncoder
+from governor import Governor
+from endpoints import EndpointRouter
+from tile_delta import DeltaEncoder
+from capture_plan import CapturePlan
+from convergence import ConvergenceDetector
+from daemon_client import SOCKET_PATH
+from sampling_profiler import profile, install_signal_trigger, DEFAULT_DURATION
+
+MAX_PROFILE_SECONDS = 120
+
+
+def positive(parse):
+    def check(value):
+        value = parse(value)
+        if value <= 0:
+            raise ValueError("must be positive")
+        return value
+    return check
+
+
+def parse_size(value):
+    width, height = (positive(int)(v) for v in value)
+    return width, height
+
+
+def parse_converge(value):
+    """true for the defaults, or {"threshold", "window", "hold", "min_time"}"""
+    if value is True:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError("expected true or an object")
+    # Unknown keys fail here rather than in the worker
+    ConvergenceDetector(**value)
+    for name in ("threshold", "window", "hold", "min_time"):
+        if name in value:
+            positive(float)(value[name])
+    return value
+
+
+def parse_plan(value):
+    if not isinstance(value, str):
+        raise ValueError("expected a plan name or a phase list such as 10hz:3,1hz:10")
+    return CapturePlan.parse(value)
+
+
+def parse_output(value):
+    if value not in ("png", "video"):
+        raise ValueError("expected png or video")
+    return value
+
+
+def parse_uuid(value):
+    if value not in get_camera_uuid_map():
+        raise ValueError("unknown camera")
+    return value
+
+
+def parse_options(options, camera_uuid):
+    """Checked settings of a start command, ValueError names the bad option"""
+    settings = {}
+    for name, parse, default in (("interval", positive(float), 1.0),
+                                 ("count", positive(int), 60),
+                                 ("key_interval", positive(int), 10),
+                                 ("uuid", parse_uuid, camera_uuid),
+                                 ("plan", parse_plan, None),
+                                 ("output", parse_output, "png"),
+                                 ("still_size", parse_size, None),
+                                 ("converge", parse_converge, None)):
+        value = options.get(name)
+        if value is None or value is False:
+            settings[name] = default
+            continue
+        try:
+            settings[name] = parse(value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"bad {name} {value!r}: {e}")
+    if settings["plan"] and settings["output"] == "video":
+        # CaptureSession refuses this too, but only on the worker
+        raise ValueError("a plan needs png output, video assumes a fixed frame rate")
+    return settings
+
+
+class SessionJob:
+    def __init__(self, job_id, options):
+        self.id = job_id
+        self.options = options
+        self.state = "queued"
+        self.queued_at = time.monotonic()
+        self.started_at = None
+        self.capture_done_at = None
+        self.finished_at = None
+        self.session = None
+        # Settings checked by parse_options, and why the job never ran
+        self.settings = None
+        self.error = None
+        # Set under the daemon's lock once run_session is done with the job
+        self.finished = False
+        self.done = threading.Event()
+
+    def summary(self):
+        result = {"id": self.id, "state": self.state}
+        if self.started_at is not None:
+            result["queue_wait"] = round(self.started_at - self.queued_at, 3)
+        if self.capture_done_at is not None and self.started_at is not None:
+            # How long the camera was held, then how long uploads ran on after it
+            result["camera_time"] = round(self.capture_done_at - self.started_at, 3)
+        # A session can finish before run_job has seen its capture end
+        if self.finished_at is not None and self.capture_done_at is not None:
+            result["upload_tail"] = round(self.finished_at - self.capture_done_at, 3)
+        if self.session:
+            latency = self.session.first_capture_latency()
+            result["captured"] = self.session.captured_count
+            result["stop_reason"] = self.session.stop_reason
+            result["first_capture_latency"] = None if latency is None else round(latency, 3)
+            latency = self.session.first_good_frame_latency()
+            result["first_good_frame_latency"] = None if latency is None else round(latency, 3)
+            result["adaptations"] = len(self.session.adaptations())
+            if self.session.schedule_stats():
+                result["schedule"] = self.session.schedule_stats()
+            if self.session.encoder_stats():
+                result["encoding"] = self.session.encoder_stats()
+            stop = self.session.camera_stop_duration()
+            result["camera_stop"] = None if stop is None else round(stop, 3)
+            if self.session.stream_stats():
+                result["stream"] = self.session.stream_stats()
+            if self.session.trace_path:
+                result["trace"] = self.session.trace_path
+            if self.session.error:
+                result["error"] = str(self.session.error)
+        if self.error:
+            result["error"] = self.error
+        return result
+
+
+class JobListener(SessionListener):
+    def __init__(self, job):
+        self.job = job
+
+    def on_status(self, text):
+        print(f"[{self.job.id}] {text}", flush=True)
+
+    def on_sent(self, filename, response):
+        if not filename:
+            print(f"[{self.job.id}] send failed: {response}", flush=True)
+
+
+class CaptureDaemon:
+    """Runs queued sessions in a long-lived process.
+
+    Sessions hold the camera one at a time, but the next one starts as soon
+    as the camera is free while earlier uploads drain in the background, at
+    most max_draining of them.
+    """
+
+    def __init__(self, server_url, camera_uuid=DEFAULT_CAMERA_UUID, pump_script=PUMP_SCRIPT,
+                 trace_dir=None, max_draining=2, profile_dir="/tmp", governor=None, router=None):
+        self.server_url = server_url
+        self.router = router or EndpointRouter([server_url])
+        self.governor = governor
+        self.profile_dir = profile_dir
+        self.trace_dir = trace_dir
+        self.camera_uuid = camera_uuid
+        self.pump_script = pump_script
+        self.queue = queue.Queue()
+        self.jobs = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.current = None
+        self.draining = []
+        self.draining_slots = threading.Semaphore(max_draining + 1)
+        self.camera_pool = CameraPool()
+        self.worker = threading.Thread(target=self.worker_loop, daemon=True)
+
+    def trace_path(self, job):
+        # Clients ask for a trace, the daemon decides where it goes
+        if not self.trace_dir:
+            return None
+        return os.path.join(self.trace_dir, f"job_{job.id}_{time.strftime('%Y-%m-%d_%H-%M-%S')}.json")
+
+    def start(self):
+        try:
+            self.camera_pool.warm(self.camera_uuid)
+        except Exception as e:
+            print(f"Camera warm-up failed: {str(e)}", flush=True)
+        self.worker.start()
+
+    def submit(self, options):
+        """Queue a session, raises ValueError for options it could not run with"""
+        settings = parse_options(options, self.camera_uuid)
+        with self.lock:
+            job = SessionJob(next(self.ids), options)
+            job.settings = settings
+            self.jobs[job.id] = job
+            position = self.queue.qsize() + (1 if self.current else 0)
+        self.queue.put(job)
+        return job, position
+
+    def worker_loop(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+            try:
+                self.run_job(job)
+            except Exception as e:
+                # The job fails, the daemon keeps serving the queue
+                print(f"[{job.id}] could not start: {str(e)}", flush=True)
+                with self.lock:
+                    if self.current is job:
+                        self.current = None
+                job.error = str(e)
+                job.state = "failed"
+                job.done.set()
+        for job in list(self.draining):
+            job.done.wait()
+        self.camera_pool.close()
+
+    def run_job(self, job):
+        options = job.options
+        settings = job.settings
+        plan = settings["plan"]
+        encoder = None
+        if options.get("adaptive"):
+            # A plan's shortest interval is the tightest time budget per frame
+            budget = plan.shortest_interval() if plan else settings["interval"]
+            encoder = AdaptiveEncoder(budget, log=JobListener(job).on_status)
+        elif options.get("delta"):
+            encoder = DeltaEncoder(key_interval=settings["key_interval"])
+        converge = settings["converge"]
+        job.session = CaptureSession(
+            self.server_url,
+            camera_uuid=settings["uuid"],
+            max_images=settings["count"],
+            interval=settings["interval"],
+            output_mode=settings["output"],
+            pump_script=None if options.get("no_pump") else self.pump_script,
+            listener=JobListener(job),
+            camera_pool=self.camera_pool,
+            encoder=encoder,
+            trace_path=self.trace_path(job) if options.get("trace") else None,
+            still_size=settings["still_size"],
+            raw_yuyv=bool(options.get("raw_yuyv")),
+            governor=self.governor,
+            router=self.router,
+            plan=plan,
+            convergence=None if converge is None else ConvergenceDetector(**converge)
+        )
+        # Uploads of a finished capture keep a slot until the server has them
+        self.draining_slots.acquire()
+        with self.lock:
+            self.current = job
+        job.state = "running"
+        job.started_at = time.monotonic()
+        threading.Thread(target=self.run_session, args=(job,), daemon=True).start()
+        job.session.capture_done.wait()
+        job.capture_done_at = time.monotonic()
+        with self.lock:
+            self.current = None
+            # Checked under the lock run_session finishes the job under
+            if not job.finished:
+                job.state = "uploading"
+                self.draining.append(job)
+
+    def run_session(self, job):
+        try:
+            job.session.run()
+        finally:
+            job.finished_at = time.monotonic()
+            with self.lock:
+                job.finished = True
+                job.state = "failed" if job.session.error else "done"
+                if job in self.draining:
+                    self.draining.remove(job)
+            self.draining_slots.release()
+            try:
+                summary = job.summary()
+                print(f"[{job.id}] finished: {json.dumps(summary)}", flush=True)
+            finally:
+                # wait=True clients get an answer whatever the summary did
+                job.done.set()
+
+    def samples_per_hour(self):
+        """Finished samples over the wall time from the first start to the last finish"""
+        with self.lock:
+            jobs = [job for job in self.jobs.values() if job.finished_at is not None]
+        if not jobs:
+            return None
+        elapsed = max(job.finished_at for job in jobs) - min(job.started_at for job in jobs)
+        if elapsed <= 0:
+            return None
+        return round(len(jobs) * 3600 / elapsed, 1)
+
+    def status(self):
+        rate = self.samples_per_hour()
+        with self.lock:
+            return {
+                "samples_per_hour": rate,
+                "current": self.current.summary() if self.current else None,
+                "uploading": [job.id for job in self.draining],
+                "queued": self.queue.qsize(),
+                "cameras": self.camera_pool.stats(),
+                "governor": self.governor.status() if self.governor else None,
+                "endpoints": self.router.stats(),
+                "jobs": [job.summary() for job in list(self.jobs.values())[-10:]]
+            }
+
+    def shutdown(self):
+        if self.current and self.current.session:
+            self.current.session.stop()
+        self.queue.put(None)
+
+    def join(self, timeout=None):
+        """Wait for the worker to finish, including uploads still draining"""
+        self.worker.join(timeout)
+        return not self.worker.is_alive()
+
+
+class CommandHandler(socketserver.StreamRequestHandler):
+    def reply(self, message):
+        self.wfile.write(json.dumps(message).encode("utf-8") + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        daemon = self.server.capture_daemon
+        for line in self.rfile:
+            try:
+                command = json.loads(line)
+            except ValueError:
+                self.reply({"ok": False, "error": "invalid json"})
+                continue
+
+            cmd = command.get("cmd")
+            if cmd == "start":
+                try:
+                    job, position = daemon.submit(command)
+                except ValueError as e:
+                    self.reply({"ok": False, "error": str(e)})
+                    continue
+                self.reply({"ok": True, "id": job.id, "position": position})
+                if command.get("wait"):
+                    job.done.wait()
+                    self.reply({"ok": job.state == "done", **job.summary()})
+            elif cmd == "status":
+                self.reply({"ok": True, **daemon.status()})
+            elif cmd == "profile":
+                try:
+                    seconds = min(positive(float)(command.get("seconds", DEFAULT_DURATION)), MAX_PROFILE_SECONDS)
+                except (TypeError, ValueError) as e:
+                    self.reply({"ok": False, "error": f"bad seconds {command.get('seconds')!r}: {e}"})
+                    continue
+                paths = profile(seconds, daemon.profile_dir, prefix="daemon_profile")
+                if paths is None:
+                    self.reply({"ok": False, "error": "a profile is already running"})
+                else:
+                    self.reply({"ok": True, "collapsed": paths[0], "summary": paths[1]})
+            else:
+                self.reply({"ok": False, "error": f"unknown command: {cmd}"})
+
+
+class DaemonServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, capture_daemon):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, CommandHandler)
+        os.chmod(socket_path, 0o666)
+        self.capture_daemon = capture_daemon
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Resident capture service")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--server", default="192.168.91.135",
+                        help="ingest server host, or a comma separated list of host[:port] to route over")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--uuid", default=DEFAULT_CAMERA_UUID, help="camera UUID")
+    parser.add_argument("--pump-script", default=PUMP_SCRIPT)
+    parser.add_argument("--trace-dir", default=None,
+                        help="where traces go for jobs started with \"trace\": true")
+    parser.add_argument("--profile-dir", default="/tmp",
+                        help="where the profile command and SIGUSR1 write sampling profiles")
+    parser.add_argument("--governor", action="store_true",
+                        help="lower preview rate, encode effort and upload concurrency when hot or busy")
+    parser.add_argument("--thermal-root", default="/",
+                        help="tree holding sys/class/thermal and proc/stat, for testing the governor")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    governor = None
+    if args.governor:
+        governor = Governor(args.thermal_root, log=lambda text: print(text, flush=True))
+        governor.start()
+    router = EndpointRouter.from_servers(args.server, args.port,
+                                         log=lambda text: print(text, flush=True))
+    router.start()
+    capture_daemon = CaptureDaemon(
+        router.urls[0],
+        camera_uuid=args.uuid,
+        pump_script=args.pump_script,
+        trace_dir=args.trace_dir,
+        profile_dir=args.profile_dir,
+        governor=governor,
+        router=router
+    )
+    capture_daemon.start()
+    server = DaemonServer(args.socket, capture_daemon)
+
+    def shutdown(signum, frame):
+        capture_daemon.shutdown()
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    install_signal_trigger(output_dir=args.profile_dir, prefix="daemon_profile")
+
+    print(f"listening on {args.socket}", flush=True)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if not capture_daemon.join(30):
+            print("uploads still pending at exit", flush=True)
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
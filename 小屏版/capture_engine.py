@@ -0,0 +1,795 @@
+#!/usr/bin/env python3
+import time
+import hashlib
+import uuid
+from datetime import datetime
+from pathlib import Path
+import os
+import queue
+import subprocess
+import threading
+
+import cv2
+import requests
+
+from chunked_upload import send_image_chunked
+from session_video import SessionVideoWriter
+from adaptive_encoder import PngEncoder
+from dual_stream import DualStream
+from capture_plan import CapturePlan
+from endpoints import EndpointRouter
+from yuyv import enable_raw_yuyv, disable_raw_yuyv, as_yuyv, yuyv_preview_rgb, yuyv_to_bgr
+import tracing
+from session_listener import SessionListener
+from calibration import (CalibrationCache, apply_calibration, get_camera_serial,
+                         is_good_frame, DEFAULT_EXPOSURE)
+
+PUMP_SCRIPT = "/home/pi/test/app_io.py"
+# Seconds a read may block before it counts as failed, and a camera stop may take
+READ_TIMEOUT = 2.0
+STOP_TIMEOUT = 3.0
+DEFAULT_CAMERA_UUID = '25a955ae-5302-542f-a6c7-7198b08636d1'
+
+calibration_cache = CalibrationCache()
+
+
+def get_camera_uuid_map():
+    return {
+        # small screen units
+        '25a955ae-5302-542f-a6c7-7198b08636d1': '/dev/video1',
+        '559361ab-dd00-5df7-8c13-1c7bdda1492b': '/dev/video2',
+        # 640x480 units (myio.py)
+        '9f7f9c0b-bd09-53db-9a2b-20daffdb4028': '/dev/video0',
+        '48b5ddac-a396-5275-b6cb-32edddb4b5bf': '/dev/video1'
+    }
+
+def open_camera_by_uuid(target_uuid, api_preference=cv2.CAP_V4L2, use_calibration=True):
+    uuid_map = get_camera_uuid_map()
+
+    if target_uuid not in uuid_map:
+        available_uuids = "\n".join(uuid_map.keys())
+        raise ValueError(f"Invalid UUID provided. Available UUIDs:\n{available_uuids}")
+
+    device_path = uuid_map[target_uuid]
+
+    if not Path(device_path).exists():
+        raise FileNotFoundError(f"Camera device not found: {device_path}")
+
+    cap = cv2.VideoCapture(device_path, api_preference)
+    settings = None
+    if use_calibration:
+        settings = calibration_cache.get(target_uuid, get_camera_serial(device_path))
+    if settings:
+        apply_calibration(cap, settings)
+    else:
+        cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1)
+        cap.set(cv2.CAP_PROP_EXPOSURE, DEFAULT_EXPOSURE)
+
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open camera at {device_path}")
+
+    return cap
+
+def set_read_timeout(cap, timeout=READ_TIMEOUT):
+    """Bound the V4L2 select() in read/grab, returns False where OpenCV lacks the property"""
+    prop = getattr(cv2, "CAP_PROP_READ_TIMEOUT_MSEC", None)
+    return prop is not None and cap.set(prop, timeout * 1000)
+
+def generate_filename(prefix="image", extension="png"):
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f")[:-3]
+    return f"{prefix}_{timestamp}.{extension}"
+
+def server_path(server_url, path):
+    """http://host:5000/upload + /objects -> http://host:5000/objects"""
+    return server_url.rstrip("/").rsplit("/", 1)[0] + path
+
+def check_existing(capture, server_url, timeout=2):
+    """Ask the server whether it already holds this capture, before sending the body"""
+    try:
+        started = time.monotonic()
+        with tracing.span("precheck", "upload", seq=capture.seq):
+            response = requests.get(server_path(server_url, f"/objects/{capture.sha256}"),
+                                    params={"session": capture.session_id, "seq": capture.seq},
+                                    timeout=timeout)
+        # A body-less round trip, the encoder uses it to separate latency from bandwidth
+        capture.rtt = time.monotonic() - started
+        if response.status_code == 200:
+            capture.deduplicated = True
+            return response.json()
+    except Exception as e:
+        print(f"Pre-check failed, uploading anyway: {str(e)}")
+    return None
+
+def send_image(png_binary, server_url, capture=None):
+    try:
+        if capture is None:
+            filename = generate_filename()
+            headers = {}
+        else:
+            filename = capture.filename
+            existing = check_existing(capture, server_url)
+            if existing:
+                return filename, existing
+            headers = capture.headers()
+        files = {'images': (filename, png_binary)}
+        with tracing.span("post", "upload", bytes=len(png_binary)):
+            response = requests.post(server_url, files=files, headers=headers, timeout=5)
+        result = response.json()
+        if not response.ok:
+            # Not acknowledged, e.g. a delta whose base frame the server lacks
+            print(f"Upload rejected: {result.get('error')}")
+            return None, result
+        return filename, result
+    except Exception as e:
+        print(f"Error sending image: {str(e)}")
+        return None, str(e)
+
+def post_manifest(server_url, session_id, captures, expected, timeout=5):
+    """Tell the server which images make up a session, returns False if unsupported"""
+    manifest = {
+        "expected": expected,
+        "images": [{"seq": c.seq, "sha256": c.sha256, "filename": c.filename} for c in captures]
+    }
+    for image, capture in zip(manifest["images"], captures):
+        if capture.t is not None:
+            image["t"] = round(capture.t, 3)
+    try:
+        response = requests.put(server_path(server_url, f"/sessions/{session_id}/manifest"),
+                                json=manifest, timeout=timeout)
+        return response.status_code == 200
+    except Exception as e:
+        print(f"Error sending manifest: {str(e)}")
+        return False
+
+def fetch_session_status(server_url, session_id, timeout=5):
+    try:
+        response = requests.get(server_path(server_url, f"/sessions/{session_id}"), timeout=timeout)
+        if response.status_code == 200:
+            return response.json()
+    except Exception as e:
+        print(f"Error checking session: {str(e)}")
+    return None
+
+def merge_session_status(statuses, captures=()):
+    """One session status from the servers that each hold part of the session.
+
+    Captures acknowledged by a server that could not be asked are unverified,
+    not missing.
+    """
+    statuses = {url: status for url, status in statuses.items() if status}
+    if not statuses:
+        return None
+    expected = max(status["expected"] for status in statuses.values())
+    received = set().union(*(status["received"] for status in statuses.values()))
+    unverified = sorted(c.seq for c in captures
+                        if c.endpoint and c.endpoint not in statuses and c.seq not in received)
+    missing = [seq for seq in range(1, expected + 1) if seq not in received and seq not in unverified]
+    return {"expected": expected, "received": sorted(received), "missing": missing,
+            "unverified": unverified, "complete": not missing and not unverified,
+            "endpoints": {url: len(status["received"]) for url, status in statuses.items()}}
+
+def run_pump(script=PUMP_SCRIPT):
+    """Run the pump script to completion, returns its exit code"""
+    if not os.path.exists(script):
+        print(f"Script not found: {script}")
+        return None
+    with tracing.span("pump", script=script):
+        result = subprocess.run(["sudo", "python3", script], capture_output=True, text=True)
+    return result.returncode
+
+
+class Capture:
+    """An upload (image or video segment) with its idempotency key (session, seq)
+    and content hash.
+
+    The filename is fixed at capture time so every retry sends the same name.
+    """
+
+    def __init__(self, data, session_id, seq, filename=None, extension="png", t=None):
+        self.data = data
+        self.session_id = session_id
+        self.seq = seq
+        # Seconds from the first scheduled capture, plans are not evenly spaced
+        self.t = t
+        self.sha256 = hashlib.sha256(data).hexdigest()
+        self.filename = filename or generate_filename(extension=extension)
+        self.rtt = None
+        self.deduplicated = False
+        # The endpoint that acknowledged it, when uploads are routed
+        self.endpoint = None
+
+    def headers(self):
+        return {
+            "X-Content-SHA256": self.sha256,
+            "X-Session-Id": self.session_id,
+            "X-Sequence": str(self.seq)
+        }
+
+
+class CameraThread(threading.Thread):
+    def __init__(self, uuid, preview_size=None, on_preview=None, on_capture=None, pool=None,
+                 encode_png=True, still_size=None, stream_size=(320, 240), switch_budget=None,
+                 raw_yuyv=False):
+        super().__init__(daemon=True)
+        self.raw_yuyv = raw_yuyv
+        self.still_size = still_size
+        self.stream_size = stream_size
+        self.switch_budget = switch_budget
+        self.stream = None
+        self.encode_png = encode_png
+        self.target_uuid = uuid
+        self.pool = pool
+        self.handle = None
+        self.started_at = None
+        self.first_good_frame_latency = None
+        self.running = True
+        # Slots of the capture plan waiting for a frame, one frame each
+        self.capture_requests = queue.Queue()
+        self.current_frame = None
+        self.lock = threading.Lock()
+        self.preview_size = preview_size
+        self.on_preview = on_preview
+        self.on_capture = on_capture
+        self.error = None
+        self.release_lock = threading.Lock()
+        self.released = False
+        self.abandoned = False
+        self.stop_duration = None
+        self.last_frame_at = None
+        # Seconds between previews, raised by the governor when the board is loaded
+        self.preview_interval = 0.0
+        self.last_preview_at = 0.0
+        self.wakeup = threading.Event()
+
+    def run(self):
+        self.started_at = time.monotonic()
+        try:
+            with tracing.span("camera.open", "camera"):
+                if self.pool:
+                    self.handle = self.pool.acquire(self.target_uuid)
+                    self.cap = self.handle.cap
+                else:
+                    self.cap = open_camera_by_uuid(self.target_uuid)
+                    self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+                    self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+                set_read_timeout(self.cap)
+                if self.raw_yuyv and self.still_size:
+                    # Stills come from the switched stream, already BGR
+                    print("Raw YUYV is not used together with dual-stream capture")
+                    self.raw_yuyv = False
+                if self.raw_yuyv and not enable_raw_yuyv(self.cap):
+                    print("Camera does not deliver raw YUYV, using converted frames")
+                    self.raw_yuyv = False
+                if self.still_size:
+                    self.stream = DualStream(self.cap, self.stream_size, self.still_size,
+                                             self.switch_budget)
+
+            self.last_frame_at = time.monotonic()
+            while self.running:
+                with tracing.span("camera.read", "camera"):
+                    ret, frame = self.stream.read() if self.stream else self.cap.read()
+                if not ret and time.monotonic() - self.last_frame_at > READ_TIMEOUT:
+                    raise RuntimeError(f"No frame from camera for {READ_TIMEOUT}s")
+                if ret:
+                    self.last_frame_at = time.monotonic()
+                    if self.raw_yuyv:
+                        frame = as_yuyv(frame, self.cap)
+                    with self.lock:
+                        self.current_frame = frame.copy()
+
+                    if self.first_good_frame_latency is None and is_good_frame(frame):
+                        self.first_good_frame_latency = time.monotonic() - self.started_at
+
+                    # Headless sessions skip the preview conversion entirely
+                    if self.on_preview and self.preview_due():
+                        with tracing.span("preview", "camera"):
+                            if self.raw_yuyv:
+                                rgb_image = yuyv_preview_rgb(frame, self.preview_size)
+                            else:
+                                rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                                if self.preview_size:
+                                    rgb_image = cv2.resize(rgb_image, self.preview_size)
+                            self.on_preview(rgb_image)
+
+                # Requests that came in while busy are served from the next frames
+                if not self.capture_requests.empty():
+                    self.process_capture_request(self.capture_requests.get())
+
+                # A capture request cuts the pause short
+                if self.capture_requests.empty():
+                    self.wakeup.wait(0.03)
+                self.wakeup.clear()
+
+        except Exception as e:
+            self.error = e
+            print(f"Camera error: {str(e)}")
+        finally:
+            if self.stream and not self.error:
+                try:
+                    self.stream.close()
+                except Exception as e:
+                    self.error = e
+            if self.raw_yuyv and self.handle and not self.error and not self.abandoned:
+                # Pooled handles go back converting, like they were lent
+                disable_raw_yuyv(self.cap)
+            with self.release_lock:
+                self.released = True
+                if self.handle and not self.abandoned:
+                    # Keep the device open for the next session
+                    if self.error:
+                        self.pool.discard(self.handle)
+                    else:
+                        self.pool.release(self.handle)
+                elif hasattr(self, 'cap') and self.cap.isOpened():
+                    self.cap.release()
+
+    def preview_due(self):
+        now = time.monotonic()
+        if now - self.last_preview_at < self.preview_interval:
+            return False
+        self.last_preview_at = now
+        return True
+
+    def process_capture_request(self, slot):
+        if self.stream:
+            if self.on_capture:
+                with tracing.span("camera.still", "camera"):
+                    still = self.stream.grab_still()
+                self.deliver_capture(still, slot)
+            return
+        with self.lock:
+            if self.current_frame is not None and self.on_capture:
+                self.deliver_capture(self.current_frame.copy(), slot)
+
+    def deliver_capture(self, frame, slot):
+        if self.raw_yuyv:
+            with tracing.span("yuyv_to_bgr", "camera"):
+                frame = yuyv_to_bgr(frame)
+        if self.encode_png:
+            _, buffer = cv2.imencode('.png', frame)
+            self.on_capture(buffer.tobytes(), slot)
+        else:
+            self.on_capture(frame, slot)
+
+    def stream_stats(self):
+        return self.stream.stats() if self.stream else None
+
+    def stalled(self):
+        """True when a read has blocked well past READ_TIMEOUT, the watchdog for drivers
+        that ignore the read timeout"""
+        last = self.last_frame_at
+        return last is not None and time.monotonic() - last > 2 * READ_TIMEOUT
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Stop within timeout seconds, returns False if the thread had to be abandoned"""
+        started = time.monotonic()
+        self.running = False
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(timeout)
+            if self.is_alive():
+                self.force_release()
+        self.stop_duration = time.monotonic() - started
+        return not self.abandoned
+
+    def force_release(self):
+        """Give up on a reader stuck in the driver.
+
+        Releasing the capture under a blocked read is not safe, so the pool
+        forgets the handle and the stuck thread releases the device itself
+        if the read ever returns.
+        """
+        with self.release_lock:
+            if self.released:
+                return
+            self.abandoned = True
+            if self.handle:
+                self.pool.abandon(self.handle)
+        print(f"Camera {self.target_uuid} did not stop in time, abandoned its reader")
+
+    def request_capture(self, slot=None):
+        """Capture the next frame for slot, handed back with it to on_capture"""
+        self.capture_requests.put(slot)
+        self.wakeup.set()
+
+
+UPLOAD_MODES = {
+    "single": send_image,
+    "chunked": send_image_chunked
+}
+
+
+class Uploader:
+    """Sends captures in order from a fixed number of worker threads.
+
+    on_result(capture, duration, ok) is called after each send, pending()
+    counts the captures queued or in flight. With a router, each send goes
+    to the endpoint it picks instead of server_url.
+    """
+
+    def __init__(self, server_url, on_sent=None, send_func=send_image, concurrency=2,
+                 on_result=None, router=None):
+        self.server_url = server_url
+        self.router = router or EndpointRouter([server_url])
+        self.on_sent = on_sent
+        self.on_result = on_result
+        self.send_func = send_func
+        self.queue = queue.Queue()
+        self.outstanding = 0
+        self.condition = threading.Condition()
+        self.workers = []
+        self.retiring = 0
+        self.concurrency = 0
+        self.closed = False
+        self.set_concurrency(concurrency)
+
+    def set_concurrency(self, concurrency):
+        """Grow the pool, or retire workers as they finish their current send"""
+        with self.condition:
+            # A late throttle change must not restart a closed uploader
+            if self.closed:
+                concurrency = 0
+            active = len(self.workers) - self.retiring
+            for _ in range(max(0, concurrency - active)):
+                thread = threading.Thread(target=self.worker, daemon=True)
+                self.workers.append(thread)
+                thread.start()
+            extra = max(0, active - concurrency)
+            self.retiring += extra
+            self.concurrency = concurrency
+        for _ in range(extra):
+            self.queue.put(None)
+
+    def submit(self, capture):
+        with self.condition:
+            self.outstanding += 1
+        self.queue.put(capture)
+
+    def worker(self):
+        while True:
+            capture = self.queue.get()
+            if capture is None:
+                with self.condition:
+                    self.workers.remove(threading.current_thread())
+                    self.retiring -= 1
+                return
+            try:
+                self.send_image_thread(capture)
+            finally:
+                with self.condition:
+                    self.outstanding -= 1
+                    self.condition.notify_all()
+
+    def send_image_thread(self, capture):
+        started = time.monotonic()
+        ok = False
+        try:
+            with tracing.span("upload", "upload", seq=capture.seq, bytes=len(capture.data)):
+                filename, response = self.router.send(self.send_func, capture)
+            ok = filename is not None
+            if self.on_sent:
+                self.on_sent(filename, str(response))
+        except Exception as e:
+            if self.on_sent:
+                self.on_sent("", f"Send error: {str(e)}")
+        if self.on_result:
+            self.on_result(capture, time.monotonic() - started, ok)
+
+    def pending(self):
+        with self.condition:
+            return self.outstanding
+
+    def wait(self, timeout=None):
+        """Wait for queued and in-flight uploads, returns False if some are left"""
+        with self.condition:
+            return self.condition.wait_for(lambda: self.outstanding == 0, timeout)
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+        self.set_concurrency(0)
+
+
+class CaptureSession:
+    """One sample run: pump, capture max_images frames, upload them.
+
+    max_images=None captures until stop() is called. A CapturePlan replaces
+    the fixed interval, max_images is then the most it may take. A
+    ConvergenceDetector ends capture early once the strip stops changing,
+    stop_reason says why capture ended. An EndpointRouter routes uploads over
+    several servers, server_url is not used then.
+    """
+
+    def __init__(self, server_url, camera_uuid=DEFAULT_CAMERA_UUID, max_images=60,
+                 interval=1.0, pump_script=PUMP_SCRIPT, preview_size=None, listener=None,
+                 camera_pool=None, upload_mode="single", output_mode="png", segment_frames=None,
+                 encoder=None, trace_path=None, still_size=None, stream_size=(320, 240),
+                 raw_yuyv=False, governor=None, plan=None, convergence=None, router=None):
+        if plan and output_mode == "video":
+            raise ValueError("capture plans need per-image output, video assumes a fixed frame rate")
+        self.server_url = server_url
+        self.camera_uuid = camera_uuid
+        self.plan = plan or CapturePlan.uniform(interval)
+        self.max_images = self.plan.count(max_images) if plan else max_images
+        self.interval = self.plan.shortest_interval()
+        self.pump_script = pump_script
+        self.preview_size = preview_size
+        self.camera_pool = camera_pool
+        self.listener = listener or SessionListener()
+        self.captured_count = 0
+        self.camera_thread = None
+        self.encoder = encoder or PngEncoder()
+        self.trace_path = trace_path
+        self.still_size = still_size
+        self.stream_size = stream_size
+        self.raw_yuyv = raw_yuyv
+        self.governor = governor
+        self.upload_concurrency = 2
+        # Shared between sessions, it keeps what it learnt about the servers
+        self.router = router or EndpointRouter([server_url])
+        self.uploader = Uploader(server_url, on_sent=self.listener.on_sent,
+                                 send_func=UPLOAD_MODES[upload_mode],
+                                 concurrency=self.upload_concurrency, on_result=self.upload_result,
+                                 router=self.router)
+        self.capture_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.capture_done = threading.Event()
+        self.finished = threading.Event()
+        self.error = None
+        self.thread = None
+        self.started_at = None
+        self.first_capture_at = None
+        self.capture_started_at = None
+        # Offsets by slot, the plan's index of each capture
+        self.planned_times = {}
+        self.capture_times = {}
+        self.convergence = convergence
+        self.stop_reason = None
+        self.session_id = uuid.uuid4().hex
+        self.captures = []
+        self.output_mode = output_mode
+        self.video = None
+        if output_mode == "video":
+            # One compressed stream per session (or per segment) instead of a PNG per frame
+            self.video = SessionVideoWriter(self.session_id, 1.0 / interval, self.upload_segment,
+                                            segment_frames=segment_frames)
+        self.manifest_status = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        self.started_at = time.monotonic()
+        if self.trace_path:
+            tracing.start()
+        try:
+            self.listener.on_status("开始启动相机...")
+            on_preview = None
+            if type(self.listener).on_preview is not SessionListener.on_preview:
+                on_preview = self.listener.on_preview
+            self.camera_thread = CameraThread(
+                self.camera_uuid,
+                preview_size=self.preview_size,
+                on_preview=on_preview,
+                on_capture=self.handle_capture,
+                pool=self.camera_pool,
+                encode_png=False,
+                still_size=self.still_size,
+                stream_size=self.stream_size,
+                # Both switches of a still have to fit between two captures
+                switch_budget=self.interval * 0.8,
+                raw_yuyv=self.raw_yuyv
+            )
+            self.camera_thread.start()
+            if self.governor:
+                self.governor.add_target(self.apply_throttle)
+
+            if self.pump_script:
+                self.listener.on_status("气泵运行中...")
+                run_pump(self.pump_script)
+
+            if not self.stop_event.is_set():
+                self.listener.on_status("开始捕获图像")
+                with tracing.span("capture_loop"):
+                    self.capture_loop()
+        except Exception as e:
+            self.error = e
+            print(f"Session error: {str(e)}")
+            self.listener.on_status(f"Session error: {str(e)}")
+        finally:
+            if self.governor:
+                self.governor.remove_target(self.apply_throttle)
+            if self.camera_thread:
+                with tracing.span("camera.stop", "camera"):
+                    stopped = self.camera_thread.stop()
+                if not stopped:
+                    self.listener.on_status(f"Camera did not stop within {STOP_TIMEOUT}s")
+                if self.error is None:
+                    self.error = self.camera_thread.error
+            if self.video:
+                self.close_video()
+            self.capture_done.set()
+            self.listener.on_capture_done(self.captured_count)
+            if self.max_images and self.captured_count >= self.max_images:
+                self.listener.on_status(f"完成! 捕获 {self.max_images} 图片")
+
+            with tracing.span("drain_uploads"):
+                if self.captures:
+                    self.verify_upload()
+                else:
+                    self.uploader.wait()
+            self.uploader.close()
+            if self.trace_path:
+                tracing.stop(self.trace_path)
+            self.finished.set()
+            self.listener.on_finished(self.captured_count)
+
+    def verify_upload(self):
+        """Post the manifest, then let the servers report what is missing"""
+        self.uploader.wait()
+        # After the wait, refused deltas have been replaced by their key frames
+        with self.capture_lock:
+            captures = list(self.captures)
+        # Each server that took part of the session checks the whole manifest
+        urls = sorted({c.endpoint for c in captures if c.endpoint}) or [self.router.choose().url]
+        statuses = {}
+        for url in urls:
+            if post_manifest(url, self.session_id, captures, len(captures)):
+                statuses[url] = fetch_session_status(url, self.session_id)
+        self.manifest_status = merge_session_status(statuses, captures)
+        if self.manifest_status and self.manifest_status.get("missing"):
+            missing = len(self.manifest_status["missing"])
+            self.listener.on_status(f"服务器缺少 {missing} 张图片")
+
+    def capture_loop(self):
+        self.capture_started_at = time.monotonic()
+        for slot, offset in enumerate(self.plan.times(self.max_images)):
+            # Absolute deadlines, a late capture does not push the ones after it
+            if self.stop_event.wait(max(0, self.capture_started_at + offset - time.monotonic())):
+                return
+            if not self.camera_thread.is_alive():
+                return
+            if self.camera_thread.stalled():
+                raise RuntimeError(f"Camera read blocked for over {2 * READ_TIMEOUT}s")
+            tracing.instant("tick")
+            self.planned_times[slot] = offset
+            self.camera_thread.request_capture(slot)
+        # Give the last request time to come back before the camera stops
+        self.stop_event.wait(READ_TIMEOUT)
+
+    def add_capture(self, data, filename=None, extension="png", t=None):
+        with self.capture_lock:
+            capture = Capture(data, self.session_id, len(self.captures) + 1, filename, extension, t)
+            self.captures.append(capture)
+        self.uploader.submit(capture)
+        return capture
+
+    def handle_capture(self, image, slot=None):
+        with self.capture_lock:
+            if self.max_images and self.captured_count >= self.max_images:
+                return
+            self.captured_count += 1
+            count = self.captured_count
+            if count == 1:
+                self.first_capture_at = time.monotonic()
+            t = time.monotonic() - self.capture_started_at if self.capture_started_at else None
+            if slot is not None:
+                self.capture_times[slot] = t
+        total = f"/{self.max_images}" if self.max_images else ""
+        if self.video:
+            self.listener.on_status(f"录制图片 {count}{total}...")
+            with tracing.span("video.write", "encode", frame=count):
+                self.video.write(image)
+        else:
+            self.listener.on_status(f"发送图片 {count}{total}...")
+            with tracing.span("encode", "encode", frame=count):
+                data, extension = self.encoder.encode(image, backlog=self.uploader.pending())
+            self.add_capture(data, extension=extension, t=t)
+        self.listener.on_progress(count, self.max_images)
+        if self.max_images and count >= self.max_images:
+            self.finish_capture(f"took all {self.max_images} images")
+        elif self.convergence and t is not None:
+            with tracing.span("convergence", "encode", frame=count):
+                converged = self.convergence.update(t, image)
+            if converged:
+                self.listener.on_status(f"反应已稳定, 提前结束 ({self.convergence.reason})")
+                self.finish_capture(self.convergence.reason)
+
+    def finish_capture(self, reason):
+        with self.capture_lock:
+            if self.stop_reason is None:
+                self.stop_reason = reason
+        self.stop_event.set()
+
+    def apply_throttle(self, level):
+        """Shed optional work, the capture cadence is left alone"""
+        self.camera_thread.preview_interval = level.preview_interval()
+        self.encoder.set_effort(level.encode_effort)
+        self.uploader.set_concurrency(min(level.upload_concurrency, self.upload_concurrency))
+
+    def upload_result(self, capture, duration, ok):
+        # Pre-check hits skip the body, they say nothing about bandwidth
+        if not capture.deduplicated:
+            self.encoder.on_upload(len(capture.data), duration, capture.rtt, ok)
+        if not ok:
+            data = self.encoder.key_frame(capture.seq)
+            if data is not None:
+                self.resend_as_key_frame(capture, data)
+        self.encoder.on_ack(capture.seq, ok)
+
+    def resend_as_key_frame(self, capture, data):
+        """Replace a refused delta by the full frame, under the same seq"""
+        replacement = Capture(data, self.session_id, capture.seq, t=capture.t)
+        with self.capture_lock:
+            self.captures[capture.seq - 1] = replacement
+        # Submitted before the refused upload counts as done, so wait() covers it
+        self.uploader.submit(replacement)
+
+    def adaptations(self):
+        return getattr(self.encoder, "decisions", [])
+
+    def encoder_stats(self):
+        """Bytes sent against full frames, for encoders that keep count"""
+        return self.encoder.stats() if hasattr(self.encoder, "stats") else None
+
+    def upload_segment(self, video_path, sidecar_path, index):
+        for path in (video_path, sidecar_path):
+            with open(path, "rb") as f:
+                data = f.read()
+            os.unlink(path)
+            self.add_capture(data, os.path.basename(path))
+
+    def close_video(self):
+        try:
+            self.video.close()
+        except Exception as e:
+            print(f"Video error: {str(e)}")
+            self.listener.on_status(f"Video error: {str(e)}")
+
+    def schedule_stats(self):
+        """How far captures landed from their planned times, and the slots that got none"""
+        late = sorted(self.capture_times[slot] - planned for slot, planned in self.planned_times.items()
+                      if self.capture_times.get(slot) is not None)
+        if not late:
+            return None
+        missed = [planned for slot, planned in sorted(self.planned_times.items())
+                  if slot not in self.capture_times]
+        return {
+            "plan": self.plan.name,
+            "planned": len(self.planned_times),
+            "captured": self.captured_count,
+            "late_p50_ms": round(1000 * late[len(late) // 2], 1),
+            "late_max_ms": round(1000 * late[-1], 1),
+            "missed": len(missed),
+            "missed_at": [round(planned, 3) for planned in missed]
+        }
+
+    def first_capture_latency(self):
+        """Seconds from session start to the first captured image"""
+        if self.started_at is None or self.first_capture_at is None:
+            return None
+        return self.first_capture_at - self.started_at
+
+    def first_good_frame_latency(self):
+        """Seconds from camera start to the first correctly exposed frame"""
+        if self.camera_thread is None:
+            return None
+        return self.camera_thread.first_good_frame_latency
+
+    def camera_stop_duration(self):
+        """Seconds the camera took to stop, capped near STOP_TIMEOUT"""
+        if self.camera_thread is None:
+            return None
+        return self.camera_thread.stop_duration
+
+    def stream_stats(self):
+        """Resolution switch counts and latency in dual-stream mode"""
+        if self.camera_thread is None:
+            return None
+        return self.camera_thread.stream_stats()
+
+    def stop(self):
+        self.finish_capture("stopped")
+
+    def wait(self, timeout=None):
+        return self.finished.wait(timeout)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""Capture plans: when to take each image, counted from the end of the pump run.
+
+A plan is a list of phases, each a cadence and the time it runs until:
+
+    10hz:3,1hz:10,5s:120    10 per second for 3 s, then one per second
+                            until 10 s, then one every 5 s until 120 s
+
+Cadences are a rate (10hz) or a period (5s, 250ms). The last phase may
+leave out its end and run until the image budget or stop(). Times are
+computed from the phase start, not accumulated, so they do not drift.
+
+    python3 capture_plan.py protein
+"""
+import re
+import sys
+
+# Named plans per assay
+PLANS = {
+    "uniform": "1s:60",
+    "protein": "10hz:3,1hz:10,5s:120",
+}
+
+CADENCE = re.compile(r"^(\d+(?:\.\d+)?)(hz|ms|s)$")
+
+
+def parse_cadence(text):
+    match = CADENCE.match(text.strip().lower())
+    if not match:
+        raise ValueError(f"bad cadence {text!r}, expected e.g. 10hz, 250ms or 5s")
+    value, unit = float(match.group(1)), match.group(2)
+    if value <= 0:
+        raise ValueError(f"cadence must be positive: {text!r}")
+    return {"hz": 1.0 / value, "ms": value / 1000, "s": value}[unit]
+
+
+class CapturePlan:
+    """Phases of (interval, until) in seconds, first capture at `first`"""
+
+    def __init__(self, phases, first=0.0, name=None):
+        for n, (interval, until) in enumerate(phases):
+            if interval <= 0:
+                raise ValueError("phase intervals must be positive")
+            if until is None and n != len(phases) - 1:
+                raise ValueError("only the last phase can be open-ended")
+        self.phases = phases
+        self.first = first
+        self.name = name
+
+    @classmethod
+    def uniform(cls, interval):
+        """The fixed cadence sessions always had, first capture one interval in"""
+        return cls([(interval, None)], first=interval, name=f"every {interval:g}s")
+
+    @classmethod
+    def parse(cls, spec):
+        """A PLANS name or a phase list such as 10hz:3,1hz:10,5s:120"""
+        name = spec if spec in PLANS else None
+        phases = []
+        for part in PLANS.get(spec, spec).split(","):
+            cadence, _, until = part.partition(":")
+            phases.append((parse_cadence(cadence), float(until) if until else None))
+        return cls(phases, name=name or spec)
+
+    def times(self, budget=None):
+        """Capture offsets in seconds, at most budget of them"""
+        count = 0
+        start = self.first
+        for interval, until in self.phases:
+            k = 0
+            while True:
+                t = start + k * interval
+                # A small slack keeps 0.1 * 30 from landing just under 3.0
+                if until is not None and t >= until - 1e-6:
+                    break
+                if budget is not None and count >= budget:
+                    return
+                yield t
+                count += 1
+                k += 1
+            # The next phase starts at the boundary, not at the first time past it
+            start = max(start, until)
+
+    def count(self, budget=None):
+        """Images the plan takes, None if it only ends with the budget"""
+        if self.phases[-1][1] is None and budget is None:
+            return None
+        return sum(1 for _ in self.times(budget))
+
+    def shortest_interval(self):
+        return min(interval for interval, _ in self.phases)
+
+    def __str__(self):
+        return ", ".join(f"every {interval:g}s" + (f" until {until:g}s" if until is not None else "")
+                         for interval, until in self.phases)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(f"usage: {sys.argv[0]} PLAN   (one of {', '.join(PLANS)}, or e.g. 10hz:3,1hz:10,5s:120)")
+        sys.exit(2)
+    plan = CapturePlan.parse(sys.argv[1])
+    times = list(plan.times(budget=1000))
+    print(f"{plan}: {len(times)} images over {times[-1]:.1f}s")
+    print(" ".join(f"{t:g}" for t in times))
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+import time
+
+import requests
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def uploads_url(server_url):
+    """http://host:5000/upload -> http://host:5000/uploads"""
+    return server_url.rstrip("/").rsplit("/", 1)[0] + "/uploads"
+
+
+class ChunkedUpload:
+    """One resumable upload, acknowledged offsets survive dropped connections"""
+
+    def __init__(self, data, filename, server_url, chunk_size=DEFAULT_CHUNK_SIZE, timeout=5,
+                 capture=None):
+        self.data = data
+        self.capture = capture
+        self.filename = filename
+        self.base_url = uploads_url(server_url)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.upload_id = None
+        self.offset = 0
+        self.bytes_sent = 0
+        self.resumes = 0
+
+    def create(self):
+        info = {"filename": self.filename, "size": len(self.data)}
+        if self.capture:
+            info.update(sha256=self.capture.sha256, session=self.capture.session_id,
+                        seq=self.capture.seq)
+        response = requests.post(self.base_url, json=info, timeout=self.timeout)
+        response.raise_for_status()
+        info = response.json()
+        self.upload_id = info["upload_id"]
+        self.offset = info.get("offset", 0)
+        # The server may ask for smaller chunks than we would send
+        self.chunk_size = min(self.chunk_size, info.get("chunk_size") or self.chunk_size)
+
+    def sync_offset(self):
+        """Ask the server how many bytes it holds, starting over if it has forgotten the upload"""
+        response = requests.get(f"{self.base_url}/{self.upload_id}", timeout=self.timeout)
+        if response.status_code == 404:
+            # Restarted server or expired upload: nothing it holds can be resumed
+            print(f"Upload {self.upload_id} unknown to the server, starting over")
+            self.upload_id = None
+            self.create()
+            self.resumes += 1
+            return
+        response.raise_for_status()
+        self.offset = response.json()["offset"]
+        self.resumes += 1
+
+    def send_chunk(self):
+        chunk = self.data[self.offset:self.offset + self.chunk_size]
+        # Counts bytes put on the wire, including chunks that get cut off
+        self.bytes_sent += len(chunk)
+        response = requests.put(f"{self.base_url}/{self.upload_id}", data=chunk,
+                                headers={"Upload-Offset": str(self.offset),
+                                         "Content-Type": "application/offset+octet-stream"},
+                                timeout=self.timeout)
+        if response.status_code == 409:
+            self.offset = response.json()["offset"]
+            return response.json()
+        response.raise_for_status()
+        result = response.json()
+        self.offset = result["offset"]
+        return result
+
+    def run(self, max_retries=8, backoff=0.5):
+        retries = 0
+        result = None
+        while True:
+            try:
+                if self.upload_id is None:
+                    self.create()
+                elif retries:
+                    self.sync_offset()
+                while self.offset < len(self.data):
+                    result = self.send_chunk()
+                    retries = 0
+                return result or {"offset": self.offset, "complete": True}
+            except requests.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                if status is not None and 400 <= status < 500:
+                    # Refused, not interrupted: sending again gets the same answer
+                    raise
+                retries += 1
+                if retries > max_retries:
+                    raise
+                print(f"Chunked upload interrupted at {self.offset}/{len(self.data)}: {str(e)}")
+                time.sleep(min(backoff * 2 ** (retries - 1), 8))
+
+
+def send_image_chunked(png_binary, server_url, capture=None, chunk_size=DEFAULT_CHUNK_SIZE, timeout=5):
+    """Drop-in for send_image that resumes from the last acknowledged byte"""
+    from capture_engine import generate_filename, check_existing
+
+    try:
+        if capture is None:
+            filename = generate_filename()
+        else:
+            filename = capture.filename
+            existing = check_existing(capture, server_url)
+            if existing:
+                return filename, existing
+        upload = ChunkedUpload(png_binary, filename, server_url, chunk_size=chunk_size,
+                               timeout=timeout, capture=capture)
+        return filename, upload.run()
+    except requests.HTTPError as e:
+        # The server answered and refused, like send_image this is not a transport error
+        try:
+            result = e.response.json()
+        except ValueError:
+            result = {"error": f"HTTP {e.response.status_code}"}
+        print(f"Upload rejected: {result.get('error')}")
+        return None, result
+    except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+        print(f"Error sending image: {str(e)}")
+        return None, str(e)
+    except Exception as e:
+        # Reached the server but could not make sense of its answer
+        print(f"Error sending image: {str(e)}")
+        return None, {"error": str(e)}
@@ -4,6 +4,8 @@ import os
 import sys
 import fcntl
 
+from daemon_client import send_command
+
 
 LOCK_FILE = "/tmp/my_script.lock"
 
@@ -18,7 +20,27 @@ def acquire_lock():
         sys.exit(1)
     return lock_fd
 
-def main():
+def request_session(wait=True):
+    """Queue a session on the resident capture daemon and optionally wait for it"""
+    ok = False
+    for reply in send_command({"cmd": "start", "wait": wait}):
+        if "id" not in reply:
+            # Refused before it was queued
+            print(f"session not started: {reply.get('error', reply)}")
+            return False
+        if "position" in reply:
+            print(f"session {reply['id']} queued at position {reply['position']}")
+            ok = reply.get("ok", False)
+        else:
+            print(f"session {reply['id']} {reply['state']}: "
+                  f"captured {reply.get('captured', 0)}, "
+                  f"first capture after {reply.get('first_capture_latency')} s")
+            if "error" in reply:
+                print(f"session {reply['id']} error: {reply['error']}")
+            ok = reply.get("ok", False)
+    return ok
+
+def run_legacy():
 
     lock_fd = acquire_lock()
     try:
@@ -31,5 +53,15 @@ def main():
         fcntl.flock(lock_fd, fcntl.LOCK_UN)
         os.close(lock_fd)
 
+def main():
+    try:
+        # --no-wait queues the sample and returns, the daemon pipelines queued samples
+        ok = request_session(wait="--no-wait" not in sys.argv[1:])
+    except (FileNotFoundError, ConnectionRefusedError):
+        # No daemon on this unit, spawn the scripts as before
+        run_legacy()
+        return
+    sys.exit(0 if ok else 1)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
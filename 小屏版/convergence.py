@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Detects when the strip has stopped changing colour.
+
+Each captured frame's region of interest is shrunk to a grid of cells
+(16x16 by default), so a pad changing colour moves its own cells instead
+of vanishing in a whole-strip average. Per-cell running sums over a
+sliding time window give the mean and variance without rescanning the
+window; the largest per-cell standard deviation is the change measure.
+
+The reaction counts as converged once that measure stays under
+`threshold` for `hold` seconds, after at least `min_time` seconds, since a
+strip that has not started reacting yet is also still.
+"""
+import collections
+
+import cv2
+import numpy as np
+
+
+class ConvergenceDetector:
+    def __init__(self, threshold=1.0, window=10.0, hold=5.0, min_time=20.0, roi=None, grid=(16, 16)):
+        self.threshold = threshold
+        self.window = window
+        self.hold = hold
+        self.min_time = min_time
+        self.roi = roi
+        self.grid = grid
+        self.samples = collections.deque()
+        self.sum = None
+        self.sum_sq = None
+        self.quiet_since = None
+        self.change = None
+        self.reason = None
+
+    def cells(self, frame):
+        """Mean colour of each grid cell of the ROI, as float64"""
+        h, w = frame.shape[:2]
+        x, y, rw, rh = self.roi or (w // 3, h // 3, w // 3, h // 3)
+        region = frame[y:y + rh, x:x + rw]
+        return cv2.resize(region, self.grid, interpolation=cv2.INTER_AREA).astype(np.float64).ravel()
+
+    def update(self, t, frame):
+        """Add the frame captured t seconds into the session, returns True once converged"""
+        cells = self.cells(frame)
+        if self.sum is None:
+            self.sum = np.zeros_like(cells)
+            self.sum_sq = np.zeros_like(cells)
+        self.samples.append((t, cells))
+        self.sum += cells
+        self.sum_sq += cells * cells
+        while self.samples and self.samples[0][0] < t - self.window:
+            _, old = self.samples.popleft()
+            self.sum -= old
+            self.sum_sq -= old * old
+
+        n = len(self.samples)
+        # A window needs several samples spread over most of its length to mean anything
+        if n < 3 or t - self.samples[0][0] < 0.8 * self.window:
+            self.quiet_since = None
+            return False
+        mean = self.sum / n
+        # Subtracting old samples can leave tiny negative residues
+        variance = np.maximum(self.sum_sq / n - mean * mean, 0)
+        self.change = float(np.sqrt(variance.max()))
+
+        if self.change >= self.threshold:
+            self.quiet_since = None
+            return False
+        if self.quiet_since is None:
+            self.quiet_since = t
+        if t - self.quiet_since >= self.hold and t >= self.min_time:
+            self.reason = (f"converged at {t:.1f}s: colour change {self.change:.2f} "
+                           f"under {self.threshold:g} for {t - self.quiet_since:.1f}s")
+            return True
+        return False
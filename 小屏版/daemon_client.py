@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+import json
+import socket
+import sys
+
+SOCKET_PATH = "/tmp/hetaopi_capture.sock"
+
+
+def send_command(command, socket_path=SOCKET_PATH, timeout=None):
+    """Send one JSON command to the capture daemon and yield each reply line.
+
+    Raises FileNotFoundError / ConnectionRefusedError when no daemon is running.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(command).encode("utf-8") + b"\n")
+        # One command per connection, the daemon closes once it has replied
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("r", encoding="utf-8") as reader:
+            for line in reader:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+
+
+def parse_command(argv):
+    """status, or profile seconds=10: key=value pairs are parsed as JSON where they can be"""
+    command = {"cmd": argv[0]}
+    for pair in argv[1:]:
+        key, _, value = pair.partition("=")
+        try:
+            command[key] = json.loads(value)
+        except ValueError:
+            command[key] = value
+    return command
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"usage: {sys.argv[0]} CMD [key=value ...]")
+        sys.exit(2)
+    for reply in send_command(parse_command(sys.argv[1:])):
+        print(json.dumps(reply, ensure_ascii=False))
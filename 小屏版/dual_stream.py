@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+import time
+
+import cv2
+
+# Frames drained after a mode switch before giving up on the new size
+MAX_SWITCH_FRAMES = 10
+
+
+class DualStream:
+    """Low-resolution continuous stream for the preview, switched to still
+    resolution for each scheduled capture.
+
+    V4L2 restarts the stream on every size change, so each still costs two
+    switches. If a switch round trip does not fit `budget` seconds the
+    stream stays at still resolution and the preview is downscaled in
+    software instead.
+    """
+
+    def __init__(self, cap, stream_size=(320, 240), still_size=(1920, 1080), budget=None):
+        self.cap = cap
+        self.budget = budget
+        self.original_size = self.current_size()
+        self.stream_size = self.set_size(stream_size)
+        self.still_size = still_size
+        self.switch_latencies = []
+        self.still_only = False
+
+    def current_size(self):
+        return (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def set_size(self, size):
+        """Request a size, returns the size the driver negotiated"""
+        self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, size[0])
+        self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, size[1])
+        return self.current_size()
+
+    def read_size(self, size):
+        """First frame at the given size, older buffered frames are dropped"""
+        for _ in range(MAX_SWITCH_FRAMES):
+            ret, frame = self.cap.read()
+            if ret and (frame.shape[1], frame.shape[0]) == size:
+                return frame
+        raise RuntimeError(f"No {size[0]}x{size[1]} frame after switching")
+
+    def read(self):
+        """A preview-stream frame"""
+        ret, frame = self.cap.read()
+        if ret and self.still_only:
+            frame = cv2.resize(frame, self.stream_size, interpolation=cv2.INTER_AREA)
+        return ret, frame
+
+    def grab_still(self):
+        if self.still_only:
+            ret, frame = self.cap.read()
+            if not ret:
+                raise RuntimeError("Camera read failed")
+            return frame
+
+        start = time.monotonic()
+        negotiated = self.set_size(self.still_size)
+        frame = self.read_size(negotiated)
+        self.read_size(self.set_size(self.stream_size))
+        latency = time.monotonic() - start
+        self.switch_latencies.append(latency)
+
+        if self.budget and latency > self.budget:
+            print(f"Resolution switch took {latency:.3f}s, over the {self.budget:.3f}s budget; "
+                  f"streaming at {negotiated[0]}x{negotiated[1]} from now on")
+            self.set_size(self.still_size)
+            self.still_only = True
+        return frame
+
+    def stats(self):
+        latencies = self.switch_latencies
+        if not latencies:
+            return {"switches": 0, "still_only": self.still_only}
+        return {
+            "switches": len(latencies),
+            "switch_latency_avg": round(sum(latencies) / len(latencies), 3),
+            "switch_latency_max": round(max(latencies), 3),
+            "still_only": self.still_only
+        }
+
+    def close(self):
+        """Leave the device at the size it was opened with, pooled handles are reused"""
+        if self.cap.isOpened():
+            self.set_size(self.original_size)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""Upload routing over several ingest servers.
+
+Each upload goes to the fastest healthy endpoint. Speed is the round trip
+of body-less requests, the background GET /health probes and the upload
+pre-checks, smoothed per endpoint. A transport error (refused, timed out,
+reset) marks the endpoint down and the same upload is sent to the next
+one straight away; only a probe brings it back. A server that answers with
+an error has refused the upload itself, another server would too, so that
+does not fail over.
+
+Routing sticks to the endpoint that took the last upload until another is
+clearly faster (switch_ratio), so a session's frames, and the tile deltas
+referring to earlier ones, stay on one server.
+
+    HETAOPI_SERVERS=192.168.91.135,192.168.91.136:5001 python3 camera.py
+
+requests is imported where it is used, the GUI apps load it in the
+background (see startup.py).
+"""
+import collections
+import threading
+import time
+
+HEALTH_PATH = "/health"
+# Weight of the newest round trip in an endpoint's latency
+LATENCY_ALPHA = 0.3
+
+
+def upload_url(server, port=5000):
+    """host, host:port or a full URL -> http://host:port/upload"""
+    if "://" in server:
+        return server
+    if ":" not in server:
+        server = f"{server}:{port}"
+    return f"http://{server}/upload"
+
+
+def health_url(url):
+    """http://host:5000/upload -> http://host:5000/health"""
+    return url.rstrip("/").rsplit("/", 1)[0] + HEALTH_PATH
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url
+        # Tried until a probe or an upload says otherwise
+        self.healthy = True
+        self.latency = None
+        self.down_since = None
+        self.last_error = None
+        self.uploads = 0
+        self.failures = 0
+        self.refused = 0
+        self.failovers = 0
+        self.probes = 0
+        self.probe_failures = 0
+        self.durations = collections.deque(maxlen=50)
+
+    def observe_rtt(self, rtt):
+        if self.latency is None:
+            self.latency = rtt
+        else:
+            self.latency += LATENCY_ALPHA * (rtt - self.latency)
+
+    def mark_down(self, error):
+        if self.healthy:
+            self.down_since = time.monotonic()
+        self.healthy = False
+        self.last_error = str(error)
+
+    def stats(self):
+        durations = sorted(self.durations)
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "latency_ms": None if self.latency is None else round(1000 * self.latency, 1),
+            "uploads": self.uploads,
+            "failures": self.failures,
+            "refused": self.refused,
+            "failovers": self.failovers,
+            "probes": self.probes,
+            "probe_failures": self.probe_failures,
+            "upload_p50_ms": round(1000 * durations[len(durations) // 2], 1) if durations else None,
+            "last_error": self.last_error
+        }
+
+
+class EndpointRouter:
+    """Picks an endpoint per upload, probes them from a thread once start()ed.
+
+    With a single endpoint this is the plain fixed URL the uploader always
+    had: it is used even while marked down.
+    """
+
+    def __init__(self, urls, probe_interval=5.0, probe_timeout=1.0, switch_ratio=1.5, log=print):
+        if not urls:
+            raise ValueError("at least one endpoint is needed")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.switch_ratio = switch_ratio
+        self.log = log
+        self.current = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @classmethod
+    def from_servers(cls, servers, port=5000, **kwargs):
+        """From a comma separated list, or a list, of hosts, host:port or URLs"""
+        if isinstance(servers, str):
+            servers = servers.split(",")
+        return cls([upload_url(server.strip(), port) for server in servers if server.strip()], **kwargs)
+
+    @property
+    def urls(self):
+        return [endpoint.url for endpoint in self.endpoints]
+
+    def choose(self, exclude=()):
+        """Fastest healthy endpoint, or the current one unless that is clearly slower"""
+        with self.lock:
+            candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+            if not candidates:
+                # Everything is down: try them anyway, longest down first
+                candidates = sorted((e for e in self.endpoints if e not in exclude),
+                                    key=lambda e: e.down_since or 0)
+                return candidates[0] if candidates else None
+            # Unmeasured endpoints keep the configured order, behind measured ones
+            best = min(candidates, key=lambda e: (e.latency is None, e.latency or 0))
+            current = self.current
+            if (current in candidates and current.latency is not None and best.latency is not None
+                    and current.latency <= best.latency * self.switch_ratio):
+                return current
+            return best
+
+    def send(self, send_func, capture):
+        """Send a capture with send_func(data, url, capture), failing over on transport errors"""
+        tried = []
+        filename, response = None, "no endpoint"
+        while True:
+            endpoint = self.choose(exclude=tried)
+            if endpoint is None:
+                return filename, response
+            capture.rtt = None
+            started = time.monotonic()
+            filename, response = send_func(capture.data, endpoint.url, capture)
+            duration = time.monotonic() - started
+            # Transport errors come back as the exception text, server answers as its JSON
+            reachable = filename is not None or not isinstance(response, str)
+            with self.lock:
+                if capture.rtt is not None:
+                    endpoint.observe_rtt(capture.rtt)
+                if filename is not None:
+                    endpoint.uploads += 1
+                    endpoint.durations.append(duration)
+                    if tried:
+                        endpoint.failovers += 1
+                    capture.endpoint = endpoint.url
+                    self.current = endpoint
+                elif reachable:
+                    endpoint.refused += 1
+                else:
+                    endpoint.failures += 1
+                    endpoint.mark_down(response)
+            if reachable:
+                return filename, response
+            tried.append(endpoint)
+            if len(self.endpoints) > 1:
+                self.log(f"Endpoint {endpoint.url} failed ({response}), trying the next one")
+
+    def probe(self, endpoint):
+        import requests
+
+        try:
+            started = time.monotonic()
+            response = requests.get(health_url(endpoint.url), timeout=self.probe_timeout)
+            rtt = time.monotonic() - started
+            # Servers without /health still answer, 5xx means the server itself is unwell
+            ok = response.status_code < 500
+            error = None if ok else f"HTTP {response.status_code}"
+        except Exception as e:
+            ok, rtt, error = False, None, e
+        with self.lock:
+            endpoint.probes += 1
+            if ok:
+                endpoint.observe_rtt(rtt)
+                if not endpoint.healthy:
+                    self.log(f"Endpoint {endpoint.url} is back")
+                endpoint.healthy = True
+                endpoint.down_since = None
+            else:
+                endpoint.probe_failures += 1
+                endpoint.mark_down(error)
+
+    def probe_all(self):
+        # One thread each, a hung server must not hold up probing the others
+        threads = [threading.Thread(target=self.probe, args=(endpoint,), daemon=True)
+                   for endpoint in self.endpoints]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def stats(self):
+        with self.lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+    def start(self):
+        """Probe in the background, only worth it with more than one endpoint"""
+        if len(self.endpoints) < 2:
+            return
+        self.thread = threading.Thread(target=self.run, name="endpoints", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                self.probe_all()
+            except Exception as e:
+                print(f"Endpoint probe error: {str(e)}")
+            if self.stop_event.wait(self.probe_interval):
+                return
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+import mmap
+import os
+import threading
+
+import cv2
+import numpy as np
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:
+    Image = None
+
+FB_SYSFS = "/sys/class/graphics"
+
+# Fonts with CJK glyphs, the status texts are Chinese
+CJK_FONTS = [
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
+]
+
+
+def read_geometry(device):
+    """(width, height, bits_per_pixel, stride) of /dev/fbN from sysfs"""
+    base = os.path.join(FB_SYSFS, os.path.basename(device))
+
+    def read(name):
+        with open(os.path.join(base, name)) as f:
+            return f.read().strip()
+
+    width, height = (int(v) for v in read("virtual_size").split(","))
+    bpp = int(read("bits_per_pixel"))
+    stride = int(read("stride"))
+    return width, height, bpp, stride
+
+
+# cvtColor is several times faster than the same packing in NumPy expressions
+def rgb_to_rgb565(rgb):
+    """Little-endian RGB565 as (h, w, 2) bytes"""
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR565)
+
+
+def rgb_to_bgrx(rgb):
+    return cv2.cvtColor(rgb, cv2.COLOR_RGB2BGRA)
+
+
+class Framebuffer:
+    """A memory-mapped framebuffer device, or a plain file standing in for one.
+
+    Geometry is read from sysfs unless given, a plain file is grown to the
+    framebuffer size so tests can inspect what was drawn.
+    """
+
+    def __init__(self, path="/dev/fb0", width=None, height=None, bpp=None, stride=None):
+        if width is None:
+            width, height, bpp, stride = read_geometry(path)
+        bpp = bpp or 16
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self.stride = stride or width * bpp // 8
+        if bpp not in (16, 32):
+            raise ValueError(f"Unsupported framebuffer depth: {bpp} bpp")
+
+        size = self.stride * height
+        self.file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        if os.path.isfile(path) and os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.map = mmap.mmap(self.file.fileno(), size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        # Row stride may include padding past the visible width
+        depth = bpp // 8
+        self.pixels = np.ndarray((height, width, depth), dtype=np.uint8, buffer=self.map,
+                                 strides=(self.stride, depth, 1))
+        self.convert = rgb_to_rgb565 if bpp == 16 else rgb_to_bgrx
+
+    def blit(self, rgb, x=0, y=0):
+        """Copy an RGB888 image to (x, y), clipped to the screen"""
+        h = min(rgb.shape[0], self.height - y)
+        w = min(rgb.shape[1], self.width - x)
+        if h <= 0 or w <= 0:
+            return
+        self.pixels[y:y + h, x:x + w] = self.convert(rgb[:h, :w])
+
+    def fill(self, rgb=(0, 0, 0)):
+        self.pixels[:] = self.convert(np.array([[rgb]], dtype=np.uint8))
+
+    def close(self):
+        del self.pixels
+        self.map.close()
+        self.file.close()
+
+
+class TextOverlay:
+    """Renders a status line once per change into an RGB strip"""
+
+    def __init__(self, width, height=20, font_path=None):
+        self.width = width
+        self.height = height
+        self.font = None
+        if Image is not None:
+            for path in ([font_path] if font_path else CJK_FONTS):
+                if os.path.exists(path):
+                    self.font = ImageFont.truetype(path, height - 4)
+                    break
+        self.text = None
+        self.strip = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def render(self, text):
+        if text == self.text:
+            return self.strip
+        self.text = text
+        if self.font:
+            image = Image.new("RGB", (self.width, self.height))
+            ImageDraw.Draw(image).text((2, 1), text, font=self.font, fill=(255, 255, 255))
+            self.strip = np.asarray(image).copy()
+        else:
+            # cv2 has no CJK glyphs, drop what it cannot draw
+            strip = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+            ascii_text = text.encode("ascii", "ignore").decode().strip()
+            cv2.putText(strip, ascii_text, (2, self.height - 5), cv2.FONT_HERSHEY_SIMPLEX,
+                        (self.height - 6) / 30, (255, 255, 255), 1, cv2.LINE_AA)
+            self.strip = strip
+        return self.strip
+
+
+class FramebufferPreview:
+    """Preview sink that draws frames and a status overlay straight to the framebuffer.
+
+    Frames arrive already downscaled by CameraThread, drawing one is a pixel
+    format conversion and a copy into mapped memory.
+    """
+
+    def __init__(self, framebuffer, x=0, y=0, overlay_height=20, font_path=None):
+        self.fb = framebuffer
+        self.x = x
+        self.y = y
+        self.overlay_height = overlay_height
+        self.font_path = font_path
+        self.overlay = None
+        self.status = ""
+        self.progress = ""
+        self.lock = threading.Lock()
+        self.frames = 0
+
+    def show_frame(self, rgb_frame):
+        with self.lock:
+            if self.overlay is None or self.overlay.width != rgb_frame.shape[1]:
+                self.overlay = TextOverlay(rgb_frame.shape[1], self.overlay_height, self.font_path)
+            text = f"{self.progress} {self.status}".strip()
+            strip = self.overlay.render(text) if text else None
+            if strip is None:
+                self.fb.blit(rgb_frame, self.x, self.y)
+            else:
+                # Rows under the overlay are never drawn, so the text does not flicker
+                covered = rgb_frame.shape[0] - strip.shape[0]
+                self.fb.blit(rgb_frame[:covered], self.x, self.y)
+                self.fb.blit(strip, self.x, self.y + covered)
+            self.frames += 1
+
+    def show_status(self, text):
+        with self.lock:
+            self.status = text
+
+    def show_progress(self, count, total):
+        with self.lock:
+            self.progress = f"{count}/{total}" if total else str(count)
+
+    def close(self):
+        self.fb.close()
+
+
+def open_preview(spec, x=0, y=0):
+    """/dev/fb1 or a test file given as path:WIDTHxHEIGHT[:BPP]"""
+    path, _, geometry = spec.partition(":")
+    if not geometry:
+        return FramebufferPreview(Framebuffer(path), x, y)
+    size, _, bpp = geometry.partition(":")
+    width, height = (int(v) for v in size.split("x"))
+    return FramebufferPreview(Framebuffer(path, width, height, int(bpp or 16)), x, y)
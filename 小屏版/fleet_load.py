@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Simulate a fleet of devices uploading to one ingest server.
+
+Every device is a thread running the devices' own upload path: Capture
+objects, an Uploader with send_image, the session manifest and the final
+session check. Devices start at random phases, wait out the pump run, then
+capture at the configured cadence. Image sizes are drawn from recorded
+PNGs when a directory is given.
+
+The device count is ramped step by step. A step passes while uploads keep
+up with capture: few errors, nothing missing on the server, and every
+device drained within --max-tail seconds of its last capture. The largest
+passing step is the number of devices one server sustains. --speedup runs
+the cadence k times faster, so each simulated device stands for k real ones.
+
+    python3 ingest_server.py --port 5000 &
+    python3 fleet_load.py --url http://127.0.0.1:5000/upload --devices 8,16,32
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+import requests
+
+from capture_engine import (Capture, Uploader, UPLOAD_MODES, post_manifest, fetch_session_status,
+                            server_path)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class SizeModel:
+    """PNG sizes to replay, recorded ones if available"""
+
+    def __init__(self, recorded=None, mean=400 * 1024, spread=0.15):
+        self.sizes = []
+        if recorded:
+            self.sizes = [os.path.getsize(p) for p in glob.glob(os.path.join(recorded, "*.png"))]
+        self.mean = mean
+        self.spread = spread
+
+    def sample(self):
+        if self.sizes:
+            return random.choice(self.sizes)
+        return max(1024, int(random.gauss(self.mean, self.mean * self.spread)))
+
+    def payload(self):
+        # Random bytes: every image is unique, as on a real device, so nothing is deduplicated
+        return os.urandom(self.sample())
+
+
+class Device(threading.Thread):
+    def __init__(self, index, server_url, sizes, captures, interval, pump_seconds, send_func):
+        super().__init__(name=f"device-{index}", daemon=True)
+        self.server_url = server_url
+        self.sizes = sizes
+        self.captures = captures
+        self.interval = interval
+        self.pump_seconds = pump_seconds
+        self.session_id = uuid.uuid4().hex
+        self.durations = []
+        self.failures = 0
+        self.max_backlog = 0
+        self.tail = None
+        self.missing = None
+        self.lock = threading.Lock()
+        self.uploader = Uploader(server_url, send_func=send_func, on_result=self.upload_result)
+
+    def upload_result(self, capture, duration, ok):
+        with self.lock:
+            self.durations.append(duration)
+            if not ok:
+                self.failures += 1
+
+    def run(self):
+        # Units are not started in lockstep
+        time.sleep(random.uniform(0, self.interval) + self.pump_seconds)
+        sent = []
+        next_tick = time.monotonic()
+        for seq in range(1, self.captures + 1):
+            time.sleep(max(0, next_tick - time.monotonic()))
+            capture = Capture(self.sizes.payload(), self.session_id, seq)
+            sent.append(capture)
+            self.uploader.submit(capture)
+            self.max_backlog = max(self.max_backlog, self.uploader.pending())
+            next_tick += self.interval
+        last_capture = time.monotonic()
+
+        manifest = post_manifest(self.server_url, self.session_id, sent, len(sent))
+        self.uploader.wait()
+        self.tail = time.monotonic() - last_capture
+        self.uploader.close()
+        if manifest:
+            status = fetch_session_status(self.server_url, self.session_id)
+            self.missing = len(status["missing"]) if status else None
+
+
+def server_stats(server_url, reset=False):
+    try:
+        response = requests.get(server_path(server_url, "/stats"),
+                                params={"reset": 1} if reset else None, timeout=5)
+        return response.json()
+    except Exception as e:
+        print(f"Error reading server stats: {str(e)}")
+        return None
+
+
+def run_step(count, args, sizes):
+    interval = args.interval / args.speedup
+    server_stats(args.url, reset=True)
+    devices = [Device(i, args.url, sizes, args.captures, interval, args.pump_seconds / args.speedup,
+                      UPLOAD_MODES[args.upload_mode]) for i in range(count)]
+    started = time.monotonic()
+    for device in devices:
+        device.start()
+    for device in devices:
+        device.join()
+    elapsed = time.monotonic() - started
+
+    durations = [d for device in devices for d in device.durations]
+    failures = sum(device.failures for device in devices)
+    missing = sum(device.missing or 0 for device in devices)
+    tails = [device.tail for device in devices if device.tail is not None]
+    stats = server_stats(args.url) or {}
+    upload_latency = stats.get("latency", {}).get("POST /upload", {})
+    error_rate = failures / max(len(durations), 1)
+    passed = (error_rate <= args.max_error_rate and missing == 0
+              and max(tails, default=0) <= args.max_tail / args.speedup)
+    return {
+        "devices": count,
+        "equivalent": count * args.speedup,
+        "images": len(durations),
+        "elapsed": elapsed,
+        "error_rate": error_rate,
+        "missing": missing,
+        "client_p50": percentile(durations, 0.5),
+        "client_p95": percentile(durations, 0.95),
+        "server": upload_latency,
+        "max_backlog": max(device.max_backlog for device in devices),
+        "max_tail": max(tails, default=0),
+        "passed": passed
+    }
+
+
+def print_step(step):
+    server = step["server"]
+    print(f"{step['devices']:5d} devices (= {step['equivalent']:g} at real cadence): "
+          f"{step['images']} images in {step['elapsed']:.1f}s, "
+          f"errors {100 * step['error_rate']:.2f}%, missing {step['missing']}, "
+          f"client p50/p95 {1000 * step['client_p50']:.0f}/{1000 * step['client_p95']:.0f} ms, "
+          f"server p50/p95/p99 {server.get('p50_ms', '-')}/{server.get('p95_ms', '-')}/"
+          f"{server.get('p99_ms', '-')} ms, max backlog {step['max_backlog']}, "
+          f"tail {step['max_tail']:.1f}s -> {'ok' if step['passed'] else 'saturated'}", flush=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ramp simulated devices against one ingest server")
+    parser.add_argument("--url", default="http://127.0.0.1:5000/upload")
+    parser.add_argument("--devices", default="4,8,16,32,64",
+                        help="comma separated device counts to ramp through")
+    parser.add_argument("--captures", type=int, default=60, help="images per session")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between captures")
+    parser.add_argument("--pump-seconds", type=float, default=15.0, help="pump run before capturing")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="run the cadence this many times faster")
+    parser.add_argument("--recorded", help="directory of recorded PNGs for the size distribution")
+    parser.add_argument("--upload-mode", choices=sorted(UPLOAD_MODES), default="single")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--max-tail", type=float, default=5.0,
+                        help="seconds a device may still be uploading after its last capture")
+    parser.add_argument("--keep-going", action="store_true", help="run every step even after saturation")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    sizes = SizeModel(args.recorded)
+    if args.recorded and not sizes.sizes:
+        print(f"no PNGs in {args.recorded}")
+        return 1
+
+    sustained = None
+    for count in (int(n) for n in args.devices.split(",")):
+        step = run_step(count, args, sizes)
+        print_step(step)
+        if step["passed"]:
+            sustained = step
+        elif not args.keep_going:
+            break
+
+    if sustained:
+        print(f"devices per server: {sustained['equivalent']:g}")
+    else:
+        print("devices per server: below the first step")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
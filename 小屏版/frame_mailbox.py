@@ -0,0 +1,35 @@
+import threading
+
+_EMPTY = object()
+
+
+class LatestMailbox:
+    """Single-slot mailbox, a newer item replaces one that was not taken yet"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.item = _EMPTY
+        self.delivered = 0
+        self.coalesced = 0
+
+    def put(self, item):
+        """Store item, returns True if it replaced an unconsumed one"""
+        with self.lock:
+            replaced = self.item is not _EMPTY
+            if replaced:
+                self.coalesced += 1
+            self.item = item
+            return replaced
+
+    def take(self, default=None):
+        with self.lock:
+            if self.item is _EMPTY:
+                return default
+            item = self.item
+            self.item = _EMPTY
+            self.delivered += 1
+            return item
+
+    def stats(self):
+        with self.lock:
+            return {"delivered": self.delivered, "coalesced": self.coalesced}
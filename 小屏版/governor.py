@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""Backs off optional work when the board runs hot or its CPUs are busy.
+
+The governor polls the thermal zones under /sys/class/thermal and the CPU
+counters in /proc/stat. Under pressure it steps down THROTTLE_LEVELS one
+level per poll: preview frame rate first, then encode effort, then upload
+concurrency. The capture cadence itself is never touched, shedding the
+rest is what keeps it on time. Stepping back up needs `recover_after`
+calm polls in a row.
+
+Everything is read relative to `root`, so a fake tree can stand in for
+the board:
+
+    mkdir -p /tmp/board/sys/class/thermal/thermal_zone0 /tmp/board/proc
+    echo 78000 > /tmp/board/sys/class/thermal/thermal_zone0/temp
+    cp /proc/stat /tmp/board/proc/stat
+    python3 governor.py --root /tmp/board --polls 3
+"""
+import argparse
+import glob
+import os
+import sys
+import threading
+import time
+
+# Raspberry Pi firmware starts soft throttling at 80°C
+DEFAULT_THROTTLE_TEMP = 80.0
+
+
+class ThrottleLevel:
+    def __init__(self, preview_fps, encode_effort, upload_concurrency):
+        self.preview_fps = preview_fps
+        self.encode_effort = encode_effort
+        self.upload_concurrency = upload_concurrency
+
+    def preview_interval(self):
+        return 1.0 / self.preview_fps if self.preview_fps else 0.0
+
+    def __str__(self):
+        fps = f"{self.preview_fps} fps" if self.preview_fps else "full rate"
+        return f"preview {fps}, effort {self.encode_effort}, uploads x{self.upload_concurrency}"
+
+
+# No throttling first; preview_fps None is every frame the loop reads
+THROTTLE_LEVELS = [
+    ThrottleLevel(None, 0, 2),
+    ThrottleLevel(10, 0, 2),
+    ThrottleLevel(5, 0, 2),
+    ThrottleLevel(5, 1, 2),
+    ThrottleLevel(2, 1, 2),
+    ThrottleLevel(2, 1, 1),
+]
+
+
+def read_text(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_thermal_zones(root="/"):
+    """[(zone, °C, throttle °C or None)] for every readable zone"""
+    zones = []
+    for zone in sorted(glob.glob(os.path.join(root, "sys/class/thermal/thermal_zone*"))):
+        temp = read_text(os.path.join(zone, "temp"))
+        if not temp:
+            continue
+        # The lowest passive trip point is where the kernel starts cooling
+        trips = []
+        for trip_type in glob.glob(os.path.join(zone, "trip_point_*_type")):
+            if read_text(trip_type) == "passive":
+                trip = read_text(trip_type[:-len("type")] + "temp")
+                if trip:
+                    trips.append(int(trip) / 1000)
+        zones.append((os.path.basename(zone), int(temp) / 1000, min(trips, default=None)))
+    return zones
+
+
+def read_cpu_times(root="/"):
+    """(busy, total) jiffies summed over all CPUs, None if /proc/stat is missing"""
+    line = read_text(os.path.join(root, "proc/stat"))
+    if not line:
+        return None
+    fields = [int(v) for v in line.splitlines()[0].split()[1:]]
+    # idle and iowait
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    # guest time is already counted in user
+    total = sum(fields[:8])
+    return total - idle, total
+
+
+class Governor:
+    """Picks a THROTTLE_LEVELS entry from temperature headroom and CPU load.
+
+    Targets registered with add_target(fn) are called with the new level on
+    every change, and once with the current level when they register.
+    """
+
+    def __init__(self, root="/", poll_interval=2.0, throttle_temp=DEFAULT_THROTTLE_TEMP,
+                 temp_margin=5.0, high_load=0.85, low_load=0.6, recover_after=3, log=print):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.throttle_temp = throttle_temp
+        self.temp_margin = temp_margin
+        self.high_load = high_load
+        self.low_load = low_load
+        self.recover_after = recover_after
+        self.log = log
+        self.levels = THROTTLE_LEVELS
+        self.index = 0
+        self.calm_streak = 0
+        self.last_cpu = None
+        self.reading = None
+        self.decisions = []
+        self.targets = []
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.started_at = time.monotonic()
+
+    def read(self):
+        """Current headroom: °C below the throttle point and CPU busy fraction"""
+        zones = read_thermal_zones(self.root)
+        headroom = None
+        temp = None
+        for zone, zone_temp, trip in zones:
+            limit = min(trip, self.throttle_temp) if trip is not None else self.throttle_temp
+            if headroom is None or limit - zone_temp < headroom:
+                headroom = limit - zone_temp
+                temp = zone_temp
+
+        load = None
+        cpu = read_cpu_times(self.root)
+        if cpu and self.last_cpu:
+            busy = cpu[0] - self.last_cpu[0]
+            total = cpu[1] - self.last_cpu[1]
+            if total > 0:
+                load = busy / total
+        self.last_cpu = cpu
+        return {"temp": temp, "headroom": headroom, "load": load}
+
+    def poll(self):
+        """Take one reading and move at most one level, returns the level in force"""
+        reading = self.read()
+        headroom, load = reading["headroom"], reading["load"]
+        hot = headroom is not None and headroom <= self.temp_margin
+        busy = load is not None and load >= self.high_load
+        # Hysteresis: calm needs clear headroom on both counts
+        calm = ((headroom is None or headroom > 2 * self.temp_margin)
+                and (load is None or load <= self.low_load))
+
+        with self.lock:
+            self.reading = reading
+            current = self.index
+            target = current
+            reason = None
+            if hot or busy:
+                self.calm_streak = 0
+                if current < len(self.levels) - 1:
+                    target = current + 1
+                    reason = (f"{reading['temp']:.1f}°C, {headroom:.1f}°C from throttling" if hot
+                              else f"CPU {100 * load:.0f}% busy")
+            elif calm and current > 0:
+                self.calm_streak += 1
+                if self.calm_streak >= self.recover_after:
+                    target = current - 1
+                    reason = f"calm for {self.calm_streak} polls"
+            else:
+                self.calm_streak = 0
+
+            if target == current:
+                return self.levels[current]
+            self.calm_streak = 0
+            self.index = target
+            decision = {
+                "t": round(time.monotonic() - self.started_at, 2),
+                "from": current,
+                "to": target,
+                "reason": reason,
+                "temp": None if reading["temp"] is None else round(reading["temp"], 1),
+                "load": None if load is None else round(load, 2)
+            }
+            self.decisions.append(decision)
+            targets = list(self.targets)
+        if self.log:
+            self.log(f"Throttle {current} -> {target} ({self.levels[target]}): {reason}")
+        for fn in targets:
+            fn(self.levels[target])
+        return self.levels[target]
+
+    def add_target(self, fn):
+        with self.lock:
+            self.targets.append(fn)
+            level = self.levels[self.index]
+        fn(level)
+
+    def remove_target(self, fn):
+        with self.lock:
+            if fn in self.targets:
+                self.targets.remove(fn)
+
+    def status(self):
+        with self.lock:
+            return {"level": self.index, "throttle": str(self.levels[self.index]),
+                    "reading": self.reading, "decisions": len(self.decisions)}
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="governor", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Governor error: {str(e)}")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Show what the throttle governor decides")
+    parser.add_argument("--root", default="/", help="tree holding sys/class/thermal and proc/stat")
+    parser.add_argument("--polls", type=int, default=5)
+    parser.add_argument("--poll-interval", type=float, default=1.0)
+    parser.add_argument("--throttle-temp", type=float, default=DEFAULT_THROTTLE_TEMP)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    governor = Governor(args.root, args.poll_interval, args.throttle_temp)
+    for zone, temp, trip in read_thermal_zones(args.root):
+        print(f"{zone}: {temp:.1f}°C, passive trip {'-' if trip is None else f'{trip:.1f}°C'}")
+    governor.read()
+    for _ in range(args.polls):
+        time.sleep(args.poll_interval)
+        level = governor.poll()
+        print(f"{governor.reading} -> level {governor.index}: {level}", flush=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+import argparse
+import signal
+import sys
+
+from capture_engine import (CaptureSession, SessionListener, DEFAULT_CAMERA_UUID,
+                            PUMP_SCRIPT, UPLOAD_MODES)
+from adaptive_encoder import AdaptiveEncoder
+from governor import Governor
+from endpoints import EndpointRouter
+from tile_delta import DeltaEncoder
+from capture_plan import CapturePlan, PLANS
+from convergence import ConvergenceDetector
+from sampling_profiler import install_signal_trigger
+
+
+class ConsoleListener(SessionListener):
+    def on_status(self, text):
+        print(text, flush=True)
+
+    def on_sent(self, filename, response):
+        if filename:
+            print(f"sent {filename}: {response}", flush=True)
+        else:
+            print(f"send failed: {response}", flush=True)
+
+
+class FramebufferListener(ConsoleListener):
+    """Console output plus a preview drawn straight to the framebuffer, no X or Qt"""
+
+    def __init__(self, preview):
+        self.preview = preview
+
+    def on_status(self, text):
+        super().on_status(text)
+        self.preview.show_status(text)
+
+    def on_progress(self, count, total):
+        self.preview.show_progress(count, total)
+
+    def on_preview(self, rgb_frame):
+        self.preview.show_frame(rgb_frame)
+
+
+def parse_size(text):
+    return tuple(int(v) for v in text.lower().split("x"))
+
+def parse_plan(text):
+    try:
+        return CapturePlan.parse(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run one capture session without a display")
+    parser.add_argument("--server", default="192.168.91.135",
+                        help="ingest server host, or a comma separated list of host[:port] to route over")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--uuid", default=DEFAULT_CAMERA_UUID, help="camera UUID")
+    parser.add_argument("--count", type=int, default=60, help="images to capture")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between captures")
+    parser.add_argument("--plan", type=parse_plan, default=None,
+                        help=f"capture plan instead of --interval: {', '.join(PLANS)} "
+                             "or phases such as 10hz:3,1hz:10,5s:120 (--count is the budget)")
+    parser.add_argument("--pump-script", default=PUMP_SCRIPT)
+    parser.add_argument("--no-pump", action="store_true", help="skip the pump run")
+    parser.add_argument("--upload-mode", choices=sorted(UPLOAD_MODES), default="single",
+                        help="chunked resumes interrupted uploads")
+    parser.add_argument("--output", choices=["png", "video"], default="png",
+                        help="upload a PNG per capture or one compressed video per session")
+    parser.add_argument("--segment-frames", type=int, default=None,
+                        help="in video mode, upload a segment every N frames")
+    # One encoder per session
+    encoders = parser.add_mutually_exclusive_group()
+    encoders.add_argument("--adaptive", action="store_true",
+                        help="trade PNG for JPEG/downscaling when the link cannot keep up")
+    parser.add_argument("--min-scale", type=float, default=0.5,
+                        help="smallest downscale factor the adaptive encoder may use")
+    parser.add_argument("--min-quality", type=int, default=50,
+                        help="lowest JPEG quality the adaptive encoder may use")
+    parser.add_argument("--lossless", action="store_true",
+                        help="adaptive encoder keeps PNG and only downscales")
+    parser.add_argument("--framebuffer", default=None, metavar="DEVICE",
+                        help="draw the preview on /dev/fbN (or FILE:WIDTHxHEIGHT[:BPP] for testing)")
+    parser.add_argument("--preview-size", default="160x160", help="preview WIDTHxHEIGHT")
+    parser.add_argument("--still-size", default=None, metavar="WxH",
+                        help="dual-stream mode: capture stills at this size, preview from a low-res stream")
+    parser.add_argument("--stream-size", default="320x240", metavar="WxH",
+                        help="continuous stream size in dual-stream mode")
+    parser.add_argument("--profile-dir", default="/tmp",
+                        help="where SIGUSR1 writes its sampling profile")
+    parser.add_argument("--raw-yuyv", action="store_true",
+                        help="read unconverted YUYV, convert only captured frames (greyscale preview)")
+    parser.add_argument("--trace", default=None, metavar="FILE",
+                        help="write a Chrome trace of the session (open in ui.perfetto.dev)")
+    parser.add_argument("--converge", type=float, default=None, metavar="THRESHOLD",
+                        help="stop early once the strip colour changes less than this (pixel std)")
+    parser.add_argument("--converge-window", type=float, default=10.0, help="seconds of frames compared")
+    parser.add_argument("--converge-hold", type=float, default=5.0,
+                        help="seconds the change must stay under the threshold")
+    parser.add_argument("--converge-min-time", type=float, default=20.0,
+                        help="never stop before this many seconds of capture")
+    encoders.add_argument("--delta", action="store_true",
+                        help="upload changed tiles against the last acknowledged frame between key frames")
+    parser.add_argument("--tile-size", type=int, default=32, help="delta tile size in pixels")
+    parser.add_argument("--delta-threshold", type=float, default=4,
+                        help="mean difference that marks a tile changed, 0 for lossless deltas")
+    parser.add_argument("--key-interval", type=int, default=10, help="frames between full key frames")
+    parser.add_argument("--governor", action="store_true",
+                        help="lower preview rate, encode effort and upload concurrency when hot or busy")
+    parser.add_argument("--thermal-root", default="/",
+                        help="tree holding sys/class/thermal and proc/stat, for testing the governor")
+    args = parser.parse_args(argv)
+    if args.plan and args.output == "video":
+        parser.error("--plan needs per-image output, video assumes a fixed frame rate")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    encoder = None
+    if args.adaptive:
+        # A plan's shortest interval is the tightest time budget per frame
+        interval = args.plan.shortest_interval() if args.plan else args.interval
+        encoder = AdaptiveEncoder(interval, min_scale=args.min_scale,
+                                  min_quality=args.min_quality, allow_jpeg=not args.lossless)
+    elif args.delta:
+        encoder = DeltaEncoder(args.tile_size, args.delta_threshold, key_interval=args.key_interval)
+    listener = ConsoleListener()
+    preview_size = None
+    if args.framebuffer:
+        from fb_preview import open_preview
+        listener = FramebufferListener(open_preview(args.framebuffer))
+        preview_size = parse_size(args.preview_size)
+    governor = None
+    if args.governor:
+        governor = Governor(args.thermal_root)
+        governor.start()
+    router = EndpointRouter.from_servers(args.server, args.port)
+    router.start()
+    session = CaptureSession(
+        router.urls[0],
+        camera_uuid=args.uuid,
+        max_images=args.count,
+        interval=args.interval,
+        pump_script=None if args.no_pump else args.pump_script,
+        preview_size=preview_size,
+        listener=listener,
+        upload_mode=args.upload_mode,
+        output_mode=args.output,
+        segment_frames=args.segment_frames,
+        encoder=encoder,
+        trace_path=args.trace,
+        still_size=parse_size(args.still_size) if args.still_size else None,
+        stream_size=parse_size(args.stream_size),
+        raw_yuyv=args.raw_yuyv,
+        governor=governor,
+        router=router,
+        plan=args.plan,
+        convergence=None if args.converge is None else ConvergenceDetector(
+            args.converge, args.converge_window, args.converge_hold, args.converge_min_time)
+    )
+    signal.signal(signal.SIGINT, lambda signum, frame: session.stop())
+    signal.signal(signal.SIGTERM, lambda signum, frame: session.stop())
+    install_signal_trigger(output_dir=args.profile_dir)
+
+    session.start()
+    while not session.wait(0.5):
+        pass
+
+    print(f"captured {session.captured_count}/{session.max_images}: {session.stop_reason}")
+    if session.manifest_status:
+        missing = session.manifest_status.get("missing", [])
+        print(f"server has {len(session.manifest_status.get('received', []))} images, missing {missing}")
+        if session.manifest_status.get("unverified"):
+            print(f"acknowledged by servers that no longer answer: {session.manifest_status['unverified']}")
+    router.stop()
+    if len(router.endpoints) > 1:
+        for endpoint in router.stats():
+            print(f"{endpoint['url']}: {endpoint['uploads']} uploads, {endpoint['failures']} failed, "
+                  f"{endpoint['refused']} refused, latency {endpoint['latency_ms']} ms, "
+                  f"{'healthy' if endpoint['healthy'] else 'down: ' + str(endpoint['last_error'])}")
+    latency = session.first_good_frame_latency()
+    if latency is not None:
+        print(f"first good frame after {latency:.3f}s")
+    schedule = session.schedule_stats()
+    if schedule:
+        print(f"{schedule['plan']}: {schedule['captured']}/{schedule['planned']} planned captures, "
+              f"late by {schedule['late_p50_ms']} ms median, {schedule['late_max_ms']} ms max")
+        if schedule["missed"]:
+            print(f"missed {schedule['missed']} slots, planned at {schedule['missed_at']} s")
+    stop = session.camera_stop_duration()
+    if stop is not None:
+        print(f"camera stopped in {stop:.3f}s")
+    stream_stats = session.stream_stats()
+    if stream_stats:
+        print(f"resolution switches: {stream_stats}")
+    for decision in session.adaptations():
+        print(f"adapted at {decision['t']}s: {decision['from']} -> {decision['to']} ({decision['reason']})")
+    delta = session.encoder_stats()
+    if delta:
+        full = delta.get("full_estimate")
+        saved = f", full frames ~{full} bytes ({100 * delta['bytes'] / full:.0f}%)" if full else ""
+        print(f"sent {delta['bytes']} bytes in {delta['frames']} frames, "
+              f"{delta['key_frames']} key frames{saved}")
+        if delta.get("resent") or delta.get("lost"):
+            print(f"{delta['resent']} refused deltas resent as PNG, {delta['lost']} lost")
+    if governor:
+        governor.stop()
+        for decision in governor.decisions:
+            print(f"throttled at {decision['t']}s: level {decision['from']} -> {decision['to']} "
+                  f"({decision['reason']})")
+    if args.framebuffer:
+        listener.preview.close()
+    return 1 if session.error else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,718 @@
+#!/usr/bin/env python3
+"""Reference ingest server for local testing and small deployments.
+
+Accepts the devices' multipart upload unchanged:
+
+    POST /upload              multipart field "images" -> {"status", "files"}
+
+Parts are streamed straight to disk, and acks are sent once the file has
+been fsynced together with the other uploads of its batch.
+
+Uploads carrying X-Content-SHA256 / X-Session-Id / X-Sequence are
+idempotent: content is stored once per hash, and a replayed (session, seq)
+is acknowledged without a second copy. Devices can ask first:
+
+    GET  /objects/<sha256>?session=&seq=  -> 200 if already stored, else 404
+    PUT  /sessions/<id>/manifest          {"expected", "images": [{"seq", "sha256", "filename"}]}
+    GET  /sessions/<id>                   -> {"received", "missing", "complete"}
+
+Also speaks the resumable chunked upload protocol used by chunked_upload.py:
+
+    POST /uploads             {"filename", "size"} -> {"upload_id", "offset", "chunk_size"}
+    PUT  /uploads/<id>        Upload-Offset: n, body = bytes from n -> {"offset", "complete"}
+    GET  /uploads/<id>        -> {"offset", "size", "complete"}
+    GET  /stats[?reset=1]     -> request and byte counters, per-route latency
+                                 percentiles (reset=1 starts a new latency window)
+    GET  /health              -> {"status": "ok"}, probed by endpoints.py
+
+Files named *.tdelta are tile deltas (tile_delta.py) against an earlier
+frame of the same session. They are rebuilt and stored as the full PNG,
+under the hash of the delta the device sent. Rebuilding needs cv2 and
+NumPy, nothing else here does.
+
+Chunked uploads idle for --upload-ttl seconds are dropped with their
+partial file, a device that comes back later starts over.
+
+--drop-rate and --bandwidth simulate a flaky, slow link by cutting
+connections part way through a body and pacing how fast bodies are read.
+"""
+import argparse
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+READ_SIZE = 16 * 1024
+MAX_UPLOAD_SIZE = 64 * 1024 * 1024
+MAX_PART_HEADER = 8 * 1024
+LATENCY_WINDOW = 10000
+# Rebuilt frames kept decoded, deltas usually refer to the one before
+FRAME_CACHE = 16
+# Seconds a chunked upload may sit idle before it is dropped
+UPLOAD_TTL = 3600
+
+
+class ConnectionDropped(Exception):
+    pass
+
+
+class Request:
+    def __init__(self, method, target, headers, reader):
+        self.method = method
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = parts.query
+        self.headers = headers
+        self.reader = reader
+        self.content_length = int(headers.get("content-length", 0))
+        self.body_consumed = self.content_length == 0
+
+
+class LinkSimulator:
+    """Paces body reads to a bandwidth cap and drops connections at random"""
+
+    def __init__(self, bandwidth=None, drop_rate=0.0):
+        self.bandwidth = bandwidth
+        self.drop_rate = drop_rate
+
+    def plan_drop(self, length):
+        """Byte position at which to cut this body, or None"""
+        if self.drop_rate and length and random.random() < self.drop_rate:
+            return random.randrange(length)
+        return None
+
+    async def pace(self, started, total):
+        if self.bandwidth:
+            ahead = total / self.bandwidth - (time.monotonic() - started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+
+
+class LatencyWindow:
+    """Request durations per route over the last LATENCY_WINDOW requests"""
+
+    def __init__(self):
+        self.durations = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+
+    def record(self, method, path, duration):
+        # /objects/<sha> and /objects/<other sha> are one route
+        route = "/" + path.strip("/").split("/", 1)[0]
+        self.durations[f"{method} {route}"].append(duration)
+
+    def summary(self):
+        result = {}
+        for route, durations in self.durations.items():
+            ordered = sorted(durations)
+            if not ordered:
+                continue
+
+            def at(fraction):
+                return round(1000 * ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 1)
+
+            result[route] = {"count": len(ordered), "p50_ms": at(0.5), "p95_ms": at(0.95),
+                             "p99_ms": at(0.99), "max_ms": round(1000 * ordered[-1], 1)}
+        return result
+
+    def reset(self):
+        self.durations.clear()
+
+
+class FsyncBatcher:
+    """Group commit: files finished within one window share a single sync pass"""
+
+    def __init__(self, directory, interval=0.02, max_batch=64):
+        self.directory = directory
+        self.interval = interval
+        self.max_batch = max_batch
+        self.pending = []
+        self.wakeup = None
+        self.batches = 0
+        self.synced = 0
+
+    async def commit(self, tmp_path, final_path):
+        """Resolves once the file is durable under its final name"""
+        if self.interval is None:
+            os.replace(tmp_path, final_path)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((tmp_path, final_path, future))
+        if self.wakeup is None:
+            self.wakeup = asyncio.ensure_future(self.flush_later())
+        elif len(self.pending) >= self.max_batch:
+            self.wakeup.cancel()
+            self.wakeup = asyncio.ensure_future(self.flush_later(0))
+        await future
+
+    async def flush_later(self, delay=None):
+        try:
+            await asyncio.sleep(self.interval if delay is None else delay)
+        except asyncio.CancelledError:
+            return
+        batch, self.pending = self.pending, []
+        self.wakeup = None
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.sync, batch)
+        except OSError as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        self.batches += 1
+        self.synced += len(batch)
+        for _, _, future in batch:
+            future.set_result(None)
+
+    def sync(self, batch):
+        for tmp_path, final_path, _ in batch:
+            fd = os.open(tmp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(tmp_path, final_path)
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class IngestServer:
+    def __init__(self, storage, chunk_size=DEFAULT_CHUNK_SIZE, link=None, fsync_interval=0.02,
+                 upload_ttl=UPLOAD_TTL):
+        self.storage = Path(storage)
+        self.partial_dir = self.storage / ".partial"
+        self.partial_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+        self.link = link or LinkSimulator()
+        self.fsync = FsyncBatcher(self.storage, interval=fsync_interval)
+        self.uploads = {}
+        self.upload_ttl = upload_ttl
+        self.reserved = set()
+        # Content being checked against the index and stored, by sha256
+        self.storing = {}
+        self.sessions_dir = self.storage / ".sessions"
+        self.sessions_dir.mkdir(exist_ok=True)
+        self.index_path = self.storage / ".index.jsonl"
+        self.objects = {}
+        self.keys = {}
+        self.load_index()
+        self.frames = collections.OrderedDict()
+        self.stats = {"requests": 0, "files": 0, "bytes": 0, "errors": 0, "duplicates": 0,
+                      "delta_frames": 0, "delta_bytes": 0, "expired_uploads": 0, "started": time.time()}
+        self.latency = LatencyWindow()
+        self.routes = [
+            ("POST", re.compile(r"^/upload$"), self.receive_images),
+            ("GET", re.compile(r"^/stats$"), self.server_stats),
+            ("GET", re.compile(r"^/health$"), self.health),
+            ("GET", re.compile(r"^/objects/([0-9a-f]{64})$"), self.object_status),
+            ("PUT", re.compile(r"^/sessions/([\w-]{1,64})/manifest$"), self.put_manifest),
+            ("GET", re.compile(r"^/sessions/([\w-]{1,64})$"), self.session_status),
+            ("POST", re.compile(r"^/uploads$"), self.create_upload),
+            ("PUT", re.compile(r"^/uploads/([0-9a-f]{32})$"), self.append_upload),
+            ("GET", re.compile(r"^/uploads/([0-9a-f]{32})$"), self.upload_status),
+        ]
+
+    async def read_body(self, request):
+        """Yield the request body in pieces, applying the link simulation"""
+        remaining = request.content_length
+        cut_at = self.link.plan_drop(remaining)
+        received = 0
+        started = time.monotonic()
+        while remaining > 0:
+            size = min(READ_SIZE, remaining)
+            if cut_at is not None and received + size > cut_at:
+                size = cut_at - received
+                if size <= 0:
+                    raise ConnectionDropped()
+            data = await request.reader.readexactly(size)
+            remaining -= len(data)
+            received += len(data)
+            await self.link.pace(started, received)
+            yield data
+        request.body_consumed = True
+
+    async def read_json(self, request):
+        body = b"".join([data async for data in self.read_body(request)])
+        return json.loads(body or b"{}")
+
+    def load_index(self):
+        try:
+            with open(self.index_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self.remember(entry["sha256"], entry["file"], entry.get("session"), entry.get("seq"))
+        except FileNotFoundError:
+            pass
+
+    def remember(self, sha256, filename, session=None, seq=None):
+        self.objects[sha256] = filename
+        if session:
+            self.keys[(session, int(seq))] = sha256
+
+    def record(self, sha256, filename, session=None, seq=None):
+        self.remember(sha256, filename, session, seq)
+        with open(self.index_path, "a") as f:
+            f.write(json.dumps({"sha256": sha256, "file": filename, "session": session,
+                                "seq": seq}) + "\n")
+
+    async def claim(self, sha256):
+        """Wait for another request storing the same content, then hold it until release()"""
+        while sha256 in self.storing:
+            await self.storing[sha256].wait()
+        self.storing[sha256] = asyncio.Event()
+
+    def release(self, sha256):
+        self.storing.pop(sha256).set()
+
+    def known(self, sha256, session=None, seq=None):
+        """Stored filename for this content, recording the (session, seq) key if new"""
+        filename = self.objects.get(sha256)
+        if filename and session and self.keys.get((session, int(seq))) != sha256:
+            self.record(sha256, filename, session, seq)
+        return filename
+
+    async def object_status(self, request, sha256):
+        query = parse_qs(request.query)
+        session = query.get("session", [None])[0]
+        seq = query.get("seq", [0])[0]
+        filename = self.known(sha256, session, seq)
+        if filename is None:
+            return 404, {"status": "missing"}
+        self.stats["duplicates"] += 1
+        return 200, {"status": "exists", "files": [filename]}
+
+    async def put_manifest(self, request, session_id):
+        manifest = await self.read_json(request)
+        if not isinstance(manifest.get("images"), list):
+            return 400, {"error": "manifest needs an images list"}
+        path = self.sessions_dir / f"{session_id}.json"
+        path.write_text(json.dumps(manifest))
+        return 200, {"status": "success"}
+
+    async def session_status(self, request, session_id):
+        path = self.sessions_dir / f"{session_id}.json"
+        try:
+            manifest = json.loads(path.read_text())
+        except FileNotFoundError:
+            return 404, {"error": "unknown session"}
+        listed = {int(image["seq"]): image["sha256"] for image in manifest["images"]}
+        expected = max(int(manifest.get("expected") or 0), len(listed))
+        received = []
+        missing = []
+        for seq in range(1, expected + 1):
+            sha256 = listed.get(seq) or self.keys.get((session_id, seq))
+            if sha256 and sha256 in self.objects:
+                received.append(seq)
+            else:
+                missing.append(seq)
+        return 200, {"expected": expected, "received": received, "missing": missing,
+                     "complete": not missing}
+
+    def unique_path(self, filename):
+        """Final path for an uploaded file, never overwriting an earlier one.
+
+        Names stay reserved until commit() has renamed the file into place.
+        """
+        name = Path(filename).name or "image.png"
+        path = self.storage / name
+        stem, suffix = os.path.splitext(name)
+        n = 1
+        while path in self.reserved or path.exists():
+            path = self.storage / f"{stem}-{n}{suffix}"
+            n += 1
+        self.reserved.add(path)
+        return path
+
+    async def commit(self, tmp_path, final_path):
+        try:
+            await self.fsync.commit(tmp_path, final_path)
+        finally:
+            self.reserved.discard(final_path)
+
+    async def store(self, tmp_path, filename, sha256, session=None, seq=0):
+        """Move a received file into place, rebuilding tile deltas first, returns the stored name"""
+        if filename.endswith(".tdelta"):
+            delta_bytes = os.path.getsize(tmp_path)
+            png_path = self.partial_dir / uuid.uuid4().hex
+            try:
+                frame = await self.rebuild_delta(tmp_path, png_path, session)
+            except Exception as e:
+                if png_path.exists():
+                    os.unlink(png_path)
+                raise ValueError(f"cannot rebuild {filename}: {e}")
+            finally:
+                os.unlink(tmp_path)
+            tmp_path = png_path
+            filename = filename[:-len(".tdelta")] + ".png"
+            self.frames[(session, int(seq))] = frame
+            while len(self.frames) > FRAME_CACHE:
+                self.frames.popitem(last=False)
+            self.stats["delta_frames"] += 1
+            self.stats["delta_bytes"] += delta_bytes
+        final_path = self.unique_path(filename)
+        await self.commit(tmp_path, final_path)
+        self.record(sha256, final_path.name, session, seq)
+        self.stats["files"] += 1
+        self.stats["bytes"] += os.path.getsize(final_path)
+        return final_path.name
+
+    async def rebuild_delta(self, delta_path, png_path, session):
+        """Write the full PNG for a delta, returns the decoded frame"""
+        # Only servers that receive deltas need cv2 and NumPy
+        import cv2
+        import tile_delta
+
+        payload = delta_path.read_bytes()
+        base_seq = tile_delta.delta_base_seq(payload)
+        base = self.frames.get((session, base_seq))
+        base_path = None
+        if base is None:
+            base_name = self.objects.get(self.keys.get((session, base_seq)))
+            if base_name is None:
+                raise ValueError(f"base frame {base_seq} of session {session} is not stored")
+            base_path = self.storage / base_name
+
+        def rebuild():
+            frame = base if base_path is None else cv2.imread(str(base_path), cv2.IMREAD_UNCHANGED)
+            if frame is None:
+                raise ValueError(f"base frame {base_seq} of session {session} is unreadable")
+            frame = tile_delta.apply_delta(payload, frame)
+            ok, buffer = cv2.imencode('.png', frame)
+            if not ok:
+                raise ValueError("could not encode the rebuilt frame")
+            with open(png_path, "wb") as f:
+                f.write(buffer.tobytes())
+            return frame
+
+        # Decoding and PNG encoding would stall every other connection
+        return await asyncio.get_running_loop().run_in_executor(None, rebuild)
+
+    async def receive_images(self, request):
+        """Stream each multipart file part to disk without holding the body"""
+        match = re.search(r'boundary="?([^";]+)"?', request.headers.get("content-type", ""))
+        if not match:
+            return 400, {"error": "expected multipart/form-data"}
+        delimiter = b"\r\n--" + match.group(1).encode("latin-1")
+        keep = len(delimiter) + 1
+
+        # Leading CRLF lets the first boundary match the same delimiter as the rest
+        buffer = b"\r\n"
+        state = "preamble"
+        current = None
+        received = []
+        # Every temp file opened for this request, whatever is not moved into place is removed
+        parts = []
+        try:
+            async for data in self.read_body(request):
+                buffer += data
+                while True:
+                    if state in ("preamble", "part"):
+                        index = buffer.find(delimiter)
+                        if index < 0:
+                            if len(buffer) > keep:
+                                if current:
+                                    self.write_part(current, buffer[:-keep])
+                                buffer = buffer[-keep:]
+                            break
+                        if current:
+                            self.write_part(current, buffer[:index])
+                            current["file"].close()
+                            received.append(current)
+                            current = None
+                        buffer = buffer[index + len(delimiter):]
+                        state = "boundary"
+
+                    if state == "boundary":
+                        if len(buffer) < 2:
+                            break
+                        if buffer.startswith(b"--"):
+                            state = "epilogue"
+                            break
+                        end = buffer.find(b"\r\n\r\n")
+                        if end < 0:
+                            if len(buffer) > MAX_PART_HEADER:
+                                raise ValueError("multipart headers too large")
+                            break
+                        current = self.open_part(buffer[2:end].decode("utf-8", "replace"))
+                        parts.append(current)
+                        buffer = buffer[end + 4:]
+                        state = "part"
+
+                    if state == "epilogue":
+                        buffer = b""
+                        break
+            if state != "epilogue":
+                return 400, {"error": "truncated multipart body"}
+            return await self.store_images(request, [part for part in received if part["field"] == "images"])
+        finally:
+            # Dropped connections, bad headers and refused parts alike
+            for part in parts:
+                part["file"].close()
+                part["tmp_path"].unlink(missing_ok=True)
+
+    async def store_images(self, request, images):
+        expected_sha256 = request.headers.get("x-content-sha256")
+        session = request.headers.get("x-session-id")
+        seq = request.headers.get("x-sequence", 0)
+        if expected_sha256 and len(images) == 1 and images[0]["sha256"].hexdigest() != expected_sha256:
+            return 400, {"error": "content hash mismatch"}
+
+        files = []
+        duplicates = 0
+        for part in images:
+            sha256 = part["sha256"].hexdigest()
+            # The same content arriving twice at once is stored by the first, the other sees it
+            await self.claim(sha256)
+            try:
+                existing = self.known(sha256, session, seq)
+                if existing:
+                    # Replay or retry, keep the first copy
+                    files.append(existing)
+                    duplicates += 1
+                    continue
+                try:
+                    files.append(await self.store(part["tmp_path"], part["filename"], sha256, session, seq))
+                except ValueError as e:
+                    return 400, {"error": str(e), "files": files}
+            finally:
+                self.release(sha256)
+        self.stats["duplicates"] += duplicates
+        if images and duplicates == len(images):
+            return 200, {"status": "exists", "files": files}
+        return 200, {"status": "success", "files": files}
+
+    def open_part(self, header_text):
+        disposition = ""
+        for line in header_text.split("\r\n"):
+            name, _, value = line.partition(":")
+            if name.strip().lower() == "content-disposition":
+                disposition = value
+        field = re.search(r'\bname="([^"]*)"', disposition)
+        filename = re.search(r'filename="([^"]*)"', disposition)
+        tmp_path = self.partial_dir / uuid.uuid4().hex
+        return {
+            "field": field.group(1) if field else "",
+            "filename": filename.group(1) if filename else "",
+            "tmp_path": tmp_path,
+            "file": open(tmp_path, "wb"),
+            "sha256": hashlib.sha256()
+        }
+
+    def write_part(self, part, data):
+        part["file"].write(data)
+        part["sha256"].update(data)
+
+    async def health(self, request):
+        return 200, {"status": "ok"}
+
+    async def server_stats(self, request):
+        uptime = time.time() - self.stats["started"]
+        result = dict(self.stats, uptime=round(uptime, 1), latency=self.latency.summary(),
+                      fsync_batches=self.fsync.batches, fsync_files=self.fsync.synced)
+        if parse_qs(request.query).get("reset") == ["1"]:
+            self.latency.reset()
+        return 200, result
+
+    async def create_upload(self, request):
+        info = await self.read_json(request)
+        size = int(info.get("size", 0))
+        if size <= 0 or size > MAX_UPLOAD_SIZE:
+            return 400, {"error": "invalid size"}
+        upload_id = uuid.uuid4().hex
+        filename = Path(info.get("filename") or f"{upload_id}.png").name
+        self.uploads[upload_id] = {"filename": filename, "size": size, "offset": 0, "complete": False,
+                                   "session": info.get("session"), "seq": info.get("seq", 0),
+                                   "touched": time.monotonic(), "active": 0}
+        (self.partial_dir / upload_id).touch()
+        return 201, {"upload_id": upload_id, "offset": 0, "chunk_size": self.chunk_size}
+
+    async def append_upload(self, request, upload_id):
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            return 404, {"error": "unknown upload"}
+        offset = int(request.headers.get("upload-offset", -1))
+        if offset != upload["offset"] or upload["complete"]:
+            return 409, {"offset": upload["offset"], "complete": upload["complete"]}
+        if offset + request.content_length > upload["size"]:
+            return 400, {"error": "chunk past end of upload", "offset": upload["offset"]}
+
+        # Not expired while a chunk is being received or stored
+        upload["active"] += 1
+        try:
+            with open(self.partial_dir / upload_id, "ab") as f:
+                try:
+                    async for data in self.read_body(request):
+                        f.write(data)
+                        # Bytes are acknowledged as they land, a cut chunk resumes mid-way
+                        upload["offset"] += len(data)
+                finally:
+                    f.flush()
+
+            if upload["offset"] == upload["size"]:
+                if not await self.finish_upload(upload_id, upload):
+                    return 400, {"error": upload["error"]}
+        finally:
+            upload["active"] -= 1
+            upload["touched"] = time.monotonic()
+        return 200, {"offset": upload["offset"], "complete": upload["complete"],
+                     "filename": upload["filename"]}
+
+    async def finish_upload(self, upload_id, upload):
+        """Store a fully received upload, False (and upload["error"]) if it was refused"""
+        partial_path = self.partial_dir / upload_id
+        sha256 = hashlib.sha256(partial_path.read_bytes()).hexdigest()
+        await self.claim(sha256)
+        try:
+            existing = self.known(sha256, upload["session"], upload["seq"])
+            if existing:
+                os.unlink(partial_path)
+                upload["filename"] = existing
+                self.stats["duplicates"] += 1
+            else:
+                try:
+                    upload["filename"] = await self.store(partial_path, upload["filename"], sha256,
+                                                          upload["session"], upload["seq"])
+                except ValueError as e:
+                    del self.uploads[upload_id]
+                    upload["error"] = str(e)
+                    return False
+        finally:
+            self.release(sha256)
+        upload["complete"] = True
+        return True
+
+    def expire_uploads(self):
+        """Drop chunked uploads idle for upload_ttl, and partial files nothing refers to"""
+        now = time.monotonic()
+        for upload_id, upload in list(self.uploads.items()):
+            if not upload["active"] and now - upload["touched"] > self.upload_ttl:
+                del self.uploads[upload_id]
+                (self.partial_dir / upload_id).unlink(missing_ok=True)
+                if not upload["complete"]:
+                    self.stats["expired_uploads"] += 1
+        # Left by a server that stopped mid-upload
+        for path in self.partial_dir.iterdir():
+            try:
+                if path.name not in self.uploads and time.time() - path.stat().st_mtime > self.upload_ttl:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    async def expire_forever(self):
+        while True:
+            await asyncio.sleep(min(60, self.upload_ttl))
+            self.expire_uploads()
+
+    async def upload_status(self, request, upload_id):
+        upload = self.uploads.get(upload_id)
+        if upload is None:
+            return 404, {"error": "unknown upload"}
+        upload["touched"] = time.monotonic()
+        return 200, {"offset": upload["offset"], "size": upload["size"],
+                     "complete": upload["complete"]}
+
+    async def dispatch(self, request):
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if match and method == request.method:
+                return await handler(request, *match.groups())
+        return 404, {"error": f"no route for {request.method} {request.path}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                started = time.monotonic()
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                request = Request(method, target, headers, reader)
+                if headers.get("expect", "").lower() == "100-continue":
+                    writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                self.stats["requests"] += 1
+                try:
+                    status, payload = await self.dispatch(request)
+                except ValueError as e:
+                    status, payload = 400, {"error": str(e)}
+                if status >= 400 and payload.get("status") != "missing":
+                    self.stats["errors"] += 1
+
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if not request.body_consumed:
+                    # Body left unread, the stream position is unknown
+                    keep_alive = False
+                body = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status < 400 else 'Error'}\r\n"
+                    f"Content-Type: application/json\r\n"
+                    f"Content-Length: {len(body)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+                    + body)
+                await writer.drain()
+                # From request line to response written, the body upload included
+                self.latency.record(request.method, request.path, time.monotonic() - started)
+                if not keep_alive:
+                    break
+        except (ConnectionDropped, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            print(f"Request error: {str(e)}", file=sys.stderr)
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port, limit=64 * 1024)
+        print(f"ingest server on http://{host}:{port}, storing in {self.storage}", flush=True)
+        # Held here, the event loop keeps only a weak reference to tasks
+        expiry = asyncio.create_task(self.expire_forever())
+        async with server:
+            await server.serve_forever()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reference ingest server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--storage", default="uploads")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--bandwidth", type=int, default=None, help="bytes/s cap per request body")
+    parser.add_argument("--drop-rate", type=float, default=0.0,
+                        help="probability of cutting the connection inside a request body")
+    parser.add_argument("--fsync-interval", type=float, default=0.02,
+                        help="seconds to gather uploads into one fsync batch")
+    parser.add_argument("--no-fsync", action="store_true", help="ack before data reaches the disk")
+    parser.add_argument("--upload-ttl", type=float, default=UPLOAD_TTL,
+                        help="seconds before an idle chunked upload and its partial file are dropped")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = IngestServer(args.storage, chunk_size=args.chunk_size,
+                          link=LinkSimulator(args.bandwidth, args.drop_rate),
+                          fsync_interval=None if args.no_fsync else args.fsync_interval,
+                          upload_ttl=args.upload_ttl)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,132 +1,41 @@
 # -*- coding: utf-8 -*-
-import requests
-import time
-from datetime import datetime
-import cv2
-import itertools
-import uuid
-from pathlib import Path
 import sys
 import os
-import subprocess
-import threading
-import numpy as np
-from PyQt5.QtCore import QThread, pyqtSignal, QObject, Qt, QTimer
+from PyQt5.QtCore import QObject
 from PyQt5 import QtGui, QtWidgets, QtCore
 
-counter = itertools.count(1)
+# The capture engine (cv2, numpy, requests) is loaded by CameraWarmup, see startup.py
+from qt_bridge import SessionBridge
+from sampling_profiler import install_signal_trigger
+from governor import Governor
+from endpoints import EndpointRouter
+from startup import StartupTimeline, CameraWarmup
 
-def get_camera_uuid_map():
-    return {
-        '9f7f9c0b-bd09-53db-9a2b-20daffdb4028': '/dev/video0',
-        '48b5ddac-a396-5275-b6cb-32edddb4b5bf': '/dev/video1'
-    }
-
-def open_camera_by_uuid(target_uuid, api_preference=cv2.CAP_V4L2):
-    uuid_map = get_camera_uuid_map()
-    
-    if target_uuid not in uuid_map:
-        available_uuids = "\n".join(uuid_map.keys())
-        raise ValueError(f"no UUID please\n{available_uuids}")
-    
-    device_path = uuid_map[target_uuid]
-    
-    if not Path(device_path).exists():
-        raise FileNotFoundError(f" {device_path} no cameras")
-    
-    cap = cv2.VideoCapture(device_path, api_preference)
-    cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, 1)
-    cap.set(cv2.CAP_PROP_EXPOSURE, 400)
-
-    if not cap.isOpened():
-        raise RuntimeError(f" {device_path} no get")
-    
-    return cap
-
-def generate_filename(prefix="image"):
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]  
-    return f"{prefix}_{timestamp}.png"
-
-def send_image(png_binary, server_url):
-    try:
-        filename = generate_filename()  
-        files = {'images': (filename, png_binary)}
-        response = requests.post(server_url, files=files, timeout=5)
-        return filename, response.json()
-    except Exception as e:
-        print(f"Error sending image: {str(e)}")
-        return None, str(e)
-
-class CameraThread(QThread):
-    image_updated = pyqtSignal(QtGui.QImage)
-    capture_image_ready = pyqtSignal(bytes) 
-    
-    def __init__(self, uuid, parent=None):
-        super().__init__(parent)
-        self.target_uuid = uuid
-        self.running = True
-        self.capture_enabled = False
-        self.current_frame = None
-        self.lock = threading.Lock()
-    
-    def run(self):
-        try:
-            self.cap = open_camera_by_uuid(self.target_uuid)
-            while self.running:
-                ret, frame = self.cap.read()
-                if ret:
-                    with self.lock:
-                        self.current_frame = frame.copy()
-                    
-                    rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    h, w, ch = rgb_image.shape
-                    bytes_per_line = ch * w
-                    qimage = QtGui.QImage(rgb_image.data, w, h, bytes_per_line, QtGui.QImage.Format_RGB888)
-                    self.image_updated.emit(qimage)
-                
-                if self.capture_enabled:
-                    self.process_capture_request()
-                    self.capture_enabled = False
-                
-                self.msleep(30)
-                
-        except Exception as e:
-            print(f"Camera error: {str(e)}")
-        finally:
-            if hasattr(self, 'cap') and self.cap.isOpened():
-                self.cap.release()
-    
-    def process_capture_request(self):
-        with self.lock:
-            if self.current_frame is not None:
-                _, buffer = cv2.imencode('.png', self.current_frame)
-                png_binary = buffer.tobytes()
-                self.capture_image_ready.emit(png_binary)
-    
-    def stop(self):
-        self.running = False
-        self.wait()
-    
-    def request_capture(self):
-        self.capture_enabled = True
+CAMERA_UUID = '9f7f9c0b-bd09-53db-9a2b-20daffdb4028'
 
 class Ui_MainWindow(QObject):
-    update_send_status = pyqtSignal(str, str)
-    script_completed = pyqtSignal()  
     
-    def __init__(self):
+    def __init__(self, warmup=None):
         super().__init__()  #
-        self.SERVER_IP = '192.168.148.135'
+        self.warmup = warmup
+        # HETAOPI_SERVERS=host[:port],... spreads uploads over several servers
+        self.SERVER_IPS = os.environ.get("HETAOPI_SERVERS", '192.168.148.135')
         self.PORT = 5000
-        self.server_url = f'http://{self.SERVER_IP}:{self.PORT}/upload'
+        self.router = EndpointRouter.from_servers(self.SERVER_IPS, self.PORT)
+        self.router.start()
+        # HETAOPI_GOVERNOR=0 keeps the full preview rate even when the board is hot
+        self.governor = None
+        if os.environ.get("HETAOPI_GOVERNOR", "1") != "0":
+            self.governor = Governor()
+            self.governor.start()
         
         self.external_script = "/home/pi/test/app_io.py"
+        self.session = None
         
-        self.capture_timer = QTimer()
-        self.capture_timer.timeout.connect(self.capture_and_send)
-        
-        self.update_send_status.connect(self.handle_update_send_status)
-        self.script_completed.connect(self.on_script_completed)  
+        self.bridge = SessionBridge()
+        self.bridge.status_changed.connect(self.handle_status)
+        self.bridge.image_updated.connect(self.update_image)
+        self.bridge.send_status.connect(self.handle_update_send_status)
         
     def setupUi(self, MainWindow):
         MainWindow.setObjectName("MainWindow")
@@ -167,10 +76,14 @@ class Ui_MainWindow(QObject):
         self.retranslateUi(MainWindow)
         QtCore.QMetaObject.connectSlotsByName(MainWindow)
 
-        self.camera_thread = None
         self.pushButton.clicked.connect(self.toggle_camera)
-        self.external_script_running = False  
-        self.external_script_completed = False  
+        if self.warmup:
+            # Shows the camera as soon as it is open, the label scales it
+            self.warmup.attach(self.bridge.on_preview)
+            # The button waits for the engine here, never on the GUI thread
+            self.pushButton.setEnabled(False)
+            self.bridge.engine_ready.connect(lambda: self.pushButton.setEnabled(True))
+            self.warmup.when_ready(self.bridge.engine_ready.emit)
 
     def retranslateUi(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
@@ -178,6 +91,9 @@ class Ui_MainWindow(QObject):
         self.pushButton.setText(_translate("MainWindow", "Start Camera"))
         self.status_label.setText("Ready")
         
+    def handle_status(self, text):
+        self.status_label.setText(text)
+    
     def handle_update_send_status(self, filename, response):
         if filename:
             self.status_label.setText(f"Image sent: {filename}, response: {response}")
@@ -185,7 +101,7 @@ class Ui_MainWindow(QObject):
             self.status_label.setText(response)
     
     def toggle_camera(self):
-        if self.camera_thread and self.camera_thread.isRunning():
+        if self.session and not self.session.capture_done.is_set():
             self.stop_camera()
             self.pushButton.setText("Start Camera")
             self.status_label.setText("Camera stopped")
@@ -196,92 +112,32 @@ class Ui_MainWindow(QObject):
     
     def start_camera(self):
         try:
-            self.camera_thread = CameraThread('9f7f9c0b-bd09-53db-9a2b-20daffdb4028')
-            self.camera_thread.image_updated.connect(self.update_image)
-            self.camera_thread.capture_image_ready.connect(self.handle_capture_complete)
-            self.camera_thread.start()
-            
-            self.run_external_script()
-            
-            self.status_label.setText("Running external script...")
+            # Already imported by the warm-up thread, the button is enabled once it is
+            from capture_engine import CaptureSession
+            camera_pool = self.warmup.pool if self.warmup else None
+            # Captures every second until stopped
+            self.session = CaptureSession(
+                self.router.urls[0],
+                camera_uuid=CAMERA_UUID,
+                camera_pool=camera_pool,
+                max_images=None,
+                pump_script=self.external_script,
+                listener=self.bridge,
+                governor=self.governor,
+                router=self.router
+            )
+            self.session.start()
             
         except Exception as e:
             self.label.setText(f"Error: {str(e)}")
             self.status_label.setText(f"Camera start failed: {str(e)}")
     
-    def run_external_script(self):
-        try:
-            if not os.path.exists(self.external_script):
-                self.status_label.setText(f"Script not found: {self.external_script}")
-                self.script_completed.emit()  
-                return
-                
-            self.external_script_running = True
-            self.external_script_completed = False
-            
-            threading.Thread(
-                target=self.run_script_thread,
-                daemon=True
-            ).start()
-            
-            self.status_label.setText(f"Running external script...")
-        except Exception as e:
-            self.status_label.setText(f"Error running script: {str(e)}")
-            self.script_completed.emit()  
-    
-    def run_script_thread(self):
-        try:
-            command = f"sudo python3 {self.external_script}"
-            result = subprocess.run(command, shell=True, capture_output=True, text=True)
-            return_code = result.returncode
-            
-            self.script_completed.emit()
-        except Exception as e:
-            print(f"Error running script: {str(e)}")
-            self.script_completed.emit()
-    
-    def on_script_completed(self):
-        self.external_script_running = False
-        self.external_script_completed = True
-        
-        self.capture_timer.start(1000)
-        self.status_label.setText("External script completed, start capturing")
-    
-    def monitor_script_output(self, process):
-        pass
-    
-    def capture_and_send(self):
-        if (self.camera_thread and 
-            self.camera_thread.isRunning() and 
-            self.external_script_completed):
-            self.camera_thread.request_capture()
-            self.status_label.setText("Capturing image...")
-    
-    def handle_capture_complete(self, image_data):
-        if self.external_script_completed:
-            self.status_label.setText("Sending image to server...")
-            threading.Thread(
-                target=self.send_image_thread,
-                args=(image_data,),
-                daemon=True
-            ).start()
-    
-    def send_image_thread(self, image_data):
-        try:
-            filename, response = send_image(image_data, self.server_url)
-            self.update_send_status.emit(filename, str(response))
-        except Exception as e:
-            self.update_send_status.emit("", f"Send error: {str(e)}")
-    
     def stop_camera(self):
-        if self.camera_thread:
-            self.camera_thread.stop()
-            self.camera_thread = None
+        if self.session:
+            self.session.stop()
+            self.session = None
             self.label.clear()
             self.label.setText("Camera stopped")
-        
-        if self.capture_timer.isActive():
-            self.capture_timer.stop()
     
     def update_image(self, qimage):
         pixmap = QtGui.QPixmap.fromImage(qimage)
@@ -294,15 +150,24 @@ class Ui_MainWindow(QObject):
         )
         self.label.setPixmap(scaled)
         self.label.setAlignment(QtCore.Qt.AlignCenter)
+        if self.warmup:
+            self.warmup.frame_shown()
     
     def closeEvent(self, event):
+        session = self.session
         self.stop_camera()
+        if session:
+            from capture_engine import STOP_TIMEOUT
+            # Bounded, a camera stuck in the driver is abandoned after STOP_TIMEOUT
+            session.capture_done.wait(STOP_TIMEOUT + 1)
+        if self.warmup:
+            self.warmup.close()
         event.accept()
 
 class MainWindow(QtWidgets.QMainWindow):
-    def __init__(self):
+    def __init__(self, warmup=None):
         super().__init__()
-        self.ui = Ui_MainWindow()
+        self.ui = Ui_MainWindow(warmup)
         self.ui.setupUi(self)
     
     def closeEvent(self, event):
@@ -310,17 +175,26 @@ class MainWindow(QtWidgets.QMainWindow):
         event.accept()
 
 if __name__ == "__main__":
+    timeline = StartupTimeline("myio")
+    timeline.mark("imports")
+    # The camera opens while Qt starts and the window is built
+    warmup = CameraWarmup(CAMERA_UUID, timeline)
+    warmup.start()
 
     os.environ["DISPLAY"] = ":0.0"
 
     app = QtWidgets.QApplication(sys.argv)
     
 
-    main_window = MainWindow()
+    main_window = MainWindow(warmup)
     main_window.show()
+    # Runs once the event loop has started and the window is mapped
+    QtCore.QTimer.singleShot(0, lambda: timeline.mark("ui_ready"))
     
 
     import signal
     signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # kill -USR1 <pid> profiles the running app, see sampling_profiler.py
+    install_signal_trigger(output_dir=os.environ.get("HETAOPI_PROFILE_DIR", "/tmp"))
 
     sys.exit(app.exec_())
\ No newline at end of file
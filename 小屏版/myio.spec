@@ -16,17 +16,18 @@ a = Analysis(
 )
 pyz = PYZ(a.pure)
 
+# One-dir build: a one-file build unpacks cv2, numpy and Qt to /tmp on
+# every launch, and UPX-packed libraries are decompressed on every load.
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='myio',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,
     upx_exclude=[],
     runtime_tmpdir=None,
     console=True,
@@ -36,3 +37,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='myio',
+)
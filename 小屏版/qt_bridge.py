@@ -0,0 +1,103 @@
+import threading
+import time
+
+from PyQt5.QtCore import pyqtSignal, QObject, QTimer
+from PyQt5 import QtGui
+
+from session_listener import SessionListener
+from frame_mailbox import LatestMailbox
+import tracing
+
+DISPLAY_REFRESH_HZ = 60
+
+
+class SessionBridge(QObject, SessionListener):
+    """Forwards capture engine callbacks to the GUI thread as Qt signals.
+
+    Preview frames and label texts go through latest-only mailboxes, and at
+    most one wake event is queued at a time, so a stalled GUI thread sees
+    the newest frame when it catches up instead of a backlog. Updates are
+    delivered at no more than the display refresh rate.
+    """
+    status_changed = pyqtSignal(str)
+    progress_changed = pyqtSignal(int, int)
+    image_updated = pyqtSignal(QtGui.QImage)
+    send_status = pyqtSignal(str, str)
+    capture_done = pyqtSignal(int)
+    # CameraWarmup has loaded the engine, or given up, see startup.py
+    engine_ready = pyqtSignal()
+    wake = pyqtSignal()
+
+    def __init__(self, refresh_hz=DISPLAY_REFRESH_HZ, parent=None):
+        super().__init__(parent)
+        self.min_interval = 1.0 / refresh_hz
+        self.preview = LatestMailbox()
+        self.status = LatestMailbox()
+        self.progress = LatestMailbox()
+        self.lock = threading.Lock()
+        self.wake_pending = False
+        self.last_flush = 0.0
+        self.wake.connect(self.schedule_flush)
+
+    def post(self, mailbox, item):
+        mailbox.put(item)
+        with self.lock:
+            if self.wake_pending:
+                return
+            self.wake_pending = True
+        self.wake.emit()
+
+    def schedule_flush(self):
+        delay = self.last_flush + self.min_interval - time.monotonic()
+        if delay > 0:
+            QTimer.singleShot(int(delay * 1000) + 1, self.flush)
+        else:
+            self.flush()
+
+    def flush(self):
+        with tracing.span("ui.flush", "ui"):
+            self.deliver()
+
+    def deliver(self):
+        with self.lock:
+            self.wake_pending = False
+        self.last_flush = time.monotonic()
+
+        rgb_frame = self.preview.take()
+        if rgb_frame is not None:
+            h, w, ch = rgb_frame.shape
+            # Slots run synchronously here, rgb_frame outlives the QImage use
+            qimage = QtGui.QImage(rgb_frame.data, w, h, ch * w, QtGui.QImage.Format_RGB888)
+            self.image_updated.emit(qimage)
+
+        status = self.status.take()
+        if status is not None:
+            signal, args = status
+            signal.emit(*args)
+
+        progress = self.progress.take()
+        if progress is not None:
+            count, total = progress
+            self.progress_changed.emit(count, total or 0)
+
+    def stats(self):
+        return {
+            "preview": self.preview.stats(),
+            "status": self.status.stats(),
+            "progress": self.progress.stats()
+        }
+
+    def on_status(self, text):
+        self.post(self.status, (self.status_changed, (text,)))
+
+    def on_progress(self, count, total):
+        self.post(self.progress, (count, total))
+
+    def on_preview(self, rgb_frame):
+        self.post(self.preview, rgb_frame)
+
+    def on_sent(self, filename, response):
+        self.post(self.status, (self.send_status, (filename or "", response)))
+
+    def on_capture_done(self, count):
+        self.capture_done.emit(count)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Recompute per-frame readings over stored sessions in a process pool.
+
+Sessions are found in either layout:
+
+  - an ingest server storage directory: .index.jsonl gives each file's
+    session and sequence number
+  - directories of recorded PNGs: files that are not in an index are
+    grouped per directory and per capture date (generate_filename names)
+
+Sessions are handed to the workers a few at a time, each worker decodes
+one frame at a time and returns only the numbers, so memory stays flat
+however many sessions there are. Results go to OUTPUT/part_NNNNN.npz, one
+column per value. A part holds whole sessions and is renamed into place
+once written, so a rerun skips every session found in a part and redoes
+the rest. load_results(OUTPUT) joins the parts.
+
+The readings come from analyse_frame() unless --analysis module:function
+names another one: it takes a BGR frame and returns a dict of numbers.
+
+    python3 reanalyse.py /srv/hetaopi/uploads /srv/reanalysis/v2 --workers 4
+"""
+import argparse
+import collections
+import concurrent.futures
+import glob
+import importlib
+import json
+import os
+import re
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from calibration import frame_luma, GOOD_LUMA_RANGE
+
+# image_2024-05-01_10-20-30_123.png from generate_filename
+FILENAME_DATE = re.compile(r"_(\d{4}-\d{2}-\d{2})_\d{2}-\d{2}-\d{2}")
+IMAGE_EXTENSIONS = (".png", ".jpg")
+
+
+def analyse_frame(frame, roi=None):
+    """Exposure, focus and mean colour of the region of interest"""
+    h, w = frame.shape[:2]
+    x, y, rw, rh = roi or (w // 3, h // 3, w // 3, h // 3)
+    region = frame[y:y + rh, x:x + rw]
+    b, g, r = cv2.mean(region)[:3]
+    luma = frame_luma(frame)
+    grey = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY)
+    return {
+        "luma": luma,
+        "good": float(GOOD_LUMA_RANGE[0] <= luma <= GOOD_LUMA_RANGE[1]),
+        "sharpness": float(cv2.Laplacian(grey, cv2.CV_32F).var()),
+        "b": b,
+        "g": g,
+        "r": r
+    }
+
+
+def load_analysis(spec):
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def find_sessions(root):
+    """{session: [(seq, path)]} over the whole tree, sorted by seq"""
+    sessions = collections.defaultdict(list)
+    keys = set()
+    indexed = set()
+    for index_path in glob.glob(os.path.join(root, "**", ".index.jsonl"), recursive=True):
+        storage = os.path.dirname(index_path)
+        with open(index_path) as f:
+            for line in f:
+                entry = json.loads(line)
+                if not entry.get("session"):
+                    continue
+                path = os.path.join(storage, entry["file"])
+                # Replays are acknowledged without a second copy, keep one row per seq
+                key = (entry["session"], int(entry["seq"]))
+                if key in keys:
+                    continue
+                keys.add(key)
+                indexed.add(path)
+                sessions[entry["session"]].append((int(entry["seq"]), path))
+
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        loose = collections.defaultdict(list)
+        for name in sorted(files):
+            path = os.path.join(directory, name)
+            if not name.lower().endswith(IMAGE_EXTENSIONS) or path in indexed:
+                continue
+            match = FILENAME_DATE.search(name)
+            loose[match.group(1) if match else ""].append(path)
+        relative = os.path.relpath(directory, root)
+        for date, paths in loose.items():
+            session = "/".join(part for part in (relative, date) if part and part != ".") or "."
+            # Timestamped names sort in capture order
+            sessions[session].extend((seq, path) for seq, path in enumerate(paths, 1))
+
+    return {session: sorted(frames) for session, frames in sessions.items()}
+
+
+def init_worker():
+    # One process per core, OpenCV's own threads would only compete with the pool
+    cv2.setNumThreads(1)
+
+
+def analyse_session(session, frames, analysis_spec, roi):
+    """Columns for one session, plus the CPU seconds it took"""
+    cpu = time.process_time()
+    analysis = load_analysis(analysis_spec) if analysis_spec else analyse_frame
+    rows = []
+    for seq, path in frames:
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is None:
+            rows.append((seq, path, None))
+            continue
+        values = analysis(frame, roi) if roi else analysis(frame)
+        rows.append((seq, path, values))
+    return session, rows, time.process_time() - cpu
+
+
+class PartWriter:
+    """Buffers rows and writes them as numbered npz parts"""
+
+    def __init__(self, output, part_rows=20000):
+        self.output = output
+        self.part_rows = part_rows
+        self.part_index = len(glob.glob(os.path.join(output, "part_*.npz")))
+        self.rows = []
+        self.sessions = []
+
+    def done(self):
+        sessions = set()
+        for path in glob.glob(os.path.join(self.output, "part_*.npz")):
+            with np.load(path) as part:
+                sessions.update(part["session"].tolist())
+        return sessions
+
+    def add(self, session, rows):
+        self.rows.extend((session, seq, path, values) for seq, path, values in rows)
+        self.sessions.append(session)
+        if len(self.rows) >= self.part_rows:
+            self.flush()
+
+    def flush(self):
+        if not self.sessions:
+            return
+        names = sorted({name for _, _, _, values in self.rows if values for name in values})
+        columns = {
+            "session": np.array([row[0] for row in self.rows]),
+            "seq": np.array([row[1] for row in self.rows], dtype=np.int32),
+            "filename": np.array([os.path.basename(row[2]) for row in self.rows]),
+            "ok": np.array([row[3] is not None for row in self.rows])
+        }
+        for name in names:
+            columns[name] = np.array([(row[3] or {}).get(name, np.nan) for row in self.rows],
+                                     dtype=np.float32)
+        path = os.path.join(self.output, f"part_{self.part_index:05d}.npz")
+        with open(path + ".tmp", "wb") as f:
+            np.savez_compressed(f, **columns)
+        os.replace(path + ".tmp", path)
+        self.part_index += 1
+        self.rows = []
+        self.sessions = []
+
+
+def load_results(output):
+    """All parts joined into one dict of columns"""
+    parts = [np.load(path) for path in sorted(glob.glob(os.path.join(output, "part_*.npz")))]
+    names = sorted({name for part in parts for name in part.files})
+    columns = {}
+    for name in names:
+        pieces = []
+        for part in parts:
+            if name in part.files:
+                pieces.append(part[name])
+            else:
+                # A column the analysis only produced in later parts
+                pieces.append(np.full(len(part["seq"]), np.nan, dtype=np.float32))
+        columns[name] = np.concatenate(pieces)
+    return columns
+
+
+def reanalyse(root, output, workers, analysis_spec=None, roi=None, part_rows=20000, in_flight=None):
+    os.makedirs(output, exist_ok=True)
+    writer = PartWriter(output, part_rows)
+    done = writer.done()
+    sessions = find_sessions(root)
+    todo = [(session, frames) for session, frames in sorted(sessions.items()) if session not in done]
+    total_frames = sum(len(frames) for _, frames in todo)
+    print(f"{len(sessions)} sessions, {len(sessions) - len(todo)} already done, "
+        f"{len(todo)} to analyse ({total_frames} frames) with {workers} workers")
+
+    in_flight = in_flight or 2 * workers
+    frames_done = 0
+    failed = 0
+    cpu = 0.0
+    started = time.monotonic()
+    pending = iter(todo)
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=init_worker) as pool:
+        futures = set()
+        while True:
+            # Keep only a few sessions queued, the pool would otherwise pickle all of them up front
+            for session, frames in pending:
+                futures.add(pool.submit(analyse_session, session, frames, analysis_spec, roi))
+                if len(futures) >= in_flight:
+                    break
+            if not futures:
+                break
+            finished, futures = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                session, rows, seconds = future.result()
+                writer.add(session, rows)
+                frames_done += len(rows)
+                failed += sum(1 for _, _, values in rows if values is None)
+                cpu += seconds
+            elapsed = time.monotonic() - started
+            print(f"\r{frames_done}/{total_frames} frames, {frames_done / max(elapsed, 1e-9):.1f} frames/s",
+                end="", flush=True)
+    writer.flush()
+    elapsed = time.monotonic() - started
+    if todo:
+        print()
+    return {
+        "sessions": len(todo),
+        "frames": frames_done,
+        "unreadable": failed,
+        "elapsed": elapsed,
+        "frames_per_s": frames_done / elapsed if elapsed > 0 else 0.0,
+        "frames_per_core_s": frames_done / (elapsed * workers) if elapsed > 0 else 0.0,
+        "frames_per_cpu_s": frames_done / cpu if cpu > 0 else 0.0
+    }
+
+
+def parse_roi(text):
+    x, y, w, h = (int(v) for v in text.split(","))
+    return x, y, w, h
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute readings over stored sessions")
+    parser.add_argument("root", help="ingest storage or directory of recorded sessions")
+    parser.add_argument("output", help="result directory, rerun with the same one to resume")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--analysis", default=None, metavar="MODULE:FUNCTION",
+                        help="per-frame analysis to run instead of analyse_frame")
+    parser.add_argument("--roi", type=parse_roi, default=None, metavar="X,Y,W,H",
+                        help="region of interest passed to the analysis")
+    parser.add_argument("--part-rows", type=int, default=20000, help="rows per output part")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    result = reanalyse(args.root, args.output, args.workers, args.analysis, args.roi, args.part_rows)
+    print(f"{result['frames']} frames from {result['sessions']} sessions in {result['elapsed']:.1f}s, "
+          f"{result['unreadable']} unreadable")
+    print(f"{result['frames_per_s']:.1f} frames/s, {result['frames_per_core_s']:.1f} frames/s per core "
+          f"({result['frames_per_cpu_s']:.1f} per CPU second)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
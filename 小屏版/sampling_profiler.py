@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""Wall-clock sampling profiler over all threads of a running process.
+
+Stacks are sampled with sys._current_frames() and written as collapsed
+stacks (flamegraph.pl, speedscope, Perfetto all read them) plus a text
+summary of the hottest functions. install_signal_trigger() arms it on
+SIGUSR1; an idle trigger is a thread blocked in read(), so it costs
+nothing until the signal arrives. Threads waiting on locks or sockets
+are sampled too, their time shows up under the waiting call.
+"""
+import collections
+import os
+import signal
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.005
+DEFAULT_DURATION = 10.0
+DEFAULT_OUTPUT_DIR = "/tmp"
+TRIGGER_THREAD = "profile-trigger"
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.elapsed = 0.0
+
+    def sample(self, own_ident):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident or names.get(ident) == TRIGGER_THREAD:
+                continue
+            labels = []
+            while frame is not None:
+                labels.append(frame_label(frame))
+                frame = frame.f_back
+            labels.append(names.get(ident, f"thread-{ident}"))
+            self.stacks[tuple(reversed(labels))] += 1
+        self.samples += 1
+
+    def run(self, duration):
+        own_ident = threading.get_ident()
+        started = time.monotonic()
+        next_sample = started
+        while time.monotonic() - started < duration:
+            self.sample(own_ident)
+            next_sample += self.interval
+            time.sleep(max(0, next_sample - time.monotonic()))
+        self.elapsed = time.monotonic() - started
+
+    def write_collapsed(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(";".join(stack) + f" {count}\n")
+
+    def summary(self, top=25):
+        own = collections.Counter()
+        total = collections.Counter()
+        threads = collections.Counter()
+        for stack, count in self.stacks.items():
+            threads[stack[0]] += count
+            if len(stack) > 1:
+                own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+
+        lines = [f"{self.samples} samples over {self.elapsed:.1f}s, every {self.interval * 1000:.1f} ms", "",
+                 "samples per thread:"]
+        for name, count in threads.most_common():
+            lines.append(f"  {count:7d}  {name}")
+        # Every thread is sampled on each tick, so totals over several threads can pass 100%
+        samples = max(self.samples, 1)
+        lines += ["", f"top {top} by self time (% of ticks):"]
+        for label, count in own.most_common(top):
+            lines.append(f"  {100 * count / samples:6.1f}%  {label}")
+        lines += ["", f"top {top} by total time (% of ticks):"]
+        for label, count in total.most_common(top):
+            lines.append(f"  {100 * count / samples:6.1f}%  {label}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_dir=DEFAULT_OUTPUT_DIR, prefix="profile"):
+        """Write <prefix>_<time>.collapsed and .txt, returns both paths"""
+        stem = os.path.join(output_dir, f"{prefix}_{time.strftime('%Y-%m-%d_%H-%M-%S')}")
+        self.write_collapsed(stem + ".collapsed")
+        with open(stem + ".txt", "w") as f:
+            f.write(self.summary())
+        return stem + ".collapsed", stem + ".txt"
+
+
+profile_lock = threading.Lock()
+
+
+def profile(duration=DEFAULT_DURATION, output_dir=DEFAULT_OUTPUT_DIR, interval=DEFAULT_INTERVAL,
+            prefix="profile"):
+    """Profile every thread for duration seconds, returns the written paths, or None if a
+    profile is already running"""
+    if not profile_lock.acquire(blocking=False):
+        print("Profiler already running")
+        return None
+    try:
+        profiler = SamplingProfiler(interval)
+        profiler.run(duration)
+        paths = profiler.write(output_dir, prefix)
+        print(f"Profile written to {paths[0]} and {paths[1]}")
+        return paths
+    finally:
+        profile_lock.release()
+
+
+def install_signal_trigger(signum=signal.SIGUSR1, duration=DEFAULT_DURATION,
+                           output_dir=DEFAULT_OUTPUT_DIR, prefix="profile"):
+    """Profile in the background whenever signum arrives, call from the main thread.
+
+    The signal number is delivered through a wakeup fd to a watcher thread,
+    so it works while the main thread sits in a C event loop such as Qt's,
+    where Python-level signal handlers do not run.
+    """
+    read_fd, write_fd = os.pipe()
+    os.set_blocking(write_fd, False)
+    signal.signal(signum, lambda s, f: None)
+    signal.set_wakeup_fd(write_fd, warn_on_full_buffer=False)
+
+    def watch():
+        while True:
+            for received in os.read(read_fd, 64):
+                if received == signum:
+                    threading.Thread(target=profile, args=(duration, output_dir),
+                                     kwargs={"prefix": prefix}, name="profiler", daemon=True).start()
+
+    threading.Thread(target=watch, name=TRIGGER_THREAD, daemon=True).start()
@@ -80,7 +80,9 @@ class CameraThread(QThread):
     
     def stop(self):
         self.running = False
-        self.wait()
+        # A read stuck in the driver must not freeze the window, the thread releases the camera when it returns
+        if not self.wait(3000):
+            print("Camera thread did not stop in 3s")
 
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
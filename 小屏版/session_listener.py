@@ -0,0 +1,23 @@
+class SessionListener:
+    """No-op callbacks, override the ones you need.
+
+    Callbacks are invoked from the engine's worker threads.
+    """
+
+    def on_status(self, text):
+        pass
+
+    def on_progress(self, count, total):
+        pass
+
+    def on_preview(self, rgb_frame):
+        pass
+
+    def on_sent(self, filename, response):
+        pass
+
+    def on_capture_done(self, count):
+        pass
+
+    def on_finished(self, count):
+        pass
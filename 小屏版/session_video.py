@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+
+# Tried in order, the first one the local OpenCV build can open wins
+VIDEO_CODECS = [
+    ("FFV1", ".mkv"),   # lossless
+    ("avc1", ".mp4"),
+    ("H264", ".mp4"),
+    ("MJPG", ".avi"),
+]
+
+
+def open_video_writer(path_stem, frame_size, fps, codecs=VIDEO_CODECS):
+    """Returns (writer, path, fourcc) for the first codec that opens"""
+    for fourcc, extension in codecs:
+        path = path_stem + extension
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+        if writer.isOpened():
+            return writer, path, fourcc
+        writer.release()
+        if os.path.exists(path):
+            os.unlink(path)
+    raise RuntimeError(f"No usable video codec among {[c for c, _ in codecs]}")
+
+
+class SessionVideoWriter:
+    """Streams captured frames into video segments with a timestamp sidecar.
+
+    segment_frames=None writes one file for the whole session, otherwise a
+    segment is closed and handed to on_segment every segment_frames frames.
+    on_segment(video_path, sidecar_path, index) owns the files afterwards.
+    """
+
+    def __init__(self, session_id, fps, on_segment, segment_frames=None, output_dir=None,
+                 codecs=VIDEO_CODECS):
+        self.session_id = session_id
+        self.fps = fps
+        self.on_segment = on_segment
+        self.segment_frames = segment_frames
+        self.output_dir = output_dir
+        self.codecs = codecs
+        self.writer = None
+        self.segment_index = 0
+        self.segment_path = None
+        self.fourcc = None
+        self.timestamps = []
+        self.started_at = None
+        self.frames = 0
+
+    def open_segment(self, frame):
+        if self.output_dir is None:
+            self.output_dir = tempfile.mkdtemp(prefix="hetaopi_video_")
+        h, w = frame.shape[:2]
+        self.segment_index += 1
+        stem = os.path.join(self.output_dir, f"session_{self.session_id}_{self.segment_index:03d}")
+        self.writer, self.segment_path, self.fourcc = open_video_writer(stem, (w, h), self.fps, self.codecs)
+        self.timestamps = []
+
+    def write(self, frame, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        if self.started_at is None:
+            self.started_at = timestamp
+        if self.writer is None:
+            self.open_segment(frame)
+        self.writer.write(frame)
+        self.timestamps.append(round(timestamp - self.started_at, 3))
+        self.frames += 1
+        if self.segment_frames and len(self.timestamps) >= self.segment_frames:
+            self.close_segment()
+
+    def close_segment(self):
+        if self.writer is None:
+            return
+        self.writer.release()
+        self.writer = None
+        sidecar_path = os.path.splitext(self.segment_path)[0] + ".json"
+        with open(sidecar_path, "w") as f:
+            json.dump({
+                "session_id": self.session_id,
+                "segment": self.segment_index,
+                "codec": self.fourcc,
+                "started_at": datetime.fromtimestamp(self.started_at).isoformat(timespec="milliseconds"),
+                "first_frame": self.frames - len(self.timestamps) + 1,
+                # Seconds since the first frame of the session, one per frame
+                "timestamps": self.timestamps
+            }, f)
+        self.on_segment(self.segment_path, sidecar_path, self.segment_index)
+
+    def close(self):
+        self.close_segment()
+        if self.output_dir:
+            try:
+                os.rmdir(self.output_dir)
+            except OSError:
+                pass
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""Startup timeline and camera warm-up for the GUI apps.
+
+Times are seconds since the process started, read from /proc, so they
+include interpreter start and, for a one-file PyInstaller build, the
+bootloader unpacking the archive. Each app appends one JSON line per
+launch to HETAOPI_STARTUP_LOG (default /tmp/<app>_startup.jsonl):
+
+    imports        module level imports done, Qt only
+    ui_ready       window shown and the event loop running
+    engine_loaded  capture engine (cv2, numpy, requests) imported
+    camera_open    camera opened and streaming
+    first_frame    first camera frame on screen
+
+engine_loaded and camera_open come from CameraWarmup, which loads the
+engine and opens the camera on a thread while the window is built.
+
+    python3 startup.py /tmp/camera_startup.jsonl --budget first_frame=3
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+MARKS = ("imports", "ui_ready", "engine_loaded", "camera_open", "first_frame")
+
+
+def proc_start_time(pid="self"):
+    """Start of a process in seconds since boot, on the CLOCK_BOOTTIME scale"""
+    with open(f"/proc/{pid}/stat") as f:
+        # The command name may contain spaces, fields after it are fixed
+        fields = f.read().rsplit(")", 1)[1].split()
+    return int(fields[19]) / os.sysconf("SC_CLK_TCK")
+
+
+def process_start():
+    try:
+        start = proc_start_time()
+        if getattr(sys, "frozen", False):
+            # A one-file build runs in a child of the bootloader that unpacked it
+            parent = os.getppid()
+            if os.path.realpath(f"/proc/{parent}/exe") == os.path.realpath("/proc/self/exe"):
+                start = proc_start_time(parent)
+        return start
+    except (OSError, IndexError, ValueError):
+        return now()
+
+
+def now():
+    return time.clock_gettime(time.CLOCK_BOOTTIME)
+
+
+class StartupTimeline:
+    """Seconds from process start to each milestone, the first time it is reached.
+
+    The launch is written out once every expected mark is in, or by
+    finish() when one never will be.
+    """
+
+    def __init__(self, app, expected=MARKS, path=None, log=print):
+        self.app = app
+        self.expected = expected
+        self.path = path or os.environ.get("HETAOPI_STARTUP_LOG", f"/tmp/{app}_startup.jsonl")
+        self.log = log
+        self.origin = process_start()
+        self.marks = {}
+        self.lock = threading.Lock()
+        self.written = False
+
+    def mark(self, name):
+        with self.lock:
+            if name in self.marks:
+                return
+            self.marks[name] = now() - self.origin
+            complete = all(mark in self.marks for mark in self.expected)
+        if complete:
+            self.finish()
+
+    def summary(self):
+        with self.lock:
+            marks = sorted(self.marks.items(), key=lambda item: item[1])
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in marks)
+
+    def finish(self, error=None):
+        with self.lock:
+            if self.written:
+                return
+            self.written = True
+            record = {
+                "app": self.app,
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "frozen": bool(getattr(sys, "frozen", False)),
+                "marks": {name: round(seconds, 3) for name, seconds in self.marks.items()}
+            }
+        if error:
+            record["error"] = str(error)
+        self.log(f"Startup: {self.summary()}" + (f" ({error})" if error else ""))
+        try:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record) + "\n")
+        except OSError as e:
+            self.log(f"Could not write startup log {self.path}: {e}")
+
+
+class CameraWarmup(threading.Thread):
+    """Imports the capture engine and opens the camera in the background.
+
+    The camera stays open in `pool` for the sessions to lease, `ready` is
+    set once the pool exists (or loading failed), and the callback given to
+    when_ready() is called then. The first frame goes to the callback given
+    to attach(), whichever of the two comes first.
+    """
+
+    def __init__(self, camera_uuid=None, timeline=None):
+        super().__init__(daemon=True)
+        self.camera_uuid = camera_uuid
+        self.timeline = timeline
+        self.pool = None
+        self.error = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+        self.frame = None
+        self.on_frame = None
+        self.on_ready = None
+        self.preview_size = None
+
+    def mark(self, name):
+        if self.timeline:
+            self.timeline.mark(name)
+
+    def run(self):
+        try:
+            try:
+                import capture_engine
+                from camera_pool import CameraPool
+                self.camera_uuid = self.camera_uuid or capture_engine.DEFAULT_CAMERA_UUID
+                self.pool = CameraPool()
+            finally:
+                with self.lock:
+                    self.ready.set()
+                    on_ready = self.on_ready
+                if on_ready:
+                    on_ready()
+            self.mark("engine_loaded")
+            with self.pool.lease(self.camera_uuid) as handle:
+                self.mark("camera_open")
+                capture_engine.set_read_timeout(handle.cap)
+                ok, frame = handle.cap.read()
+            if not ok:
+                raise RuntimeError("Camera opened but returned no frame")
+            with self.lock:
+                self.frame = frame
+                on_frame = self.on_frame
+            if on_frame:
+                self.deliver(frame)
+        except Exception as e:
+            self.error = e
+            print(f"Camera warm-up failed: {str(e)}")
+            if self.timeline:
+                self.timeline.finish(e)
+
+    def when_ready(self, on_ready):
+        """Call on_ready once ready is set, from the warm-up thread or right away"""
+        with self.lock:
+            if not self.ready.is_set():
+                self.on_ready = on_ready
+                return
+        on_ready()
+
+    def attach(self, on_frame, preview_size=None):
+        """Send the first frame, as RGB like SessionListener.on_preview, to on_frame"""
+        with self.lock:
+            self.on_frame = on_frame
+            self.preview_size = preview_size
+            frame = self.frame
+        if frame is not None:
+            self.deliver(frame)
+
+    def deliver(self, frame):
+        import cv2
+        rgb_image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        if self.preview_size:
+            rgb_image = cv2.resize(rgb_image, self.preview_size)
+        self.on_frame(rgb_image)
+
+    def frame_shown(self):
+        self.mark("first_frame")
+
+    def close(self, timeout=3.0):
+        self.join(timeout)
+        if self.pool:
+            self.pool.close()
+
+
+def parse_budget(text):
+    name, _, seconds = text.partition("=")
+    if name not in MARKS or not seconds:
+        raise argparse.ArgumentTypeError(f"expected MARK=SECONDS with MARK one of {', '.join(MARKS)}")
+    return name, float(seconds)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise startup timelines, fail on a regression")
+    parser.add_argument("log", help="startup log written by camera.py or myio.py")
+    parser.add_argument("--last", type=int, default=20, help="launches to take the medians over")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[],
+                        help="MARK=SECONDS the latest launch must reach the mark within")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="latest launch may take this many times the earlier median")
+    parser.add_argument("--slack", type=float, default=0.1,
+                        help="seconds over the median that never count as a regression")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.log) as f:
+        runs = [json.loads(line) for line in f if line.strip()][-args.last:]
+    if not runs:
+        print("no launches")
+        return 1
+    latest, earlier = runs[-1], runs[:-1]
+    failed = False
+    print(f"{'mark':>14} {'latest':>7} {'median':>7}  ({len(earlier)} earlier launches)")
+    for name in MARKS:
+        seconds = latest["marks"].get(name)
+        previous = [run["marks"][name] for run in earlier if name in run["marks"]]
+        median = statistics.median(previous) if previous else None
+        flag = ""
+        if seconds is None:
+            flag = "missing"
+        elif median and seconds > max(args.tolerance * median, median + args.slack):
+            flag = f"over {args.tolerance:g}x median"
+        print(f"{name:>14} {'-' if seconds is None else f'{seconds:.2f}':>7} "
+              f"{'-' if median is None else f'{median:.2f}':>7}  {flag}")
+        failed = failed or flag.startswith("over")
+    for name, budget in args.budget:
+        seconds = latest["marks"].get(name)
+        if seconds is None or seconds > budget:
+            print(f"{name} over its {budget:g}s budget")
+            failed = True
+    if "error" in latest:
+        print(f"latest launch: {latest['error']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
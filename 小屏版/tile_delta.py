@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""Tile deltas against the last frame the server acknowledged.
+
+A frame is cut into tile x tile blocks and compared with the reference
+frame. Blocks whose mean or peak difference passes the thresholds are
+sent, stacked into one PNG, with a bitmap saying where they go:
+
+    "TDL1" | width, height, tile (u16) | base seq, changed (u32) | bitmap | PNG
+
+The reference is the server's reconstruction, not the camera frame, so
+skipped blocks never drift more than the thresholds from the truth.
+threshold 0 sends every block that differs at all, which is lossless.
+Key frames are plain PNGs, the server stores them as they are.
+"""
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+MAGIC = b"TDL1"
+HEADER = struct.Struct("<4sHHHII")
+DELTA_EXTENSION = "tdelta"
+
+
+def pad_to_tiles(image, tile):
+    h, w = image.shape[:2]
+    pad_h, pad_w = -h % tile, -w % tile
+    if not pad_h and not pad_w:
+        return image
+    return cv2.copyMakeBorder(image, 0, pad_h, 0, pad_w, cv2.BORDER_REPLICATE)
+
+
+def tile_view(padded, tile):
+    """(rows, cols, tile, tile, channels) view of a padded frame"""
+    h, w, channels = padded.shape
+    return padded.reshape(h // tile, tile, w // tile, tile, channels).swapaxes(1, 2)
+
+
+def tile_count(frame, tile):
+    h, w = frame.shape[:2]
+    return -(-h // tile) * -(-w // tile)
+
+
+def changed_tiles(frame, reference, tile, mean_threshold, peak_threshold):
+    """Boolean (rows, cols) map of the blocks that differ"""
+    diff = pad_to_tiles(cv2.absdiff(frame, reference), tile)
+    h, w, channels = diff.shape
+    blocks = diff.reshape(h // tile, tile, w // tile, channels * tile)
+    peak = blocks.max(axis=(1, 3))
+    # INTER_AREA down to one pixel per block is the block mean
+    mean = cv2.resize(diff, (w // tile, h // tile), interpolation=cv2.INTER_AREA)
+    mean = mean.reshape(h // tile, w // tile, -1).max(axis=2)
+    return (mean > mean_threshold) | (peak > peak_threshold)
+
+
+def encode_delta(frame, reference, base_seq, tile=32, mean_threshold=4, peak_threshold=32):
+    """Delta payload, the frame the server will rebuild from it, and the changed block count"""
+    height, width = frame.shape[:2]
+    mask = changed_tiles(frame, reference, tile, mean_threshold, peak_threshold)
+    changed = int(mask.sum())
+    rebuilt = pad_to_tiles(reference, tile).copy()
+    payload = HEADER.pack(MAGIC, width, height, tile, base_seq, changed) + np.packbits(mask).tobytes()
+    if changed:
+        blocks = tile_view(pad_to_tiles(frame, tile), tile)[mask]
+        tile_view(rebuilt, tile)[mask] = blocks
+        _, buffer = cv2.imencode('.png', blocks.reshape(changed * tile, tile, -1))
+        payload += buffer.tobytes()
+    return payload, rebuilt[:height, :width], changed
+
+
+def is_delta(payload):
+    return payload[:len(MAGIC)] == MAGIC
+
+
+def delta_base_seq(payload):
+    return HEADER.unpack_from(payload)[4]
+
+
+def apply_delta(payload, base):
+    """Rebuild the frame from its delta and the decoded base frame"""
+    magic, width, height, tile, _, changed = HEADER.unpack_from(payload)
+    if magic != MAGIC:
+        raise ValueError("not a tile delta")
+    if base.shape[:2] != (height, width):
+        raise ValueError(f"base frame is {base.shape[1]}x{base.shape[0]}, delta is {width}x{height}")
+    rows, cols = -(-height // tile), -(-width // tile)
+    offset = HEADER.size + (rows * cols + 7) // 8
+    mask = np.unpackbits(np.frombuffer(payload, np.uint8, offset - HEADER.size, HEADER.size),
+                         count=rows * cols).astype(bool).reshape(rows, cols)
+    if int(mask.sum()) != changed:
+        raise ValueError("tile map does not match the changed count")
+    rebuilt = pad_to_tiles(base, tile).copy()
+    if changed:
+        blocks = cv2.imdecode(np.frombuffer(payload, np.uint8, offset=offset), cv2.IMREAD_UNCHANGED)
+        if blocks is None or blocks.shape[:2] != (changed * tile, tile):
+            raise ValueError("tile image does not match the tile map")
+        tile_view(rebuilt, tile)[mask] = blocks.reshape(changed, tile, tile, -1)
+    return rebuilt[:height, :width]
+
+
+class DeltaEncoder:
+    """Encoder for CaptureSession that uploads tile deltas between key frames.
+
+    Expects one encode() per capture, in sequence order, as CaptureSession
+    does. A delta refers to the newest frame acknowledged through on_ack();
+    without one, every key_interval frames and after a failed upload, the
+    frame goes out as a full PNG.
+
+    Every frame is kept until its upload is acknowledged, either way, so a
+    refused delta can still be sent as a PNG. Memory follows the upload
+    backlog, which the uploader and governor keep short.
+    """
+
+    def __init__(self, tile=32, mean_threshold=4, peak_threshold=None, key_interval=10):
+        self.tile = tile
+        self.mean_threshold = mean_threshold
+        # A single pixel changing this much marks its tile, whatever the mean
+        self.peak_threshold = 8 * mean_threshold if peak_threshold is None else peak_threshold
+        self.key_interval = key_interval
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.reference = None
+        self.reference_seq = 0
+        self.last_key_seq = None
+        self.unacked = {}
+        # Deltas already replaced by their PNG, whose retry may fail too
+        self.resent = set()
+        self.force_key = False
+        self.counts = {"frames": 0, "key_frames": 0, "bytes": 0, "key_bytes": 0, "tiles": 0, "tiles_sent": 0,
+                       "resent": 0, "lost": 0}
+
+    def encode(self, frame, backlog=0):
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+            reference, reference_seq = self.reference, self.reference_seq
+            key = (reference is None or self.force_key
+                   or seq - self.last_key_seq >= self.key_interval)
+            if key:
+                self.force_key = False
+                self.last_key_seq = seq
+
+        if key:
+            _, buffer = cv2.imencode('.png', frame)
+            data, extension, rebuilt = buffer.tobytes(), "png", frame
+        else:
+            data, rebuilt, changed = encode_delta(frame, reference, reference_seq, self.tile,
+                                                  self.mean_threshold, self.peak_threshold)
+            extension = DELTA_EXTENSION
+
+        with self.lock:
+            self.unacked[seq] = (rebuilt, key)
+            self.counts["frames"] += 1
+            self.counts["bytes"] += len(data)
+            if key:
+                self.counts["key_frames"] += 1
+                self.counts["key_bytes"] += len(data)
+            else:
+                self.counts["tiles"] += tile_count(frame, self.tile)
+                self.counts["tiles_sent"] += changed
+        return data, extension
+
+    def on_ack(self, seq, ok):
+        with self.lock:
+            rebuilt, _ = self.unacked.pop(seq, (None, None))
+            if not ok:
+                # The server cannot rebuild frames based on this one
+                self.force_key = True
+                return
+            if rebuilt is not None and seq > self.reference_seq:
+                self.reference, self.reference_seq = rebuilt, seq
+
+    def key_frame(self, seq):
+        """A delta the server refused, e.g. sent after a failover to a server
+        without its base frame, as a PNG of the frame it stood for. None for
+        key frames, and for a frame that is not kept, which is then lost."""
+        with self.lock:
+            if seq in self.resent:
+                return None
+            if seq not in self.unacked:
+                self.counts["lost"] += 1
+                print(f"Frame {seq} refused and no longer kept, it is lost")
+                return None
+            rebuilt, key = self.unacked[seq]
+            if key:
+                return None
+            self.resent.add(seq)
+            self.counts["resent"] += 1
+        _, buffer = cv2.imencode('.png', rebuilt)
+        return buffer.tobytes()
+
+    def on_upload(self, nbytes, duration, rtt, ok):
+        pass
+
+    def set_effort(self, effort):
+        pass
+
+    def stats(self):
+        """Bytes sent, and what full PNGs would have cost, estimated from the key frames"""
+        with self.lock:
+            counts = dict(self.counts)
+        if counts["key_frames"]:
+            counts["full_estimate"] = round(counts["key_bytes"] / counts["key_frames"] * counts["frames"])
+        return counts
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Chrome trace_event recording, open the dumped JSON in ui.perfetto.dev.
+
+Tracing is off unless start() was called; span() then returns one shared
+no-op context manager, so instrumented code costs a global lookup and a
+call per span.
+"""
+import collections
+import json
+import os
+import threading
+import time
+
+DEFAULT_CAPACITY = 100000
+
+get_thread_id = getattr(threading, "get_native_id", threading.get_ident)
+
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, category, args):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.complete(self.name, self.category, self.started, time.perf_counter_ns(), self.args)
+        return False
+
+
+class Tracer:
+    """Keeps the newest `capacity` events in a ring buffer"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.events = collections.deque(maxlen=capacity)
+        self.recorded = 0
+        self.thread_names = {}
+        self.pid = os.getpid()
+        self.origin = time.perf_counter_ns()
+
+    def thread_id(self):
+        tid = get_thread_id()
+        if tid not in self.thread_names:
+            self.thread_names[tid] = threading.current_thread().name
+        return tid
+
+    def complete(self, name, category, started, ended, args=None):
+        # "X" events carry both ends, so a wrapped buffer never holds half a span
+        event = {"name": name, "cat": category, "ph": "X", "pid": self.pid, "tid": self.thread_id(),
+                 "ts": (started - self.origin) / 1000, "dur": (ended - started) / 1000}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+        self.recorded += 1
+
+    def instant(self, name, category, args=None):
+        event = {"name": name, "cat": category, "ph": "i", "s": "t", "pid": self.pid,
+                 "tid": self.thread_id(), "ts": (time.perf_counter_ns() - self.origin) / 1000}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+        self.recorded += 1
+
+    def dump(self, path):
+        events = list(self.events)
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "hetaopi"}}]
+        for tid, name in list(self.thread_names.items()):
+            metadata.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                             "args": {"name": name}})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms",
+                       "otherData": {"recorded": self.recorded, "dropped": self.recorded - len(events)}}, f)
+        return len(events)
+
+
+active = None
+users = 0
+users_lock = threading.Lock()
+
+
+def start(capacity=DEFAULT_CAPACITY):
+    """Start recording, overlapping sessions share the tracer already running"""
+    global active, users
+    with users_lock:
+        if active is None:
+            active = Tracer(capacity)
+        users += 1
+        return active
+
+
+def stop(path=None):
+    """Optionally write the trace, recording stops when the last user stops"""
+    global active, users
+    with users_lock:
+        tracer = active
+        users = max(0, users - 1)
+        if users == 0:
+            active = None
+    if tracer and path:
+        count = tracer.dump(path)
+        print(f"Trace with {count} events written to {path}")
+    return tracer
+
+
+def span(name, category="session", **args):
+    tracer = active
+    if tracer is None:
+        return NULL_SPAN
+    return Span(tracer, name, category, args)
+
+
+def instant(name, category="session", **args):
+    tracer = active
+    if tracer is not None:
+        tracer.instant(name, category, args)
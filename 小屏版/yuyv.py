@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Raw YUYV acquisition with conversion only where a frame is used.
+
+With CAP_PROP_CONVERT_RGB off, OpenCV hands back the driver's YUYV buffer
+instead of converting every frame to BGR. The Y bytes are luma already,
+so the preview is a downscaled luma plane, and only captured frames pay
+for the full YUYV to BGR conversion.
+"""
+import cv2
+
+YUYV_FOURCC = cv2.VideoWriter_fourcc(*"YUYV")
+
+
+def enable_raw_yuyv(cap):
+    """Ask for unconverted YUYV frames, returns False if the backend refuses"""
+    cap.set(cv2.CAP_PROP_FOURCC, YUYV_FOURCC)
+    if int(cap.get(cv2.CAP_PROP_FOURCC)) != YUYV_FOURCC:
+        return False
+    if not cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+        return False
+    return True
+
+
+def disable_raw_yuyv(cap):
+    cap.set(cv2.CAP_PROP_CONVERT_RGB, 1)
+
+
+def as_yuyv(frame, cap):
+    """(h, w, 2) view of a raw frame, some OpenCV versions return one flat row"""
+    if frame.ndim == 3 and frame.shape[2] == 2:
+        return frame
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    return frame.reshape(height, width, 2)
+
+
+def yuyv_preview_rgb(raw, size=None):
+    """Greyscale preview from the luma plane, no colour conversion"""
+    luma = cv2.cvtColor(raw, cv2.COLOR_YUV2GRAY_YUYV)
+    if size:
+        luma = cv2.resize(luma, size)
+    return cv2.cvtColor(luma, cv2.COLOR_GRAY2RGB)
+
+
+def yuyv_to_bgr(raw):
+    return cv2.cvtColor(raw, cv2.COLOR_YUV2BGR_YUYV)